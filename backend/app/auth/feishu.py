@@ -1,53 +1,96 @@
 """飞书OAuth2.0集成"""
 
-from typing import Dict
+import asyncio
+import time
+from typing import Dict, Optional, Tuple
 
 import httpx
 
 from app.core.config import settings
 from app.core.logger import logger
 
+# 飞书返回这些错误码时说明缓存的 app/tenant access token 已失效(被重置、提前过期等)
+INVALID_ACCESS_TOKEN_CODES = frozenset({99991661, 99991663, 99991664, 99991668, 99991677})
+
+
+class FeishuAPIError(Exception):
+    """飞书接口返回非0错误码"""
+
+    def __init__(self, message: str, code: Optional[int] = None):
+        super().__init__(message)
+        self.code = code
+
 
 class FeishuClient:
-    """飞书API客户端"""
+    """
+    飞书API客户端
+
+    所有请求复用同一个长连接池(由应用生命周期 start/close), 避免每次调用重新建立TCP/TLS连接;
+    app_access_token/tenant_access_token 按返回的 expire 缓存, 到期前提前续期, 并发续期只请求一次飞书
+    """
 
     def __init__(self):
         self.app_id = settings.FEISHU_APP_ID
         self.app_secret = settings.FEISHU_APP_SECRET
-        self.base_url = "https://open.feishu.cn/open-apis"
+        self.base_url = settings.FEISHU_API_BASE_URL.rstrip("/")
+        self._client: Optional[httpx.AsyncClient] = None
+        # 访问令牌类型 -> (令牌, 过期时间(monotonic))
+        self._access_tokens: Dict[str, Tuple[str, float]] = {}
+        self._access_token_locks = {
+            "app_access_token": asyncio.Lock(),
+            "tenant_access_token": asyncio.Lock(),
+        }
 
-    async def get_app_access_token(self) -> str:
+    async def start(self):
+        """创建连接池(在应用启动时调用, 重复调用无副作用)"""
+        if self._client is not None:
+            return
+        self._client = httpx.AsyncClient(
+            base_url=self.base_url,
+            timeout=settings.FEISHU_HTTP_TIMEOUT,
+            limits=httpx.Limits(
+                max_connections=settings.FEISHU_HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.FEISHU_HTTP_MAX_CONNECTIONS,
+            ),
+        )
+        logger.info(f"[飞书API] 连接池已创建 - base_url: {self.base_url}")
+
+    async def close(self):
+        """关闭连接池(在应用关闭时调用)"""
+        if self._client is None:
+            return
+        client, self._client = self._client, None
+        await client.aclose()
+
+    async def _get_client(self) -> httpx.AsyncClient:
+        """获取连接池, 未随应用启动时(如脚本中使用)按需创建"""
+        if self._client is None:
+            await self.start()
+        return self._client
+
+    async def _request(self, method: str, path: str, action: str, **kwargs) -> Dict:
         """
-        获取应用访问令牌
+        调用飞书API
 
-        Returns:
-            app_access_token
-        """
-        url = f"{self.base_url}/auth/v3/app_access_token/internal"
-        payload = {"app_id": self.app_id, "app_secret": "***"}  # 日志中隐藏secret
+        Args:
+            method: HTTP方法
+            path: 接口路径(相对 base_url)
+            action: 操作描述(用于日志和错误信息)
+            **kwargs: 透传给 httpx 的参数(headers/params/json)
 
-        logger.info(f"[飞书API] 获取app_access_token - URL: {url}")
-        logger.debug(f"[飞书API] 请求payload: {payload}")
+        Returns:
+            响应数据(code 为 0)
 
+        Raises:
+            Exception: 连接失败、超时或飞书返回错误码
+        """
+        client = await self._get_client()
         try:
-            async with httpx.AsyncClient(timeout=30.0) as client:
-                real_payload = {"app_id": self.app_id, "app_secret": self.app_secret}
-                response = await client.post(url, json=real_payload)
-
-                logger.info(f"[飞书API] 响应状态码: {response.status_code}")
-                logger.debug(f"[飞书API] 响应头: {dict(response.headers)}")
-
-                data = response.json()
-                logger.debug(f"[飞书API] 响应数据: {data}")
+            response = await client.request(method, path, **kwargs)
 
-                if data.get("code") != 0:
-                    logger.error(
-                        f"[飞书API] 获取app_access_token失败 - code: {data.get('code')}, msg: {data.get('msg')}"
-                    )
-                    raise Exception(f"获取app_access_token失败: {data.get('msg')}")
-
-                logger.info("[飞书API] 成功获取app_access_token")
-                return data.get("app_access_token")
+            logger.info(f"[飞书API] 响应状态码: {response.status_code}")
+            data = response.json()
+            logger.debug(f"[飞书API] 响应数据: {data}")
         except httpx.ConnectError as e:
             logger.error(f"[飞书API] 连接失败: {str(e)}")
             raise Exception(f"连接飞书API失败: {str(e)}")
@@ -58,6 +101,113 @@ class FeishuClient:
             logger.error(f"[飞书API] 未知错误: {str(e)}", exc_info=True)
             raise
 
+        if data.get("code") != 0:
+            logger.error(
+                f"[飞书API] {action}失败 - code: {data.get('code')}, msg: {data.get('msg')}"
+            )
+            raise FeishuAPIError(f"{action}失败: {data.get('msg')}", data.get("code"))
+        return data
+
+    async def _request_with_access_token(
+        self, kind: str, method: str, path: str, action: str, **kwargs
+    ) -> Dict:
+        """
+        携带 app/tenant access token 调用飞书API
+
+        飞书拒绝缓存的令牌(错误码见 INVALID_ACCESS_TOKEN_CODES)时丢弃缓存, 强制续期后重试一次
+
+        Args:
+            kind: app_access_token 或 tenant_access_token
+            method/path/action/**kwargs: 同 _request
+        """
+        headers = dict(kwargs.pop("headers", None) or {})
+        token = await self._get_access_token(kind, False)
+        headers["Authorization"] = f"Bearer {token}"
+        try:
+            return await self._request(method, path, action, headers=headers, **kwargs)
+        except FeishuAPIError as e:
+            if e.code not in INVALID_ACCESS_TOKEN_CODES:
+                raise
+            logger.warning(f"[飞书API] {kind}被拒绝(code: {e.code}), 强制续期后重试")
+
+        token = await self._get_access_token(kind, True, rejected=token)
+        headers["Authorization"] = f"Bearer {token}"
+        return await self._request(method, path, action, headers=headers, **kwargs)
+
+    async def get_app_access_token(self, force_refresh: bool = False) -> str:
+        """
+        获取应用访问令牌(带缓存)
+
+        Args:
+            force_refresh: 是否忽略缓存强制续期
+
+        Returns:
+            app_access_token
+        """
+        return await self._get_access_token("app_access_token", force_refresh)
+
+    async def get_tenant_access_token(self, force_refresh: bool = False) -> str:
+        """
+        获取租户访问令牌(带缓存, 通讯录接口使用)
+
+        Args:
+            force_refresh: 是否忽略缓存强制续期
+
+        Returns:
+            tenant_access_token
+        """
+        return await self._get_access_token("tenant_access_token", force_refresh)
+
+    async def _get_access_token(
+        self, kind: str, force_refresh: bool, rejected: Optional[str] = None
+    ) -> str:
+        """
+        获取应用/租户访问令牌
+
+        缓存在距过期不足 FEISHU_APP_TOKEN_REFRESH_AHEAD_SECONDS 时视为失效并续期,
+        并发调用共享同一次续期
+
+        Args:
+            kind: app_access_token 或 tenant_access_token
+            force_refresh: 是否忽略缓存强制续期
+            rejected: 被飞书拒绝的令牌; 强制续期时缓存已换成其他令牌(并发续期已完成)则直接使用
+        """
+        if not force_refresh and self._cached_access_token(kind):
+            return self._access_tokens[kind][0]
+
+        async with self._access_token_locks[kind]:
+            # 等锁期间其他协程可能已完成续期
+            if self._cached_access_token(kind) and (
+                not force_refresh
+                or (rejected is not None and self._access_tokens[kind][0] != rejected)
+            ):
+                return self._access_tokens[kind][0]
+            self._access_tokens.pop(kind, None)
+
+            url = f"{self.base_url}/auth/v3/{kind}/internal"
+            logger.info(f"[飞书API] 获取{kind} - URL: {url}")
+
+            data = await self._request(
+                "POST",
+                f"/auth/v3/{kind}/internal",
+                f"获取{kind}",
+                json={"app_id": self.app_id, "app_secret": self.app_secret},
+            )
+
+            expire = int(data.get("expire") or 0)
+            token = data.get(kind)
+            self._access_tokens[kind] = (token, time.monotonic() + expire)
+            logger.info(f"[飞书API] 成功获取{kind} - expire: {expire}s")
+            return token
+
+    def _cached_access_token(self, kind: str) -> bool:
+        """缓存的访问令牌是否可用(未进入提前续期窗口)"""
+        cached = self._access_tokens.get(kind)
+        if cached is None:
+            return False
+        refresh_at = cached[1] - settings.FEISHU_APP_TOKEN_REFRESH_AHEAD_SECONDS
+        return time.monotonic() < refresh_at
+
     async def get_user_access_token(self, code: str) -> str:
         """
         获取用户访问令牌
@@ -70,43 +220,23 @@ class FeishuClient:
         """
         logger.info(f"[飞书API] 开始获取user_access_token - code: {code[:10]}***")
 
-        app_access_token = await self.get_app_access_token()
-
         url = f"{self.base_url}/authen/v1/access_token"
         payload = {"grant_type": "authorization_code", "code": code}
 
         logger.info(f"[飞书API] 获取user_access_token - URL: {url}")
         logger.debug(f"[飞书API] 请求payload: {payload}")
 
-        try:
-            real_headers = {
-                "Authorization": f"Bearer {app_access_token}",
-                "Content-Type": "application/json",
-            }
-            async with httpx.AsyncClient(timeout=30.0) as client:
-                response = await client.post(url, headers=real_headers, json=payload)
-
-                logger.info(f"[飞书API] 响应状态码: {response.status_code}")
-                data = response.json()
-                logger.debug(f"[飞书API] 响应数据: {data}")
-
-                if data.get("code") != 0:
-                    logger.error(
-                        f"[飞书API] 获取user_access_token失败 - code: {data.get('code')}, msg: {data.get('msg')}"
-                    )
-                    raise Exception(f"获取user_access_token失败: {data.get('msg')}")
-
-                logger.info("[飞书API] 成功获取user_access_token")
-                return data.get("data", {}).get("access_token")
-        except httpx.ConnectError as e:
-            logger.error(f"[飞书API] 连接失败: {str(e)}")
-            raise Exception(f"连接飞书API失败: {str(e)}")
-        except httpx.TimeoutException as e:
-            logger.error(f"[飞书API] 请求超时: {str(e)}")
-            raise Exception(f"飞书API请求超时: {str(e)}")
-        except Exception as e:
-            logger.error(f"[飞书API] 未知错误: {str(e)}", exc_info=True)
-            raise
+        data = await self._request_with_access_token(
+            "app_access_token",
+            "POST",
+            "/authen/v1/access_token",
+            "获取user_access_token",
+            headers={"Content-Type": "application/json"},
+            json=payload,
+        )
+
+        logger.info("[飞书API] 成功获取user_access_token")
+        return data.get("data", {}).get("access_token")
 
     async def get_user_info(self, user_access_token: str) -> Dict:
         """
@@ -123,38 +253,18 @@ class FeishuClient:
         logger.info(f"[飞书API] 获取用户信息 - URL: {url}")
         logger.debug(f"[飞书API] user_access_token: {user_access_token[:20]}***")
 
-        headers = {
-            "Authorization": f"Bearer {user_access_token}",
-        }
+        data = await self._request(
+            "GET",
+            "/authen/v1/user_info",
+            "获取用户信息",
+            headers={"Authorization": f"Bearer {user_access_token}"},
+        )
 
-        try:
-            async with httpx.AsyncClient(timeout=30.0) as client:
-                response = await client.get(url, headers=headers)
-
-                logger.info(f"[飞书API] 响应状态码: {response.status_code}")
-                data = response.json()
-                logger.debug(f"[飞书API] 响应数据: {data}")
-
-                if data.get("code") != 0:
-                    logger.error(
-                        f"[飞书API] 获取用户信息失败 - code: {data.get('code')}, msg: {data.get('msg')}"
-                    )
-                    raise Exception(f"获取用户信息失败: {data.get('msg')}")
-
-                user_info = data.get("data", {})
-                logger.info(
-                    f"[飞书API] 成功获取用户信息 - name: {user_info.get('name')}, open_id: {user_info.get('open_id')}"
-                )
-                return user_info
-        except httpx.ConnectError as e:
-            logger.error(f"[飞书API] 连接失败: {str(e)}")
-            raise Exception(f"连接飞书API失败: {str(e)}")
-        except httpx.TimeoutException as e:
-            logger.error(f"[飞书API] 请求超时: {str(e)}")
-            raise Exception(f"飞书API请求超时: {str(e)}")
-        except Exception as e:
-            logger.error(f"[飞书API] 未知错误: {str(e)}", exc_info=True)
-            raise
+        user_info = data.get("data", {})
+        logger.info(
+            f"[飞书API] 成功获取用户信息 - name: {user_info.get('name')}, open_id: {user_info.get('open_id')}"
+        )
+        return user_info
 
     async def get_user_detail(self, user_id: str) -> Dict:
         """
@@ -168,43 +278,90 @@ class FeishuClient:
         """
         logger.info(f"[飞书API] 获取用户详细信息 - user_id: {user_id}")
 
-        app_access_token = await self.get_app_access_token()
-
         url = f"{self.base_url}/contact/v3/users/{user_id}"
-        headers = {
-            "Authorization": f"Bearer {app_access_token}",
-        }
         params = {"user_id_type": "open_id"}
 
         logger.info(f"[飞书API] 获取用户详细信息 - URL: {url}")
         logger.debug(f"[飞书API] 请求参数: {params}")
 
-        try:
-            async with httpx.AsyncClient(timeout=30.0) as client:
-                response = await client.get(url, headers=headers, params=params)
-
-                logger.info(f"[飞书API] 响应状态码: {response.status_code}")
-                data = response.json()
-                logger.debug(f"[飞书API] 响应数据: {data}")
-
-                if data.get("code") != 0:
-                    logger.error(
-                        f"[飞书API] 获取用户详细信息失败 - code: {data.get('code')}, msg: {data.get('msg')}"
-                    )
-                    raise Exception(f"获取用户详细信息失败: {data.get('msg')}")
-
-                user_detail = data.get("data", {}).get("user", {})
-                logger.info("[飞书API] 成功获取用户详细信息")
-                return user_detail
-        except httpx.ConnectError as e:
-            logger.error(f"[飞书API] 连接失败: {str(e)}")
-            raise Exception(f"连接飞书API失败: {str(e)}")
-        except httpx.TimeoutException as e:
-            logger.error(f"[飞书API] 请求超时: {str(e)}")
-            raise Exception(f"飞书API请求超时: {str(e)}")
-        except Exception as e:
-            logger.error(f"[飞书API] 未知错误: {str(e)}", exc_info=True)
-            raise
+        data = await self._request_with_access_token(
+            "app_access_token",
+            "GET",
+            f"/contact/v3/users/{user_id}",
+            "获取用户详细信息",
+            params=params,
+        )
+
+        user_detail = data.get("data", {}).get("user", {})
+        logger.info("[飞书API] 成功获取用户详细信息")
+        return user_detail
+
+    async def list_departments(
+        self, parent_department_id: str = "0", page_token: Optional[str] = None, page_size: int = 50
+    ) -> Dict:
+        """
+        分页获取子部门(递归包含所有下级部门)
+
+        Args:
+            parent_department_id: 父部门open_department_id, "0" 为根部门
+            page_token: 分页标记, 首页为 None
+            page_size: 每页数量(最大50)
+
+        Returns:
+            {"items": [部门], "has_more": bool, "page_token": str}
+        """
+        params = {
+            "department_id_type": "open_department_id",
+            "fetch_child": "true",
+            "page_size": page_size,
+        }
+        if page_token:
+            params["page_token"] = page_token
+
+        logger.debug(f"[飞书API] 获取子部门 - parent: {parent_department_id}, params: {params}")
+
+        data = await self._request_with_access_token(
+            "tenant_access_token",
+            "GET",
+            f"/contact/v3/departments/{parent_department_id}/children",
+            "获取子部门列表",
+            params=params,
+        )
+        return data.get("data") or {}
+
+    async def list_department_users(
+        self, department_id: str, page_token: Optional[str] = None, page_size: int = 50
+    ) -> Dict:
+        """
+        分页获取部门直属用户
+
+        Args:
+            department_id: 部门open_department_id, "0" 为根部门
+            page_token: 分页标记, 首页为 None
+            page_size: 每页数量(最大50)
+
+        Returns:
+            {"items": [用户], "has_more": bool, "page_token": str}
+        """
+        params = {
+            "department_id": department_id,
+            "department_id_type": "open_department_id",
+            "user_id_type": "user_id",
+            "page_size": page_size,
+        }
+        if page_token:
+            params["page_token"] = page_token
+
+        logger.debug(f"[飞书API] 获取部门用户 - params: {params}")
+
+        data = await self._request_with_access_token(
+            "tenant_access_token",
+            "GET",
+            "/contact/v3/users/find_by_department",
+            "获取部门用户列表",
+            params=params,
+        )
+        return data.get("data") or {}
 
 
 # 全局飞书客户端实例
@@ -3,28 +3,34 @@
 import secrets
 from typing import Optional
 
-from fastapi import APIRouter, Body, Depends, HTTPException, Query
+import jwt
+from fastapi import APIRouter, Body, Depends, Header, HTTPException, Query, Response
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.auth.feishu import feishu_client
 from app.core.cache import cache
 from app.core.config import settings
 from app.core.database import get_db
-from app.core.dependencies import get_current_user
+from app.core.dependencies import get_current_user, verify_system_token
 from app.core.logger import logger
-from app.core.security import jwt_handler
+from app.core.resource_documents import resource_document_store
+from app.core.security import jwt_handler, key_manager
 from app.schemas.auth import (
+    JWKSResponse,
     PublicKeyResponse,
     RefreshTokenRequest,
     SSOExchangeTokenRequest,
     SSOLoginUrlRequest,
     SSOLoginUrlResponse,
+    TokenExchangeRequest,
+    TokenExchangeResponse,
     TokenResponse,
 )
 from app.users.permission_collector import PermissionCollector
 from app.users.service import UserService
 
 router = APIRouter(prefix="/auth", tags=["认证"])
+well_known_router = APIRouter(prefix="/.well-known", tags=["认证"])
 
 
 @router.get("/feishu/login")
@@ -113,7 +119,7 @@ async def feishu_callback(
 
         # 5. 生成JWT Token
         logger.info("[登录回调] 步骤5: 生成JWT Token")
-        token = jwt_handler.create_access_token(
+        token = await jwt_handler.issue_access_token(
             feishu_user_id=user.feishu_user_id,
             name=user.name,
             username=user.username,
@@ -130,7 +136,7 @@ async def feishu_callback(
 
         # 6. 生成 Refresh Token
         logger.info("[登录回调] 步骤6: 生成 Refresh Token")
-        refresh_token = jwt_handler.create_refresh_token(user.feishu_user_id)
+        refresh_token = await jwt_handler.create_refresh_token(user.feishu_user_id)
         logger.info(f"[登录回调] 步骤6完成 - refresh_token: {refresh_token[:30]}***")
 
         logger.info(f"[登录回调] ✅ 登录成功 - 用户: {user.username} (ID: {user.feishu_user_id})")
@@ -165,12 +171,12 @@ async def logout(
     # 撤销 access token（加入黑名单）
     jti = current_user.get("jti", "")
     if jti:
-        jwt_handler.add_to_blacklist(jti, expire_seconds=3600)
+        await jwt_handler.add_to_blacklist(jti, expire_seconds=3600)
         logger.info(f"[登出] Access token 已加入黑名单 - jti: {jti}")
 
     # 撤销 refresh token
     if refresh_token:
-        jwt_handler.revoke_refresh_token(refresh_token)
+        await jwt_handler.revoke_refresh_token(refresh_token)
         logger.info(f"[登出] Refresh token 已撤销 - token: {refresh_token[:30]}***")
 
     return {"message": "登出成功"}
@@ -186,11 +192,23 @@ async def get_public_key():
     Returns:
         公钥(PEM格式)
     """
-    # 读取公钥
-    with open(settings.JWT_PUBLIC_KEY_PATH, "r") as f:
-        public_key = f.read()
+    return PublicKeyResponse(
+        public_key=key_manager.public_key_pem, algorithm="RS256", kid=key_manager.active_kid
+    )
+
+
+@well_known_router.get("/jwks.json", response_model=JWKSResponse)
+async def get_jwks(response: Response):
+    """
+    获取JWT验证公钥集合(JWKS)
 
-    return PublicKeyResponse(public_key=public_key, algorithm="RS256")
+    包含当前签名密钥和轮换中的其他公钥, 业务系统按Token头部的kid选择公钥
+
+    Returns:
+        JWK集合
+    """
+    response.headers["Cache-Control"] = "public, max-age=300"
+    return key_manager.jwks()
 
 
 @router.get("/me")
@@ -214,6 +232,9 @@ async def refresh_access_token(request: RefreshTokenRequest, db: AsyncSession =
 
     使用 refresh token 获取新的 access token 和 refresh token (rotation)
 
+    同一个 refresh token 在轮换后的宽限期内再次使用(并发刷新、提前刷新的响应未送达)时
+    返回同一个新的 refresh token
+
     Args:
         request: 包含 refresh_token
         db: 数据库会话
@@ -223,39 +244,29 @@ async def refresh_access_token(request: RefreshTokenRequest, db: AsyncSession =
     """
     logger.info(f"[Token刷新] 开始刷新 - refresh_token: {request.refresh_token[:30]}***")
 
-    # 1. 验证 refresh token
-    feishu_user_id = jwt_handler.verify_refresh_token(request.refresh_token)
+    # 1. 原子轮换 refresh token (校验、撤销旧token、签发新token 一次往返完成)
+    feishu_user_id, new_refresh_token = await jwt_handler.rotate_refresh_token(
+        request.refresh_token
+    )
     if not feishu_user_id:
         logger.error("[Token刷新] ❌ Refresh token 无效或已过期")
         raise HTTPException(status_code=401, detail="Invalid or expired refresh token")
 
-    logger.info(f"[Token刷新] Refresh token 验证通过 - feishu_user_id: {feishu_user_id}")
-
-    # 2. 获取用户信息
-    from sqlalchemy import select
+    logger.info(f"[Token刷新] Refresh token 已轮换 - feishu_user_id: {feishu_user_id}")
 
-    from app.models.user import User
-
-    result = await db.execute(select(User).where(User.feishu_user_id == feishu_user_id))
-    user = result.scalar_one_or_none()
+    # 2. 一次性加载用户信息和权限
+    permission_collector = PermissionCollector(db)
+    user, user_permissions = await permission_collector.collect_with_user(feishu_user_id)
 
     if not user:
+        await jwt_handler.revoke_refresh_token(new_refresh_token)
         logger.error(f"[Token刷新] ❌ 用户不存在 - feishu_user_id: {feishu_user_id}")
         raise HTTPException(status_code=404, detail="User not found")
 
-    logger.info(f"[Token刷新] 用户信息获取成功 - username: {user.username}")
+    logger.info(f"[Token刷新] 用户和权限加载完成 - username: {user.username}")
 
-    # 3. 收集权限
-    permission_collector = PermissionCollector(db)
-    user_permissions = await permission_collector.collect(user.feishu_user_id)
-    logger.info(f"[Token刷新] 权限收集完成")
-
-    # 4. 撤销旧的 refresh token (rotation)
-    jwt_handler.revoke_refresh_token(request.refresh_token)
-    logger.info("[Token刷新] 旧 refresh token 已撤销")
-
-    # 5. 生成新的 tokens
-    access_token = jwt_handler.create_access_token(
+    # 3. 生成新的 access token
+    access_token = await jwt_handler.issue_access_token(
         feishu_user_id=user.feishu_user_id,
         name=user.name,
         username=user.username,
@@ -269,8 +280,6 @@ async def refresh_access_token(request: RefreshTokenRequest, db: AsyncSession =
         dept_names=user.dept_names or [],
     )
 
-    new_refresh_token = jwt_handler.create_refresh_token(user.feishu_user_id)
-
     logger.info(f"[Token刷新] ✅ Token 刷新成功 - 用户: {user.username} (ID: {user.feishu_user_id})")
 
     return TokenResponse(
@@ -282,6 +291,52 @@ async def refresh_access_token(request: RefreshTokenRequest, db: AsyncSession =
     )
 
 
+@router.post("/token/exchange", response_model=TokenExchangeResponse)
+async def exchange_scoped_token(
+    request: TokenExchangeRequest,
+    x_system_token: str = Header(..., alias="X-System-Token"),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    用户Token换取作用域Token(供业务系统SDK使用)
+
+    作用域Token的 aud 为调用方系统代码, 只包含该系统的角色和资源, 短期有效
+
+    Args:
+        request: 包含用户 access token
+        x_system_token: 调用方系统Token
+
+    Returns:
+        作用域Token
+    """
+    system_info = verify_system_token(x_system_token, db)
+    audience = system_info.get("sub")
+
+    try:
+        subject = jwt_handler.verify_token(request.subject_token)
+    except jwt.ExpiredSignatureError:
+        raise HTTPException(status_code=401, detail="Token已过期")
+    except jwt.InvalidTokenError:
+        raise HTTPException(status_code=401, detail="无效的Token")
+
+    if subject.get("user_type") != "user":
+        raise HTTPException(status_code=401, detail="无效的Token类型")
+    if await jwt_handler.is_blacklisted(subject.get("jti", "")):
+        raise HTTPException(status_code=401, detail="Token已被撤销")
+
+    # 紧凑Token的资源集合按摘要读取
+    resources = None
+    digest = subject.get("res_digest")
+    if digest:
+        documents, _ = await resource_document_store.get_many([digest], audience)
+        resources = documents.get(digest, {})
+
+    token, expires_in = jwt_handler.create_scoped_token(subject, audience, resources)
+    logger.info(f"[Token交换] 已签发作用域Token - user: {subject.get('sub')}, aud: {audience}")
+
+    return TokenExchangeResponse(access_token=token, expires_in=expires_in, audience=audience)
+
+
 # ========== SSO 代理端点 ==========
 
 
@@ -303,7 +358,7 @@ async def get_sso_login_url(request: SSOLoginUrlRequest):
 
     # 将 state 存储到 Redis（5分钟有效期）
     state_key = f"sso:state:{state}"
-    cache.setex(state_key, 300, request.redirect_uri)  # 存储回调地址
+    await cache.setex(state_key, 300, request.redirect_uri)  # 存储回调地址
 
     logger.info(
         f"[SSO] 生成登录 URL - state: {state[:10]}***, redirect_uri: {request.redirect_uri}"
@@ -341,14 +396,14 @@ async def exchange_sso_token(request: SSOExchangeTokenRequest, db: AsyncSession
     # 验证 state（如果提供）
     if request.state:
         state_key = f"sso:state:{request.state}"
-        stored_redirect = cache.get(state_key)
+        stored_redirect = await cache.get(state_key)
 
         if not stored_redirect:
             logger.error(f"[SSO] State 验证失败 - state: {request.state[:10]}***")
             raise HTTPException(status_code=400, detail="无效的 state 参数或已过期")
 
         # 删除已使用的 state（一次性）
-        cache.delete(state_key)
+        await cache.delete(state_key)
         logger.info(f"[SSO] State 验证通过 - redirect_uri: {stored_redirect}")
 
     try:
@@ -372,7 +427,7 @@ async def exchange_sso_token(request: SSOExchangeTokenRequest, db: AsyncSession
 
         # 5. 生成 JWT Token
         logger.info("[SSO] 步骤5: 生成 JWT Token")
-        token = jwt_handler.create_access_token(
+        token = await jwt_handler.issue_access_token(
             feishu_user_id=user.feishu_user_id,
             name=user.name,
             username=user.username,
@@ -388,7 +443,7 @@ async def exchange_sso_token(request: SSOExchangeTokenRequest, db: AsyncSession
 
         # 6. 生成 Refresh Token
         logger.info("[SSO] 步骤6: 生成 Refresh Token")
-        refresh_token = jwt_handler.create_refresh_token(user.feishu_user_id)
+        refresh_token = await jwt_handler.create_refresh_token(user.feishu_user_id)
         logger.info(f"[SSO] 步骤6完成 - refresh_token: {refresh_token[:30]}***")
 
         logger.info(f"[SSO] ✅ Token 交换成功 - 用户: {user.username} (ID: {user.feishu_user_id})")
@@ -1,66 +1,103 @@
 """Redis缓存封装"""
 
 import json
-from typing import Any, Optional
+from typing import Any, List, Optional
 
-import redis
+import redis.asyncio as redis
 
 from app.core.config import settings
 
 
 class RedisCache:
-    """Redis缓存客户端"""
+    """Redis缓存客户端(asyncio, 全进程共享一个连接池)"""
 
     def __init__(self):
-        self.client = redis.from_url(settings.REDIS_URL, encoding="utf-8", decode_responses=True)
-
-    def get(self, key: str) -> Optional[str]:
+        self.pool = redis.ConnectionPool.from_url(
+            settings.REDIS_URL,
+            encoding="utf-8",
+            decode_responses=True,
+            max_connections=settings.REDIS_MAX_CONNECTIONS,
+        )
+        self.client = redis.Redis(connection_pool=self.pool)
+
+    async def get(self, key: str) -> Optional[str]:
         """获取缓存"""
-        return self.client.get(key)
+        return await self.client.get(key)
 
-    def set(self, key: str, value: str, ex: Optional[int] = None) -> bool:
-        """设置缓存"""
-        return self.client.set(key, value, ex=ex)
+    async def set(
+        self, key: str, value: str, ex: Optional[int] = None, nx: bool = False
+    ) -> bool:
+        """设置缓存(nx=True 时仅在key不存在时设置)"""
+        return await self.client.set(key, value, ex=ex, nx=nx)
 
-    def setex(self, key: str, seconds: int, value: str) -> bool:
+    async def setex(self, key: str, seconds: int, value: str) -> bool:
         """设置带过期时间的缓存"""
-        return self.client.setex(key, seconds, value)
+        return await self.client.setex(key, seconds, value)
 
-    def delete(self, *keys: str) -> int:
+    async def delete(self, *keys: str) -> int:
         """删除缓存"""
-        return self.client.delete(*keys)
+        return await self.client.delete(*keys)
 
-    def exists(self, key: str) -> int:
+    async def exists(self, key: str) -> int:
         """检查key是否存在"""
-        return self.client.exists(key)
+        return await self.client.exists(key)
+
+    async def incr(self, key: str, amount: int = 1) -> int:
+        """自增计数"""
+        return await self.client.incr(key, amount)
 
-    def expire(self, key: str, seconds: int) -> bool:
+    async def lrange(self, key: str, start: int, end: int) -> List[str]:
+        """获取列表区间"""
+        return await self.client.lrange(key, start, end)
+
+    async def expire(self, key: str, seconds: int) -> bool:
         """设置过期时间"""
-        return self.client.expire(key, seconds)
+        return await self.client.expire(key, seconds)
 
-    def ttl(self, key: str) -> int:
+    async def ttl(self, key: str) -> int:
         """获取剩余过期时间"""
-        return self.client.ttl(key)
+        return await self.client.ttl(key)
 
-    def get_json(self, key: str) -> Optional[Any]:
+    async def get_json(self, key: str) -> Optional[Any]:
         """获取JSON缓存"""
-        value = self.get(key)
+        value = await self.get(key)
         if value:
             return json.loads(value)
         return None
 
-    def set_json(self, key: str, value: Any, ex: Optional[int] = None) -> bool:
+    async def set_json(self, key: str, value: Any, ex: Optional[int] = None) -> bool:
         """设置JSON缓存"""
-        return self.set(key, json.dumps(value, ensure_ascii=False), ex=ex)
+        return await self.set(key, json.dumps(value, ensure_ascii=False), ex=ex)
 
-    def publish(self, channel: str, message: str) -> int:
+    async def publish(self, channel: str, message: str) -> int:
         """发布消息"""
-        return self.client.publish(channel, message)
+        return await self.client.publish(channel, message)
+
+    async def xread(self, streams: dict, count: Optional[int] = None, block: Optional[int] = None):
+        """从事件流读取 streams={流: 起始ID(不含)} 之后的条目"""
+        return await self.client.xread(streams, count=count, block=block)
+
+    async def xrevrange(self, name: str, count: Optional[int] = None):
+        """倒序读取事件流条目"""
+        return await self.client.xrevrange(name, count=count)
 
     def pubsub(self):
         """获取PubSub对象"""
         return self.client.pubsub()
 
+    def register_script(self, script: str):
+        """注册Lua脚本(调用时使用EVALSHA, 脚本未加载时自动回退EVAL)"""
+        return self.client.register_script(script)
+
+    def pipeline(self, transaction: bool = True):
+        """获取Pipeline对象"""
+        return self.client.pipeline(transaction=transaction)
+
+    async def close(self):
+        """关闭连接池"""
+        await self.client.aclose()
+        await self.pool.disconnect()
+
 
 # 全局Redis客户端实例
 redis_client = RedisCache()
@@ -22,6 +22,8 @@ class Settings(BaseSettings):
 
     # Redis配置
     REDIS_URL: str = Field(..., description="Redis连接URL")
+    REDIS_MAX_CONNECTIONS: int = 50
+    PERMISSION_EVENT_STREAM_MAXLEN: int = 10000  # 每个命名空间权限事件流保留的最大条数(近似)
 
     # JWT配置
     JWT_ALGORITHM: str = "RS256"
@@ -29,12 +31,23 @@ class Settings(BaseSettings):
     JWT_REFRESH_TOKEN_EXPIRE_DAYS: int = 60 * 24 * 30
     JWT_PRIVATE_KEY_PATH: str = "./keys/private_key.pem"
     JWT_PUBLIC_KEY_PATH: str = "./keys/public_key.pem"
+    JWT_EXTRA_PUBLIC_KEY_PATHS: List[str] = []  # 轮换中的其他公钥(下一把/上一把), 发布到JWKS
+    JWT_KEY_CHECK_INTERVAL: float = 5.0  # 密钥文件变更检查间隔(秒)
+    JWT_SCOPED_TOKEN_EXPIRE_SECONDS: int = 300  # 作用域Token(单命名空间)有效期
+    JWT_COMPACT_TOKENS: bool = False  # 紧凑Token: 资源集合只携带摘要, 由SDK按需拉取
+    JWT_REFRESH_ROTATION_GRACE_SECONDS: int = 300  # 轮换宽限期: 期间重复使用旧refresh token得到同一个新token(应覆盖SDK提前刷新窗口)
 
     # 飞书配置
     FEISHU_APP_ID: str = Field(..., description="飞书应用ID")
     FEISHU_APP_SECRET: str = Field(..., description="飞书应用Secret")
     FEISHU_ENCRYPT_KEY: str = ""
     FEISHU_VERIFICATION_TOKEN: str = ""
+    FEISHU_API_BASE_URL: str = "https://open.feishu.cn/open-apis"
+    FEISHU_HTTP_TIMEOUT: float = 30.0
+    FEISHU_HTTP_MAX_CONNECTIONS: int = 20  # 飞书API长连接池大小
+    FEISHU_APP_TOKEN_REFRESH_AHEAD_SECONDS: int = 300  # app_access_token 距过期不足该时间即续期
+    FEISHU_ORG_SYNC_INTERVAL_SECONDS: int = 3600  # 组织架构(部门/用户)同步间隔, 0表示关闭后台同步
+    FEISHU_ORG_SYNC_PAGE_SIZE: int = 50  # 通讯录分页大小(飞书上限50)
 
     # CORS配置
     CORS_ORIGINS: List[str] = [
@@ -8,9 +8,9 @@ from fastapi import Depends, Header, HTTPException
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.cache import redis_client
-from app.core.config import settings
 from app.core.database import get_db
 from app.core.pubsub import pubsub_manager
+from app.core.security import jwt_handler
 from app.models.system import System
 
 
@@ -36,16 +36,12 @@ async def get_current_user(authorization: str = Header(..., description="Bearer
     token = authorization.replace("Bearer ", "")
 
     try:
-        # 读取公钥
-        with open(settings.JWT_PUBLIC_KEY_PATH, "r") as f:
-            public_key = f.read()
-
         # 验证Token
-        payload = jwt.decode(token, public_key, algorithms=[settings.JWT_ALGORITHM])
+        payload = jwt_handler.verify_token(token)
 
         # 检查黑名单
         jti = payload.get("jti", "")
-        if redis_client.exists(f"blacklist:{jti}"):
+        if await jwt_handler.is_blacklisted(jti):
             raise HTTPException(status_code=401, detail="Token已被撤销")
 
         return payload
@@ -86,16 +82,12 @@ async def require_admin_or_system(
     token = authorization.replace("Bearer ", "")
 
     try:
-        # 读取公钥
-        with open(settings.JWT_PUBLIC_KEY_PATH, "r") as f:
-            public_key = f.read()
-
         # 验证Token
-        payload = jwt.decode(token, public_key, algorithms=[settings.JWT_ALGORITHM])
+        payload = jwt_handler.verify_token(token)
 
         # 检查黑名单
         jti = payload.get("jti", "")
-        if redis_client.exists(f"blacklist:{jti}"):
+        if await jwt_handler.is_blacklisted(jti):
             raise HTTPException(status_code=401, detail="Token已被撤销")
 
         # 获取用户类型
@@ -142,13 +134,8 @@ def verify_system_token(token: str, db: AsyncSession) -> dict:
     print(f"🔍 [系统Token验证] Token前30字符: {token[:30]}...")
 
     try:
-        # 读取公钥
-        with open(settings.JWT_PUBLIC_KEY_PATH, "r") as f:
-            public_key = f.read()
-        print(f"✅ [系统Token验证] 公钥读取成功")
-
         # 验证Token
-        payload = jwt.decode(token, public_key, algorithms=[settings.JWT_ALGORITHM])
+        payload = jwt_handler.verify_token(token)
         print(f"✅ [系统Token验证] Token解码成功")
         print(f"🔍 [系统Token验证] Payload: {payload}")
 
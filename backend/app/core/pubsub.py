@@ -1,51 +1,84 @@
 """Redis Pub/Sub封装"""
 
+import asyncio
 import json
 import logging
-import threading
-from typing import Callable, Dict, Optional
+from typing import Awaitable, Callable, Dict, Optional, Union
 
 from app.core.cache import redis_client
+from app.core.config import settings
 
 logger = logging.getLogger(__name__)
 
+MessageHandler = Callable[[dict], Union[None, Awaitable[None]]]
+
+# 权限事件频道与事件流: 每个命名空间一个频道和一个同名后缀的 Redis Stream
+EVENT_CHANNEL_PREFIX = "permission:changed:"
+EVENT_STREAM_PREFIX = "permission:events:"
+
+
+def queue_event(pipe, namespace: str, message: dict):
+    """
+    在pipeline中写入权限事件: 追加到命名空间事件流(按MAXLEN近似裁剪)并发布到频道
+
+    事件流供断线/重启的订阅方按ID续读, 频道保留给只支持Pub/Sub的旧版订阅方
+
+    Args:
+        pipe: Redis pipeline
+        namespace: 命名空间
+        message: 事件内容(dict)
+    """
+    payload = json.dumps(message, ensure_ascii=False)
+    pipe.xadd(
+        f"{EVENT_STREAM_PREFIX}{namespace}",
+        {"data": payload},
+        maxlen=settings.PERMISSION_EVENT_STREAM_MAXLEN,
+        approximate=True,
+    )
+    pipe.publish(f"{EVENT_CHANNEL_PREFIX}{namespace}", payload)
+
 
 class PubSubManager:
     """Pub/Sub管理器"""
 
     def __init__(self):
         self.pubsub = redis_client.pubsub()
-        self.handlers: Dict[str, Callable] = {}
-        self.listener_thread: Optional[threading.Thread] = None
+        self.handlers: Dict[str, MessageHandler] = {}
+        self.listener_task: Optional[asyncio.Task] = None
+
+    @property
+    def is_listening(self) -> bool:
+        """监听任务是否在运行"""
+        return self.listener_task is not None and not self.listener_task.done()
 
-    def subscribe(self, channel: str, handler: Callable[[dict], None]):
+    async def subscribe(self, channel: str, handler: MessageHandler):
         """
         订阅频道
 
         Args:
             channel: 频道名称
-            handler: 消息处理函数
+            handler: 消息处理函数(普通函数或协程函数)
         """
         self.handlers[channel] = handler
-        self.pubsub.subscribe(channel)
+        await self.pubsub.subscribe(channel)
         logger.info(f"已订阅频道: {channel}")
 
-    def unsubscribe(self, channel: str):
+    async def unsubscribe(self, channel: str):
         """取消订阅"""
         if channel in self.handlers:
             del self.handlers[channel]
-            self.pubsub.unsubscribe(channel)
+            await self.pubsub.unsubscribe(channel)
             logger.info(f"已取消订阅频道: {channel}")
 
     def start_listening(self):
-        """启动监听(在后台线程)"""
-        if self.listener_thread and self.listener_thread.is_alive():
-            logger.warning("监听线程已在运行")
+        """启动监听(在后台任务, 需在事件循环中调用)"""
+        if self.is_listening:
+            logger.warning("监听任务已在运行")
             return
 
-        def listener():
-            logger.info("Pub/Sub监听线程已启动")
-            for message in self.pubsub.listen():
+        async def listener():
+            logger.info("Pub/Sub监听任务已启动")
+            async for message in self.pubsub.listen():
                 if message["type"] == "message":
                     channel = message["channel"]
                     data = message["data"]
@@ -54,20 +87,24 @@ class PubSubManager:
                         try:
                             # 解析JSON消息
                             msg_data = json.loads(data)
-                            self.handlers[channel](msg_data)
+                            result = self.handlers[channel](msg_data)
+                            if asyncio.iscoroutine(result):
+                                await result
                         except Exception as e:
                             logger.error(f"处理消息失败: {e}", exc_info=True)
 
-        self.listener_thread = threading.Thread(target=listener, daemon=True)
-        self.listener_thread.start()
+        self.listener_task = asyncio.create_task(listener())
 
-    def stop_listening(self):
+    async def stop_listening(self):
         """停止监听"""
+        if self.listener_task:
+            self.listener_task.cancel()
+            self.listener_task = None
         if self.pubsub:
-            self.pubsub.close()
+            await self.pubsub.aclose()
         logger.info("Pub/Sub监听已停止")
 
-    def publish(self, channel: str, message: dict):
+    async def publish(self, channel: str, message: dict):
         """
         发布消息
 
@@ -75,7 +112,7 @@ class PubSubManager:
             channel: 频道名称
             message: 消息内容(dict)
         """
-        redis_client.publish(channel, json.dumps(message, ensure_ascii=False))
+        await redis_client.publish(channel, json.dumps(message, ensure_ascii=False))
 
 
 # 全局Pub/Sub管理器
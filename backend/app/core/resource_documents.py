@@ -0,0 +1,85 @@
+"""资源文档存储 - 紧凑Token引用的资源集合"""
+
+import hashlib
+import json
+from typing import Dict, List, Tuple
+
+from app.core.cache import redis_client
+
+
+def resource_digest(global_resources: Dict, system_resources: Dict) -> str:
+    """资源集合的内容摘要(内容相同则摘要相同)"""
+    content = json.dumps(
+        {"global_resources": global_resources, "system_resources": system_resources},
+        ensure_ascii=False,
+        sort_keys=True,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()[:32]
+
+
+class ResourceDocumentStore:
+    """
+    资源文档存储
+
+    紧凑Token只携带资源集合的摘要, 资源集合按摘要存放在Redis(内容寻址, 写入后不变),
+    业务系统SDK按摘要批量拉取并在本地缓存
+    """
+
+    async def put(
+        self, digest: str, global_resources: Dict, system_resources: Dict, expire_seconds: int
+    ):
+        """
+        写入资源文档(同一摘要重复写入只会延长保留时间)
+
+        Args:
+            digest: 资源摘要
+            global_resources: 全局资源 {resource_type: [ids]}
+            system_resources: 系统资源 {system: {resource_type: [ids]}}
+            expire_seconds: 保留时间(秒), 不短于引用它的Token有效期
+        """
+        document = {"global_resources": global_resources, "system_resources": system_resources}
+        await redis_client.setex(
+            self._key(digest), expire_seconds, json.dumps(document, ensure_ascii=False)
+        )
+
+    async def get_many(self, digests: List[str], namespace: str) -> Tuple[Dict[str, Dict], List[str]]:
+        """
+        批量获取资源文档(系统资源只返回指定命名空间的部分)
+
+        Args:
+            digests: 资源摘要列表
+            namespace: 调用方系统的命名空间
+
+        Returns:
+            ({digest: 资源文档}, 不存在的摘要列表)
+        """
+        if not digests:
+            return {}, []
+
+        pipe = redis_client.pipeline(transaction=False)
+        for digest in digests:
+            pipe.get(self._key(digest))
+        raw_documents = await pipe.execute()
+
+        documents, missing = {}, []
+        for digest, raw in zip(digests, raw_documents):
+            if raw is None:
+                missing.append(digest)
+                continue
+            document = json.loads(raw)
+            system_resources = document.get("system_resources", {})
+            documents[digest] = {
+                "global_resources": document.get("global_resources", {}),
+                "system_resources": (
+                    {namespace: system_resources[namespace]} if namespace in system_resources else {}
+                ),
+            }
+        return documents, missing
+
+    def _key(self, digest: str) -> str:
+        return f"token:resources:{digest}"
+
+
+# 全局资源文档存储实例
+resource_document_store = ResourceDocumentStore()
@@ -0,0 +1,195 @@
+"""Token撤销列表 - 进程内副本 + Redis快照 + 事件流续读"""
+
+import asyncio
+import json
+import time
+from typing import Dict, Optional
+
+from app.core.cache import redis_client
+from app.core.logger import logger
+from app.core.pubsub import EVENT_STREAM_PREFIX, queue_event
+
+# 撤销事件所在命名空间及事件流(与 PermissionNotifier 的全局事件流一致)
+REVOCATION_NAMESPACE = "global"
+REVOCATION_STREAM = f"{EVENT_STREAM_PREFIX}{REVOCATION_NAMESPACE}"
+# 撤销索引: 有序集合 member=jti, score=过期时间戳
+REVOCATION_INDEX_KEY = "blacklist:index"
+# 事件流阻塞读取超时(毫秒)及出错后的重连间隔上限(秒)
+STREAM_BLOCK_MS = 5000
+MAX_RECONNECT_DELAY_SECONDS = 30.0
+
+
+class RevocationList:
+    """
+    Token撤销列表
+
+    撤销时一次往返写入 blacklist:{jti}、撤销索引并追加 token_revoked 事件;
+    各worker记下事件流位置后从撤销索引加载快照, 再从该位置续读事件流, 之后在进程内判断是否撤销。
+    读取出错(Redis断开等)时立即回退到 Redis EXISTS, 重连后重新加载快照并从上次位置续读,
+    断开期间的撤销不会丢失
+    """
+
+    def __init__(self):
+        # jti -> 过期时间戳
+        self._revoked: Dict[str, float] = {}
+        self._ready = False
+        self._next_purge = 0.0
+        # 事件流续读位置(已处理的最后一条事件ID)
+        self._last_id: Optional[str] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+
+    @property
+    def ready(self) -> bool:
+        """进程内副本是否可用"""
+        return self._ready and self._task is not None and not self._task.done()
+
+    async def start(self):
+        """加载快照并开始续读事件流(在应用启动时调用)"""
+        if self._task is not None and not self._task.done():
+            return
+        self._stopping = False
+        try:
+            await self._sync()
+            logger.info(f"[撤销列表] 已就绪 - 当前撤销数: {len(self._revoked)}")
+        except Exception as e:
+            # 后台任务会继续重试
+            logger.error(f"[撤销列表] 初始化失败, 回退到逐次查询Redis: {e}")
+        self._start_consumer()
+
+    async def stop(self):
+        """停止使用进程内副本"""
+        self._ready = False
+        self._stopping = True
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    def _start_consumer(self):
+        self._task = asyncio.create_task(self._consume())
+        self._task.add_done_callback(self._on_consumer_done)
+
+    def _on_consumer_done(self, task: asyncio.Task):
+        """续读任务意外结束时回退到逐次查询并重启任务"""
+        if self._stopping or task is not self._task or task.cancelled():
+            return
+        self._ready = False
+        logger.error(f"[撤销列表] 事件流续读任务意外结束, 重新启动: {task.exception()}")
+        self._start_consumer()
+
+    async def _sync(self):
+        """(重新)建立进程内副本: 先确定续读位置再加载快照, 两者之间的撤销由续读补上"""
+        self._ready = False
+        if self._last_id is None:
+            entries = await redis_client.xrevrange(REVOCATION_STREAM, count=1)
+            self._last_id = entries[0][0] if entries else "0-0"
+        await self.load_snapshot()
+        self._ready = True
+
+    async def _consume(self):
+        """续读撤销事件流, 出错时回退并在重连后重新同步"""
+        delay = 1.0
+        while True:
+            try:
+                if not self._ready:
+                    await self._sync()
+                    logger.info(f"[撤销列表] 已恢复 - 当前撤销数: {len(self._revoked)}")
+                response = await redis_client.xread(
+                    {REVOCATION_STREAM: self._last_id}, count=100, block=STREAM_BLOCK_MS
+                )
+                delay = 1.0
+                for _, entries in response or []:
+                    for entry_id, fields in entries:
+                        self._last_id = entry_id
+                        self._apply_event(fields.get("data"))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self._ready = False
+                logger.warning(f"[撤销列表] 读取事件流失败, 回退到逐次查询Redis: {e}")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, MAX_RECONNECT_DELAY_SECONDS)
+
+    def _apply_event(self, data: Optional[str]):
+        if not data:
+            return
+        try:
+            self._on_message(json.loads(data))
+        except Exception as e:
+            logger.error(f"[撤销列表] 处理撤销事件失败: {e}")
+
+    async def load_snapshot(self):
+        """从撤销索引加载未过期的撤销记录, 并清理已过期的记录"""
+        now = time.time()
+        pipe = redis_client.pipeline(transaction=False)
+        pipe.zremrangebyscore(REVOCATION_INDEX_KEY, "-inf", now)
+        pipe.zrangebyscore(REVOCATION_INDEX_KEY, now, "+inf", withscores=True)
+        _, entries = await pipe.execute()
+        self._revoked.update({jti: exp for jti, exp in entries})
+
+    async def revoke(self, jti: str, expire_seconds: int = 3600):
+        """
+        撤销Token
+
+        Args:
+            jti: JWT ID
+            expire_seconds: 撤销记录保留时间(秒)
+        """
+        now = time.time()
+        exp = now + expire_seconds
+        self._revoked[jti] = exp
+
+        message = {"type": "token_revoked", "jti": jti, "exp": exp, "timestamp": now}
+        pipe = redis_client.pipeline(transaction=True)
+        pipe.setex(f"blacklist:{jti}", expire_seconds, "1")
+        pipe.zadd(REVOCATION_INDEX_KEY, {jti: exp})
+        pipe.zremrangebyscore(REVOCATION_INDEX_KEY, "-inf", now)
+        queue_event(pipe, REVOCATION_NAMESPACE, message)
+        await pipe.execute()
+
+    async def is_revoked(self, jti: str) -> bool:
+        """
+        检查Token是否已撤销
+
+        Args:
+            jti: JWT ID
+
+        Returns:
+            是否已撤销
+        """
+        if not jti:
+            return False
+
+        if not self.ready:
+            return await redis_client.exists(f"blacklist:{jti}") > 0
+
+        exp = self._revoked.get(jti)
+        if exp is None:
+            return False
+        if exp <= time.time():
+            self._revoked.pop(jti, None)
+            return False
+        return True
+
+    def _on_message(self, message: dict):
+        """处理撤销事件(同一事件流上的其他事件忽略)"""
+        if message.get("type") != "token_revoked" or not message.get("jti"):
+            return
+        self._revoked[message["jti"]] = float(message.get("exp") or time.time() + 3600)
+        self._purge_expired()
+
+    def _purge_expired(self):
+        """定期清理已过期的记录(最多每分钟一次)"""
+        now = time.time()
+        if now < self._next_purge:
+            return
+        self._next_purge = now + 60
+        self._revoked = {jti: exp for jti, exp in self._revoked.items() if exp > now}
+
+
+# 全局撤销列表实例
+revocation_list = RevocationList()
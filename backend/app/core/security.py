@@ -1,24 +1,242 @@
 """安全相关工具"""
 
+import base64
+import hashlib
+import json
+import os
 import secrets
+import threading
+import time
 from datetime import datetime, timedelta
-from typing import Dict, Optional, Tuple
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
 import jwt
+from jwt.algorithms import RSAAlgorithm
 from cryptography.hazmat.backends import default_backend
 from cryptography.hazmat.primitives import serialization
 from cryptography.hazmat.primitives.asymmetric import rsa
 
 from app.core.cache import redis_client
 from app.core.config import settings
+from app.core.logger import logger
+from app.core.resource_documents import resource_digest, resource_document_store
+from app.core.revocation import revocation_list
+
+# Refresh Token 有效期(秒)
+REFRESH_TOKEN_EXPIRE_SECONDS = 7 * 24 * 3600
+
+# 作用域Token的头部typ(带aud, 只包含单个命名空间的权限)
+SCOPED_TOKEN_TYPE = "at+jwt"
+
+# 作用域Token沿用的用户信息字段
+_SCOPED_PROFILE_FIELDS = (
+    "sub", "user_type", "feishu_user_id", "name", "username", "avatar", "email",
+    "dept_ids", "dept_names", "global_roles",
+)
+
+# 原子轮换 refresh token: 校验旧token -> 删除旧token -> 写入新token -> 记录轮换结果
+# 宽限期内再次轮换同一个旧token(并发刷新、提前刷新的响应未送达等)返回轮换记录并标记为 replay,
+# 调用方确认新token仍有效后返回同一个新token(轮换幂等), 新token已被再次轮换或撤销时不再返回
+# KEYS[1]=旧token键, KEYS[2]=新token键, KEYS[3]=旧token的轮换记录键
+# ARGV[1]=新token有效期(秒), ARGV[2]=宽限期(秒), ARGV[3]=新token
+_ROTATE_REFRESH_TOKEN_SCRIPT = """
+local rotated = redis.call('GET', KEYS[3])
+if rotated then
+    local result = cjson.decode(rotated)
+    return {result[1], result[2], 'replay'}
+end
+local user_id = redis.call('GET', KEYS[1])
+if not user_id then
+    return false
+end
+redis.call('DEL', KEYS[1])
+redis.call('SETEX', KEYS[2], ARGV[1], user_id)
+if tonumber(ARGV[2]) > 0 then
+    redis.call('SETEX', KEYS[3], ARGV[2], cjson.encode({user_id, ARGV[3]}))
+end
+return {user_id, ARGV[3], 'rotated'}
+"""
+
+
+def public_key_to_jwk(public_key) -> Dict:
+    """
+    将RSA公钥转换为JWK, kid 取 RFC 7638 指纹(同一把密钥在任何实例上 kid 都相同)
+
+    Args:
+        public_key: RSA公钥对象
+
+    Returns:
+        JWK字典
+    """
+    jwk = RSAAlgorithm.to_jwk(public_key, as_dict=True)
+    thumbprint_input = json.dumps(
+        {"e": jwk["e"], "kty": jwk["kty"], "n": jwk["n"]}, separators=(",", ":"), sort_keys=True
+    )
+    digest = hashlib.sha256(thumbprint_input.encode("utf-8")).digest()
+    jwk["kid"] = base64.urlsafe_b64encode(digest).rstrip(b"=").decode("ascii")
+    jwk["use"] = "sig"
+    jwk["alg"] = "RS256"
+    return jwk
+
+
+class _PemKeyFile:
+    """单个PEM密钥文件(记录mtime, 仅在文件变化时重新解析)"""
+
+    def __init__(self, path: str, loader: Callable[[bytes], Any]):
+        self.path = path
+        self.loader = loader
+        self.key: Any = None
+        self.pem: str = ""
+        self.jwk: Dict = {}
+        self.mtime_ns: Optional[int] = None
+
+    @property
+    def kid(self) -> str:
+        return self.jwk.get("kid", "")
+
+    @property
+    def verifying_key(self):
+        """验证用公钥(私钥文件取其公钥部分)"""
+        if hasattr(self.key, "public_key"):
+            return self.key.public_key()
+        return self.key
+
+    def refresh(self):
+        """文件mtime变化时重新加载; 已加载过的密钥在读取失败时保留旧值"""
+        try:
+            mtime_ns = os.stat(self.path).st_mtime_ns
+            if mtime_ns == self.mtime_ns:
+                return
+
+            with open(self.path, "rb") as f:
+                pem = f.read()
+            self.key = self.loader(pem)
+            self.pem = pem.decode("utf-8")
+            self.jwk = public_key_to_jwk(self.verifying_key)
+            self.mtime_ns = mtime_ns
+            logger.info(f"[密钥管理] 已加载密钥: {self.path} (kid={self.kid})")
+        except Exception as e:
+            if self.key is None:
+                raise
+            logger.warning(f"[密钥管理] 重新加载密钥失败, 继续使用旧密钥 - {self.path}: {e}")
+
+
+class KeyManager:
+    """
+    JWT密钥管理器
+
+    首次使用时加载并解析PEM密钥为cryptography密钥对象, 之后所有签名和验证
+    直接复用; 每隔 check_interval 秒检查一次文件mtime, 密钥轮换后自动重新加载
+
+    extra_public_key_paths 用于零停机轮换: 先把下一把公钥发布到JWKS,
+    切换签名私钥后再保留上一把公钥, 直到旧Token全部过期
+    """
+
+    def __init__(
+        self,
+        private_key_path: str,
+        public_key_path: str,
+        extra_public_key_paths: Optional[List[str]] = None,
+        check_interval: float = 5.0,
+    ):
+        self.check_interval = check_interval
+        self._private = _PemKeyFile(
+            private_key_path,
+            lambda pem: serialization.load_pem_private_key(pem, password=None),
+        )
+        self._public = _PemKeyFile(public_key_path, serialization.load_pem_public_key)
+        self._extra_public = [
+            _PemKeyFile(path, serialization.load_pem_public_key)
+            for path in (extra_public_key_paths or [])
+        ]
+        self._lock = threading.Lock()
+        self._next_check: Dict[str, float] = {}
+
+    @property
+    def private_key(self):
+        """签名用私钥对象"""
+        return self._get(self._private).key
+
+    @property
+    def active_kid(self) -> str:
+        """当前签名密钥的kid"""
+        return self._get(self._private).kid
+
+    @property
+    def public_key(self):
+        """验证用公钥对象"""
+        return self._get(self._public).key
+
+    @property
+    def public_key_pem(self) -> str:
+        """公钥PEM文本(供业务系统下载)"""
+        return self._get(self._public).pem
+
+    def get_public_key(self, kid: str):
+        """
+        按kid查找验证公钥
+
+        Args:
+            kid: 密钥ID
+
+        Returns:
+            公钥对象, 未知kid返回None
+        """
+        for key_file in self._verifying_files():
+            if key_file.kid == kid:
+                return key_file.verifying_key
+        return None
+
+    def jwks(self) -> Dict:
+        """当前发布的JWK集合(签名密钥 + 轮换中的其他公钥)"""
+        keys = []
+        seen = set()
+        for key_file in self._verifying_files():
+            if key_file.kid not in seen:
+                seen.add(key_file.kid)
+                keys.append(dict(key_file.jwk))
+        return {"keys": keys}
+
+    def reload(self):
+        """强制立即检查密钥文件"""
+        with self._lock:
+            self._next_check.clear()
+        self._get(self._private)
+        self._get(self._public)
+        self._verifying_files()
+
+    def _verifying_files(self) -> List[_PemKeyFile]:
+        """可用于验证的密钥文件, 读取失败的额外公钥会被跳过"""
+        files = [self._get(self._private), self._get(self._public)]
+        for key_file in self._extra_public:
+            try:
+                files.append(self._get(key_file))
+            except Exception as e:
+                logger.warning(f"[密钥管理] 加载额外公钥失败 - {key_file.path}: {e}")
+        return files
+
+    def _get(self, key_file: _PemKeyFile) -> _PemKeyFile:
+        """按检查间隔刷新密钥文件后返回"""
+        now = time.monotonic()
+        if key_file.key is not None and now < self._next_check.get(key_file.path, 0.0):
+            return key_file
+
+        with self._lock:
+            if key_file.key is None or now >= self._next_check.get(key_file.path, 0.0):
+                key_file.refresh()
+                self._next_check[key_file.path] = now + self.check_interval
+
+        return key_file
 
 
 class JWTHandler:
     """JWT处理器"""
 
-    def __init__(self):
+    def __init__(self, keys: KeyManager):
+        self.keys = keys
         self.algorithm = settings.JWT_ALGORITHM
         self.expire_minutes = settings.JWT_ACCESS_TOKEN_EXPIRE_MINUTES
+        self._rotate_refresh_script = redis_client.register_script(_ROTATE_REFRESH_TOKEN_SCRIPT)
 
     def create_access_token(
         self,
@@ -34,10 +252,14 @@ class JWTHandler:
         dept_ids: list = None,
         dept_names: list = None,
         expires_delta: Optional[timedelta] = None,
+        compact: Optional[bool] = None,
     ) -> str:
         """
         创建用户Token
 
+        紧凑模式下不内嵌资源集合, 只携带其摘要 res_digest(无资源时不携带),
+        资源文档需另行写入(见 issue_access_token)
+
         Args:
             feishu_user_id: 飞书用户ID
             name: 用户拼音
@@ -51,10 +273,13 @@ class JWTHandler:
             dept_ids: 部门ID列表
             dept_names: 部门名称列表
             expires_delta: 过期时间
+            compact: 是否紧凑Token, 默认取 JWT_COMPACT_TOKENS
 
         Returns:
             JWT Token
         """
+        if compact is None:
+            compact = settings.JWT_COMPACT_TOKENS
         if expires_delta is None:
             expires_delta = timedelta(minutes=self.expire_minutes)
 
@@ -72,20 +297,87 @@ class JWTHandler:
             "dept_names": dept_names or [],
             "global_roles": global_roles,
             "system_roles": system_roles,
-            "global_resources": global_resources,
-            "system_resources": system_resources,
             "exp": expire,
             "iat": datetime.utcnow(),
             "jti": f"user_{feishu_user_id}_{int(datetime.utcnow().timestamp())}",
         }
+        if not compact:
+            payload["global_resources"] = global_resources
+            payload["system_resources"] = system_resources
+        elif global_resources or system_resources:
+            payload["res_digest"] = resource_digest(global_resources, system_resources)
+
+        return self._encode(payload)
 
-        # 读取私钥
-        with open(settings.JWT_PRIVATE_KEY_PATH, "r") as f:
-            private_key = f.read()
+    async def issue_access_token(self, **kwargs) -> str:
+        """
+        创建用户Token, 紧凑模式下同时写入Token引用的资源文档
+
+        参数同 create_access_token
+        """
+        token = self.create_access_token(**kwargs)
+
+        compact = kwargs.get("compact")
+        if compact is None:
+            compact = settings.JWT_COMPACT_TOKENS
+        global_resources = kwargs.get("global_resources") or {}
+        system_resources = kwargs.get("system_resources") or {}
+        if compact and (global_resources or system_resources):
+            expires_delta = kwargs.get("expires_delta") or timedelta(minutes=self.expire_minutes)
+            await resource_document_store.put(
+                resource_digest(global_resources, system_resources),
+                global_resources,
+                system_resources,
+                int(expires_delta.total_seconds()) + 300,
+            )
 
-        token = jwt.encode(payload, private_key, algorithm=self.algorithm)
         return token
 
+    def create_scoped_token(
+        self, subject: Dict, audience: str, resources: Optional[Dict] = None
+    ) -> Tuple[str, int]:
+        """
+        由已验证的用户Token换取作用域Token
+
+        作用域Token带 aud=audience, 只包含该命名空间的角色和资源, 有效期不超过
+        JWT_SCOPED_TOKEN_EXPIRE_SECONDS 且不晚于原Token; jti沿用原Token, 撤销原Token同时撤销作用域Token
+
+        Args:
+            subject: 用户Token payload
+            audience: 目标命名空间(系统代码)
+            resources: 紧凑Token引用的资源文档, 默认从payload读取
+
+        Returns:
+            (作用域Token, 有效期秒数)
+        """
+        now = datetime.utcnow()
+        expire = min(
+            datetime.utcfromtimestamp(subject["exp"]),
+            now + timedelta(seconds=settings.JWT_SCOPED_TOKEN_EXPIRE_SECONDS),
+        )
+        if resources is None:
+            resources = subject
+
+        payload = {field: subject[field] for field in _SCOPED_PROFILE_FIELDS if field in subject}
+        system_roles = subject.get("system_roles", {})
+        system_resources = resources.get("system_resources", {})
+        payload.update(
+            {
+                "aud": audience,
+                "system_roles": {audience: system_roles[audience]} if audience in system_roles else {},
+                "global_resources": resources.get("global_resources", {}),
+                "system_resources": (
+                    {audience: system_resources[audience]} if audience in system_resources else {}
+                ),
+                "exp": expire,
+                "iat": now,
+                "jti": subject.get("jti"),
+            }
+        )
+
+        token = self._encode(payload, typ=SCOPED_TOKEN_TYPE)
+        return token, max(int((expire - now).total_seconds()), 0)
+
     def generate_system_token(
         self, system_id: str, system_name: str, expires_days: int = 365
     ) -> str:
@@ -111,12 +403,7 @@ class JWTHandler:
             "jti": f"system_{system_id}_{int(datetime.utcnow().timestamp())}",
         }
 
-        # 读取私钥
-        with open(settings.JWT_PRIVATE_KEY_PATH, "r") as f:
-            private_key = f.read()
-
-        token = jwt.encode(payload, private_key, algorithm=self.algorithm)
-        return token
+        return self._encode(payload)
 
     def verify_token(self, token: str) -> Dict:
         """
@@ -128,14 +415,26 @@ class JWTHandler:
         Returns:
             Token payload
         """
-        # 读取公钥
-        with open(settings.JWT_PUBLIC_KEY_PATH, "r") as f:
-            public_key = f.read()
+        kid = jwt.get_unverified_header(token).get("kid")
+        if kid:
+            public_key = self.keys.get_public_key(kid)
+            if public_key is None:
+                raise jwt.InvalidTokenError(f"未知的密钥ID: {kid}")
+        else:
+            # 兼容未携带kid的旧Token
+            public_key = self.keys.public_key
 
         payload = jwt.decode(token, public_key, algorithms=[self.algorithm])
         return payload
 
-    def add_to_blacklist(self, jti: str, expire_seconds: int = 3600):
+    def _encode(self, payload: Dict, typ: Optional[str] = None) -> str:
+        """使用当前私钥签名, 并在头部写入kid(及typ)"""
+        headers = {"kid": self.keys.active_kid}
+        if typ:
+            headers["typ"] = typ
+        return jwt.encode(payload, self.keys.private_key, algorithm=self.algorithm, headers=headers)
+
+    async def add_to_blacklist(self, jti: str, expire_seconds: int = 3600):
         """
         将Token加入黑名单
 
@@ -143,9 +442,9 @@ class JWTHandler:
             jti: JWT ID
             expire_seconds: 过期时间(秒)
         """
-        redis_client.setex(f"blacklist:{jti}", expire_seconds, "1")
+        await revocation_list.revoke(jti, expire_seconds)
 
-    def is_blacklisted(self, jti: str) -> bool:
+    async def is_blacklisted(self, jti: str) -> bool:
         """
         检查Token是否在黑名单
 
@@ -155,9 +454,9 @@ class JWTHandler:
         Returns:
             是否在黑名单
         """
-        return redis_client.exists(f"blacklist:{jti}") > 0
+        return await revocation_list.is_revoked(jti)
 
-    def create_refresh_token(self, user_id: str) -> str:
+    async def create_refresh_token(self, user_id: str) -> str:
         """
         生成 refresh token 并存储到 Redis
 
@@ -169,14 +468,48 @@ class JWTHandler:
         """
         token = secrets.token_urlsafe(64)
         # 存储到 Redis，7天过期
-        redis_client.setex(
+        await redis_client.setex(
             f"refresh_token:{token}",
-            7 * 24 * 3600,  # 7天
+            REFRESH_TOKEN_EXPIRE_SECONDS,
             user_id,
         )
         return token
 
-    def verify_refresh_token(self, token: str) -> Optional[str]:
+    async def rotate_refresh_token(self, token: str) -> Tuple[Optional[str], Optional[str]]:
+        """
+        原子轮换 refresh token
+
+        在一次Redis往返中完成: 校验旧token、撤销旧token、签发新token;
+        宽限期(JWT_REFRESH_ROTATION_GRACE_SECONDS)内重复轮换同一个旧token返回同一个新token,
+        SDK提前刷新的新Cookie未能及时送达浏览器时, 之后的请求(包括其他worker)仍能拿到并下发;
+        新token已失效(登出、再次轮换)时视为无效
+
+        Args:
+            token: 旧的 Refresh Token
+
+        Returns:
+            (用户ID, 新的 Refresh Token)，旧token无效时返回 (None, None)
+        """
+        new_token = secrets.token_urlsafe(64)
+        result = await self._rotate_refresh_script(
+            keys=[
+                f"refresh_token:{token}",
+                f"refresh_token:{new_token}",
+                f"refresh_token:rotated:{token}",
+            ],
+            args=[REFRESH_TOKEN_EXPIRE_SECONDS, settings.JWT_REFRESH_ROTATION_GRACE_SECONDS, new_token],
+        )
+        if not result:
+            return None, None
+
+        user_id, successor, outcome = result
+        if outcome == "replay":
+            # 后继token在脚本外检查(脚本只访问声明的键, 兼容Redis Cluster)
+            if not await redis_client.exists(f"refresh_token:{successor}"):
+                return None, None
+        return user_id, successor
+
+    async def verify_refresh_token(self, token: str) -> Optional[str]:
         """
         验证 refresh token
 
@@ -186,17 +519,17 @@ class JWTHandler:
         Returns:
             用户ID (Feishu User ID)，如果无效则返回 None
         """
-        user_id = redis_client.get(f"refresh_token:{token}")
+        user_id = await redis_client.get(f"refresh_token:{token}")
         return user_id if user_id else None
 
-    def revoke_refresh_token(self, token: str):
+    async def revoke_refresh_token(self, token: str):
         """
         撤销 refresh token
 
         Args:
             token: Refresh Token
         """
-        redis_client.delete(f"refresh_token:{token}")
+        await redis_client.delete(f"refresh_token:{token}")
 
 
 def generate_rsa_keys(key_size: int = 2048) -> Tuple[str, str]:
@@ -233,7 +566,13 @@ def generate_rsa_keys(key_size: int = 2048) -> Tuple[str, str]:
 
 
 # 全局实例
-jwt_handler = JWTHandler()
+key_manager = KeyManager(
+    settings.JWT_PRIVATE_KEY_PATH,
+    settings.JWT_PUBLIC_KEY_PATH,
+    extra_public_key_paths=settings.JWT_EXTRA_PUBLIC_KEY_PATHS,
+    check_interval=settings.JWT_KEY_CHECK_INTERVAL,
+)
+jwt_handler = JWTHandler(key_manager)
 
 
 # 便捷函数
@@ -247,11 +586,11 @@ def verify_token(token: str):
     return jwt_handler.verify_token(token)
 
 
-def add_to_blacklist(jti: str, expire_seconds: int = 3600):
+async def add_to_blacklist(jti: str, expire_seconds: int = 3600):
     """加入黑名单"""
-    jwt_handler.add_to_blacklist(jti, expire_seconds)
+    await jwt_handler.add_to_blacklist(jti, expire_seconds)
 
 
-def is_blacklisted(jti: str):
+async def is_blacklisted(jti: str):
     """检查黑名单"""
-    return jwt_handler.is_blacklisted(jti)
+    return await jwt_handler.is_blacklisted(jti)
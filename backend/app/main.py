@@ -3,11 +3,17 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 
+from app.auth.feishu import feishu_client
+from app.core.cache import redis_client
 from app.core.config import settings
+from app.core.pubsub import pubsub_manager
+from app.core.revocation import revocation_list
 from app.auth.router import router as auth_router
+from app.auth.router import well_known_router
 from app.systems.router import router as systems_router
 from app.rbac.router import router as rbac_router
 from app.users.router import router as users_router
+from app.users.org_sync import feishu_org_sync
 
 
 @asynccontextmanager
@@ -16,11 +22,19 @@ async def lifespan(app: FastAPI):
     # 启动时执行
     print(f"🚀 {settings.APP_NAME} v{settings.APP_VERSION} 启动中...")
     print(f"📝 Swagger文档: http://{settings.HOST}:{settings.PORT}/docs")
+    await revocation_list.start()
+    await feishu_client.start()
+    await feishu_org_sync.start()
     
     yield
     
     # 关闭时执行
     print(f"👋 {settings.APP_NAME} 关闭中...")
+    await revocation_list.stop()
+    await feishu_org_sync.stop()
+    await feishu_client.close()
+    await pubsub_manager.stop_listening()
+    await redis_client.close()
 
 
 # 创建FastAPI应用
@@ -47,6 +61,7 @@ app.include_router(auth_router, prefix="/api/v1")
 app.include_router(systems_router, prefix="/api/v1")
 app.include_router(rbac_router, prefix="/api/v1")
 app.include_router(users_router, prefix="/api/v1")
+app.include_router(well_known_router)
 
 
 @app.get("/health")
@@ -1,79 +1,55 @@
 """权限变更通知器"""
-import json
 import time
-from typing import Dict
+from typing import Dict, List
 from app.core.cache import redis_client
-from app.models.role import Role
+from app.core.pubsub import queue_event
+from app.core.revocation import revocation_list
+
+# 事件格式版本号: 2 起配置事件携带修订号和变更内容
+EVENT_SCHEMA_VERSION = 2
+
+# 单条配置事件携带的最大变更数
+MAX_EVENT_CHANGES = 200
 
 
 class PermissionNotifier:
-    """权限变更通知器 - 通过Redis Pub/Sub通知各系统"""
+    """权限变更通知器 - 通过Redis事件流和Pub/Sub通知各系统"""
     
     def __init__(self):
         self.redis = redis_client
     
-    def notify_role_created(self, role: Role):
-        """角色创建通知"""
-        self._publish(role.namespace, {
-            "type": "role_created",
-            "role_id": role.id,
-            "role_code": role.code,
-            "timestamp": time.time()
-        })
-    
-    def notify_role_updated(self, role: Role):
-        """角色更新通知"""
-        self._publish(role.namespace, {
-            "type": "role_updated",
-            "role_id": role.id,
-            "timestamp": time.time()
-        })
-    
-    def notify_role_permissions_updated(self, role: Role):
-        """角色权限更新通知"""
-        self._publish(role.namespace, {
-            "type": "role_permissions_updated",
-            "role_id": role.id,
+    async def notify_config_changed(self, namespace: str, revision: int, changes: List[Dict]):
+        """
+        配置变更通知(携带新修订号和变更内容, 订阅方可直接应用)
+
+        变更过多时不携带内容, 订阅方按修订号走增量同步接口
+        """
+        await self._publish(namespace, {
+            "type": "config_changed",
+            "namespace": namespace,
+            "revision": revision,
+            "changes": changes if len(changes) <= MAX_EVENT_CHANGES else None,
             "timestamp": time.time()
         })
     
-    def notify_user_permissions_changed(self, user_id: str):
+    async def notify_user_permissions_changed(self, user_id: str):
         """用户权限变更通知(影响所有系统)"""
         # 发布到全局channel
-        self._publish("global", {
+        await self._publish("global", {
             "type": "user_permissions_changed",
             "user_id": user_id,
             "timestamp": time.time()
         })
     
-    def notify_config_updated(self, namespace: str):
-        """配置更新通知"""
-        self._publish(namespace, {
-            "type": "config_updated",
-            "config_version": self._get_config_version(namespace),
-            "timestamp": time.time()
-        })
-    
-    def notify_token_revoked(self, jti: str):
-        """Token撤销通知"""
-        # 加入黑名单
-        self.redis.setex(f"blacklist:{jti}", 3600, "1")
-        
-        # 发布通知
-        self._publish("global", {
-            "type": "token_revoked",
-            "jti": jti,
-            "timestamp": time.time()
-        })
-    
-    def _publish(self, namespace: str, message: Dict):
-        """发布消息到Redis"""
-        channel = f"permission:changed:{namespace}"
-        self.redis.publish(channel, json.dumps(message, ensure_ascii=False))
+    async def notify_token_revoked(self, jti: str):
+        """Token撤销通知(加入黑名单并发布 token_revoked 事件)"""
+        await revocation_list.revoke(jti, 3600)
     
-    def _get_config_version(self, namespace: str) -> str:
-        """获取配置版本号"""
-        return f"v{namespace}_{int(time.time())}"
+    async def _publish(self, namespace: str, message: Dict):
+        """写入命名空间事件流并发布到频道(附带事件格式版本号)"""
+        pipe = self.redis.pipeline(transaction=False)
+        queue_event(pipe, namespace, {"schema": EVENT_SCHEMA_VERSION, **message})
+        await pipe.execute()
 
 
 # 全局通知器实例
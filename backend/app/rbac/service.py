@@ -1,15 +1,52 @@
 """RBAC服务"""
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, delete
-from sqlalchemy.orm import selectinload
-from typing import List, Optional
+from sqlalchemy.orm import joinedload, selectinload
+from typing import Dict, Iterable, List, Optional
 from app.models.role import Role
 from app.models.permission import Permission, RolePermission
 from app.models.user_role import UserRole
 from app.models.user import User
 from app.models.route_pattern import RoutePattern
 from app.models.resource_binding import ResourceBinding
+from app.models.system import System
 from app.rbac.notifier import permission_notifier
+from app.systems.config_cache import config_snapshot_cache, delete_change, upsert_change
+from app.systems.service import ConfigSyncService
+from app.users.permission_cache import permission_document_cache
+
+
+async def _record_role_changes(
+    db: AsyncSession, role_ids: Iterable[int], changes: Optional[Dict[str, List[Dict]]] = None
+):
+    """
+    写操作提交后记录配置变更: 重新加载角色生成upsert, 按命名空间递增修订号
+
+    Args:
+        db: 数据库会话
+        role_ids: 需要upsert的角色ID
+        changes: 额外的变更 {namespace: [change]}
+    """
+    changes = {namespace: list(items) for namespace, items in (changes or {}).items()}
+    role_ids = list(role_ids)
+    if role_ids:
+        result = await db.execute(
+            select(Role)
+            .filter(Role.id.in_(role_ids))
+            .options(selectinload(Role.permissions).joinedload(RolePermission.permission))
+        )
+        for role in result.scalars().all():
+            key, data = ConfigSyncService.role_entry(role, role.namespace)
+            changes.setdefault(role.namespace, []).append(upsert_change("role", key, data))
+
+    for namespace, items in changes.items():
+        await _publish_config_changes(namespace, items)
+
+
+async def _publish_config_changes(namespace: str, changes: List[Dict]):
+    """递增命名空间配置修订号并广播变更内容"""
+    revision = await config_snapshot_cache.bump(namespace, changes)
+    await permission_notifier.notify_config_changed(namespace, revision, changes)
 
 
 class RoleService:
@@ -37,9 +74,7 @@ class RoleService:
         self.db.add(role)
         await self.db.commit()
         await self.db.refresh(role)
-        
-        # 通知权限变更
-        permission_notifier.notify_role_created(role)
+        await _record_role_changes(self.db, [role.id])
         
         return role
     
@@ -66,6 +101,7 @@ class RoleService:
             
             await self.db.commit()
             await self.db.refresh(role)
+            await _record_role_changes(self.db, [role.id])
         
         return role
     
@@ -77,12 +113,29 @@ class RoleService:
         if not role:
             return False
         
+        namespace = role.namespace
+        role_key = ConfigSyncService.strip_namespace(role.code, namespace)
+        
+        # 级联删除的路由规则(按所属系统记录删除变更)
+        routes_result = await self.db.execute(
+            select(RoutePattern.id, System.code)
+            .join(System, System.id == RoutePattern.system_id)
+            .filter(RoutePattern.role_id == role_id)
+        )
+        changes = {namespace: [delete_change("role", role_key)]}
+        for route_id, system_code in routes_result.all():
+            changes.setdefault(system_code, []).append(delete_change("route_pattern", route_id))
+        
         # 删除角色权限关联
         await self.db.execute(
             delete(RolePermission).where(RolePermission.role_id == role_id)
         )
         
-        # 删除用户角色关联
+        # 删除用户角色关联(记录受影响的用户)
+        users_result = await self.db.execute(
+            select(UserRole.user_id).filter(UserRole.role_id == role_id)
+        )
+        affected_user_ids = list(users_result.scalars().all())
         await self.db.execute(
             delete(UserRole).where(UserRole.role_id == role_id)
         )
@@ -90,6 +143,8 @@ class RoleService:
         # 删除角色
         await self.db.delete(role)
         await self.db.commit()
+        await permission_document_cache.invalidate(*affected_user_ids)
+        await _record_role_changes(self.db, [], changes)
         
         return True
     
@@ -125,9 +180,7 @@ class RoleService:
         
         await self.db.commit()
         await self.db.refresh(role)
-        
-        # 通知权限变更
-        permission_notifier.notify_role_permissions_updated(role)
+        await _record_role_changes(self.db, [role_id])
     
     async def assign_role_to_user(self, user_id: str, role_id: int, created_by: Optional[str] = None):
         """为用户分配角色"""
@@ -138,9 +191,10 @@ class RoleService:
         )
         self.db.add(user_role)
         await self.db.commit()
+        await permission_document_cache.invalidate(user_id)
         
         # 通知用户权限变更
-        permission_notifier.notify_user_permissions_changed(user_id)
+        await permission_notifier.notify_user_permissions_changed(user_id)
     
     async def remove_role_from_user(self, user_id: str, role_id: int) -> bool:
         """移除用户角色"""
@@ -154,7 +208,8 @@ class RoleService:
         
         # 通知用户权限变更
         if result.rowcount > 0:
-            permission_notifier.notify_user_permissions_changed(user_id)
+            await permission_document_cache.invalidate(user_id)
+            await permission_notifier.notify_user_permissions_changed(user_id)
             return True
         return False
 
@@ -188,6 +243,7 @@ class PermissionService:
         self.db.add(permission)
         await self.db.commit()
         await self.db.refresh(permission)
+        await self._record_permission_change(permission)
         
         return permission
     
@@ -220,6 +276,7 @@ class PermissionService:
             
             await self.db.commit()
             await self.db.refresh(permission)
+            await self._record_permission_change(permission)
         
         return permission
     
@@ -231,6 +288,15 @@ class PermissionService:
         if not permission:
             return False
         
+        namespace = permission.namespace
+        permission_key = ConfigSyncService.strip_namespace(permission.code, namespace)
+        
+        # 失去该权限的角色
+        roles_result = await self.db.execute(
+            select(RolePermission.role_id).filter(RolePermission.permission_id == permission_id)
+        )
+        role_ids = list(roles_result.scalars().all())
+        
         # 删除权限与角色的关联
         await self.db.execute(
             delete(RolePermission).where(RolePermission.permission_id == permission_id)
@@ -239,8 +305,16 @@ class PermissionService:
         # 删除权限
         await self.db.delete(permission)
         await self.db.commit()
+        await _record_role_changes(
+            self.db, role_ids, {namespace: [delete_change("permission", permission_key)]}
+        )
         
         return True
+    
+    async def _record_permission_change(self, permission: Permission):
+        """记录权限新增/修改的配置变更"""
+        key, data = ConfigSyncService.permission_entry(permission, permission.namespace)
+        await _publish_config_changes(permission.namespace, [upsert_change("permission", key, data)])
 
 
 class RoutePatternService:
@@ -270,6 +344,7 @@ class RoutePatternService:
         self.db.add(route)
         await self.db.commit()
         await self.db.refresh(route)
+        await self._record_route_change(route.id)
         
         return route
     
@@ -302,6 +377,7 @@ class RoutePatternService:
             
             await self.db.commit()
             await self.db.refresh(route)
+            await self._record_route_change(route.id)
         
         return route
     
@@ -313,10 +389,32 @@ class RoutePatternService:
         if not route:
             return False
         
+        system_result = await self.db.execute(
+            select(System.code).filter(System.id == route.system_id)
+        )
+        namespace = system_result.scalar_one_or_none()
+        
         await self.db.delete(route)
         await self.db.commit()
+        if namespace:
+            await _publish_config_changes(namespace, [delete_change("route_pattern", route_id)])
         
         return True
+    
+    async def _record_route_change(self, route_id: int):
+        """记录路由规则新增/修改的配置变更(写入所属系统的命名空间)"""
+        result = await self.db.execute(
+            select(RoutePattern, System.code)
+            .join(System, System.id == RoutePattern.system_id)
+            .filter(RoutePattern.id == route_id)
+            .options(joinedload(RoutePattern.role))
+        )
+        row = result.first()
+        if row is None:
+            return
+        route, namespace = row
+        data = ConfigSyncService.route_pattern_entry(route, namespace)
+        await _publish_config_changes(namespace, [upsert_change("route_pattern", route.id, data)])
 
 
 class ResourceBindingService:
@@ -348,9 +446,10 @@ class ResourceBindingService:
         self.db.add(binding)
         await self.db.commit()
         await self.db.refresh(binding)
+        await permission_document_cache.invalidate(user_id)
         
         # 通知用户权限变更
-        permission_notifier.notify_user_permissions_changed(user_id)
+        await permission_notifier.notify_user_permissions_changed(user_id)
         
         return binding
     
@@ -380,9 +479,10 @@ class ResourceBindingService:
             self.db.add(binding)
         
         await self.db.commit()
+        await permission_document_cache.invalidate(user_id)
         
         # 通知用户权限变更
-        permission_notifier.notify_user_permissions_changed(user_id)
+        await permission_notifier.notify_user_permissions_changed(user_id)
     
     async def list_bindings(
         self,
@@ -418,9 +518,10 @@ class ResourceBindingService:
         user_id = binding.user_id
         await self.db.delete(binding)
         await self.db.commit()
+        await permission_document_cache.invalidate(user_id)
         
         # 通知用户权限变更
-        permission_notifier.notify_user_permissions_changed(user_id)
+        await permission_notifier.notify_user_permissions_changed(user_id)
         
         return True
 
@@ -1,6 +1,6 @@
 """认证相关的Pydantic模式"""
 from pydantic import BaseModel, Field
-from typing import Optional, Dict
+from typing import Optional, Dict, List
 
 
 class TokenResponse(BaseModel):
@@ -34,6 +34,12 @@ class PublicKeyResponse(BaseModel):
     """公钥响应"""
     public_key: str
     algorithm: str = "RS256"
+    kid: Optional[str] = None
+
+
+class JWKSResponse(BaseModel):
+    """JWK集合响应"""
+    keys: List[Dict]
 
 
 class SSOLoginUrlRequest(BaseModel):
@@ -58,3 +64,16 @@ class RefreshTokenRequest(BaseModel):
     """刷新Token请求"""
     refresh_token: str = Field(..., description="Refresh Token")
 
+
+
+class TokenExchangeRequest(BaseModel):
+    """作用域Token交换请求"""
+    subject_token: str = Field(..., description="用户Access Token")
+
+
+class TokenExchangeResponse(BaseModel):
+    """作用域Token交换响应"""
+    access_token: str = Field(..., description="只包含目标系统权限的作用域Token")
+    token_type: str = "bearer"
+    expires_in: int
+    audience: str = Field(..., description="目标系统代码(Token的aud)")
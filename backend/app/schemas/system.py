@@ -1,6 +1,6 @@
 """系统相关的Pydantic模式"""
 from pydantic import BaseModel, Field
-from typing import Optional, Dict, List
+from typing import Optional, Dict, List, Union
 from datetime import datetime
 
 
@@ -35,6 +35,7 @@ class SystemWithToken(SystemResponse):
 class SystemConfigResponse(BaseModel):
     """系统配置响应"""
     version: str
+    revision: int = 0
     updated_at: int
     namespace: str
     roles: Dict[str, Dict]
@@ -42,6 +43,56 @@ class SystemConfigResponse(BaseModel):
     route_patterns: List[Dict]
 
 
+class SystemConfigChangesResponse(BaseModel):
+    """系统配置增量变更响应"""
+    namespace: str
+    since: int
+    revision: int
+    truncated: bool = Field(..., description="变更日志已截断, 需要全量同步")
+    changes: List[Dict] = Field(..., description="变更列表: {type, op, key, data}")
+
+
+class ResourceDocumentsRequest(BaseModel):
+    """批量获取资源文档请求"""
+    digests: List[str] = Field(..., description="紧凑Token中的资源摘要(res_digest)", max_length=500)
+
+
+class ResourceDocumentsResponse(BaseModel):
+    """批量获取资源文档响应"""
+    documents: Dict[str, Dict] = Field(..., description="摘要 -> {global_resources, system_resources}")
+    missing: List[str] = Field(default_factory=list, description="已不存在的摘要")
+
+
+class RouteQuery(BaseModel):
+    """批量授权中的路由问题"""
+    method: str = Field("GET", description="HTTP方法")
+    path: str = Field(..., description="路由路径")
+
+
+class ResourceQuery(BaseModel):
+    """批量授权中的资源问题"""
+    resource_type: str
+    resource_id: Union[int, str]
+
+
+class AuthorizeRequest(BaseModel):
+    """批量授权请求"""
+    token: str = Field(..., description="用户 access token")
+    permissions: List[str] = Field(default_factory=list, description="权限代码(resource:action)", max_length=500)
+    routes: List[RouteQuery] = Field(default_factory=list, max_length=500)
+    resources: List[ResourceQuery] = Field(default_factory=list, max_length=500)
+    include_effective: bool = Field(False, description="是否同时返回全部有效权限")
+
+
+class AuthorizeResponse(BaseModel):
+    """批量授权响应"""
+    config_version: str
+    permissions: Dict[str, bool] = Field(..., description="权限代码 -> 是否拥有")
+    routes: List[bool] = Field(..., description="与请求中 routes 顺序一致")
+    resources: List[bool] = Field(..., description="与请求中 resources 顺序一致")
+    effective_permissions: Optional[List[str]] = None
+
+
 class SystemUpdate(BaseModel):
     """更新系统"""
     name: Optional[str] = None
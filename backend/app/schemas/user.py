@@ -1,7 +1,7 @@
 """用户相关的Pydantic模式"""
 
 from datetime import datetime
-from typing import Dict, List, Optional
+from typing import Any, Dict, List, Optional
 
 from pydantic import BaseModel, Field
 
@@ -85,3 +85,11 @@ class UserSimpleListResponse(BaseModel):
 
     total: int = Field(..., description="总数")
     items: List[UserSimpleResponse] = Field(..., description="用户列表")
+
+
+class OrgSyncResponse(BaseModel):
+    """组织架构同步响应"""
+
+    started: bool = Field(..., description="是否发起了新的同步(本进程已在同步时为False)")
+    running: bool = Field(..., description="本进程是否正在同步")
+    last_result: Optional[Dict[str, Any]] = Field(None, description="最近一次完成的同步统计")
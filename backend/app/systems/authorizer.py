@@ -0,0 +1,112 @@
+"""批量授权 - 按系统配置快照在服务端回答权限/路由/资源问题
+
+配置编译(角色权限展开、路由索引)和资源集合直接使用 SDK 的实现, 服务端与SDK本地检查语义一致
+"""
+
+import json
+import threading
+from itertools import chain
+from typing import Dict, Iterable, Optional, Tuple
+
+from authhub_sdk.checker import CompiledConfig, ResourceSet
+
+from app.systems.config_cache import ConfigSnapshot
+
+
+class SystemAuthorizer:
+    """
+    批量授权器
+
+    编译结果按 (命名空间, 配置版本) 缓存在进程内, 配置快照不变时不重复编译;
+    一次请求中有效权限集合和每类资源集合只计算一次
+    """
+
+    # 编译结果缓存上限(超过后整体清空)
+    MAX_COMPILED_CONFIGS = 256
+
+    def __init__(self):
+        self._compiled: Dict[Tuple[str, str], CompiledConfig] = {}
+        self._lock = threading.Lock()
+
+    def get_compiled(self, namespace: str, snapshot: ConfigSnapshot) -> CompiledConfig:
+        """获取配置快照对应的编译结果"""
+        key = (namespace, snapshot.version)
+        compiled = self._compiled.get(key)
+        if compiled is not None:
+            return compiled
+
+        compiled = CompiledConfig(json.loads(snapshot.body))
+        with self._lock:
+            if len(self._compiled) >= self.MAX_COMPILED_CONFIGS:
+                self._compiled.clear()
+            self._compiled[key] = compiled
+        return compiled
+
+    def authorize(
+        self,
+        compiled: CompiledConfig,
+        namespace: str,
+        token_payload: Dict,
+        permissions: Iterable[str] = (),
+        routes: Iterable[Tuple[str, str]] = (),
+        resources: Iterable[Tuple[str, object]] = (),
+        resource_document: Optional[Dict] = None,
+        include_effective: bool = False,
+    ) -> Dict:
+        """
+        一次回答一组权限、路由和资源问题
+
+        Args:
+            compiled: 编译后的系统配置
+            namespace: 系统命名空间
+            token_payload: 用户Token payload
+            permissions: 权限代码列表(resource:action)
+            routes: (HTTP方法, 路径) 列表
+            resources: (资源类型, 资源ID) 列表
+            resource_document: 紧凑Token对应的资源文档(为空时使用payload中的资源)
+            include_effective: 是否返回有效权限集合
+
+        Returns:
+            {"permissions": {代码: bool}, "routes": [bool], "resources": [bool],
+             "effective_permissions": [代码] | None}
+        """
+        is_admin = "admin" in token_payload.get("global_roles", [])
+        user_roles = token_payload.get("system_roles", {}).get(namespace, [])
+        granted = (
+            compiled.all_permissions
+            if is_admin
+            else compiled.permission_table.effective(user_roles)
+        )
+
+        # 通配符已在编译时展开为配置中的权限代码
+        permission_results = {code: is_admin or code in granted for code in permissions}
+
+        route_results = [
+            is_admin or compiled.route_index.match(user_roles, path, method)
+            for method, path in routes
+        ]
+
+        source = resource_document or token_payload
+        global_resources = source.get("global_resources") or {}
+        namespace_resources = (source.get("system_resources") or {}).get(namespace) or {}
+        resource_sets: Dict[str, ResourceSet] = {}
+        resource_results = []
+        for resource_type, resource_id in resources:
+            resource_set = resource_sets.get(resource_type)
+            if resource_set is None:
+                resource_set = resource_sets[resource_type] = ResourceSet(chain(
+                    global_resources.get(resource_type, ()),
+                    namespace_resources.get(resource_type, ()),
+                ))
+            resource_results.append(resource_id in resource_set)
+
+        return {
+            "permissions": permission_results,
+            "routes": route_results,
+            "resources": resource_results,
+            "effective_permissions": sorted(granted) if include_effective else None,
+        }
+
+
+# 全局批量授权器实例
+system_authorizer = SystemAuthorizer()
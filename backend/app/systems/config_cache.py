@@ -0,0 +1,180 @@
+"""系统配置快照缓存"""
+
+import json
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from app.core.cache import redis_client
+
+# 快照在Redis中的保留时间(秒), 过期后按需重建
+SNAPSHOT_TTL_SECONDS = 24 * 3600
+
+# 每个命名空间保留的变更日志条数(每次修订一条), 更早的修订只能全量同步
+MAX_CHANGELOG_ENTRIES = 1000
+
+# 原子地递增修订号并追加变更日志, 并发写入的日志顺序与修订号一致, 也不会只递增不追加
+# KEYS[1]=修订号键, KEYS[2]=变更日志键
+# ARGV[1]=本次变更列表(JSON数组), ARGV[2]=日志保留条数
+_BUMP_REVISION_SCRIPT = """
+local revision = redis.call('INCR', KEYS[1])
+redis.call('RPUSH', KEYS[2], '{"revision": ' .. revision .. ', "changes": ' .. ARGV[1] .. '}')
+redis.call('LTRIM', KEYS[2], -tonumber(ARGV[2]), -1)
+return revision
+"""
+
+
+def upsert_change(kind: str, key, data: Dict) -> Dict:
+    """
+    构建新增/修改变更
+
+    Args:
+        kind: 变更对象类型(role, permission, route_pattern)
+        key: 对象在配置中的键(角色/权限代码, 路由规则ID)
+        data: 对象在配置中的完整内容
+    """
+    return {"type": kind, "op": "upsert", "key": key, "data": data}
+
+
+def delete_change(kind: str, key) -> Dict:
+    """构建删除变更"""
+    return {"type": kind, "op": "delete", "key": key}
+
+
+class ConfigSnapshot:
+    """序列化好的系统配置快照"""
+
+    def __init__(self, revision: int, version: str, body: bytes):
+        self.revision = revision
+        self.version = version
+        self.body = body
+
+
+class ConfigSnapshotCache:
+    """
+    系统配置快照缓存
+
+    每个命名空间维护一个修订号(config:revision:{namespace}), RBAC写操作提交后递增;
+    快照以修订号为键存放在Redis和进程内, 读取配置只需一次修订号查询加一次缓存读取;
+    每次修订的变更记录在变更日志(config:changelog:{namespace})中, 供SDK增量同步
+    """
+
+    def __init__(self):
+        # namespace -> 最近一次使用的快照
+        self._local: Dict[str, ConfigSnapshot] = {}
+        self._bump_script = redis_client.register_script(_BUMP_REVISION_SCRIPT)
+
+    async def get_revision(self, namespace: str) -> int:
+        """获取命名空间当前修订号"""
+        return int(await redis_client.get(self._revision_key(namespace)) or 0)
+
+    async def bump(self, namespace: str, changes: Optional[List[Dict]] = None) -> int:
+        """
+        递增命名空间修订号(配置写操作提交后调用), 使旧快照失效, 并把本次变更写入变更日志
+
+        Args:
+            namespace: 命名空间
+            changes: 本次修订的变更列表(upsert_change/delete_change)
+
+        Returns:
+            新的修订号
+        """
+        self._local.pop(namespace, None)
+        return await self._bump_script(
+            keys=[self._revision_key(namespace), self._changelog_key(namespace)],
+            args=[json.dumps(changes or [], ensure_ascii=False), MAX_CHANGELOG_ENTRIES],
+        )
+
+    async def get_changes(self, namespace: str, since: int) -> Dict:
+        """
+        获取某修订号之后的配置变更(同一对象的多次变更合并为最后一次)
+
+        变更日志被截断、缺失或 since 超前时返回 truncated=True, 调用方需要全量同步
+
+        Args:
+            namespace: 命名空间
+            since: 调用方已同步到的修订号
+
+        Returns:
+            {namespace, since, revision, truncated, changes}
+        """
+        revision = await self.get_revision(namespace)
+        result = {
+            "namespace": namespace,
+            "since": since,
+            "revision": revision,
+            "truncated": False,
+            "changes": [],
+        }
+        if since == revision:
+            return result
+        if since > revision:
+            result["truncated"] = True
+            return result
+
+        entries = [
+            json.loads(raw) for raw in await redis_client.lrange(self._changelog_key(namespace), 0, -1)
+        ]
+        entries = sorted(
+            (entry for entry in entries if since < entry["revision"] <= revision),
+            key=lambda entry: entry["revision"],
+        )
+
+        # 修订号必须从 since+1 连续到当前修订号, 否则说明日志已截断或写入丢失
+        if [entry["revision"] for entry in entries] != list(range(since + 1, revision + 1)):
+            result["truncated"] = True
+            return result
+
+        merged: Dict[tuple, Dict] = {}
+        for entry in entries:
+            for change in entry["changes"]:
+                ident = (change["type"], change["key"])
+                merged.pop(ident, None)
+                merged[ident] = change
+        result["changes"] = list(merged.values())
+        return result
+
+    async def get_or_build(
+        self, namespace: str, builder: Callable[[], Awaitable[Dict]]
+    ) -> ConfigSnapshot:
+        """
+        获取当前修订号对应的快照, 进程内和Redis都未命中时调用 builder 从数据库构建
+
+        Args:
+            namespace: 命名空间
+            builder: 构建配置字典的协程函数
+
+        Returns:
+            配置快照
+        """
+        revision = await self.get_revision(namespace)
+
+        snapshot = self._local.get(namespace)
+        if snapshot is not None and snapshot.revision == revision:
+            return snapshot
+
+        snapshot_key = self._snapshot_key(namespace, revision)
+        body = await redis_client.get(snapshot_key)
+        if body is not None:
+            version = json.loads(body)["version"]
+        else:
+            config = await builder()
+            config["revision"] = revision
+            version = config["version"]
+            body = json.dumps(config, ensure_ascii=False, separators=(",", ":"))
+            await redis_client.setex(snapshot_key, SNAPSHOT_TTL_SECONDS, body)
+
+        snapshot = ConfigSnapshot(revision, version, body.encode("utf-8"))
+        self._local[namespace] = snapshot
+        return snapshot
+
+    def _revision_key(self, namespace: str) -> str:
+        return f"config:revision:{namespace}"
+
+    def _snapshot_key(self, namespace: str, revision: int) -> str:
+        return f"config:snapshot:{namespace}:{revision}"
+
+    def _changelog_key(self, namespace: str) -> str:
+        return f"config:changelog:{namespace}"
+
+
+# 全局配置快照缓存实例
+config_snapshot_cache = ConfigSnapshotCache()
@@ -1,12 +1,23 @@
 """系统管理API路由"""
 
-from fastapi import APIRouter, Depends, Header, HTTPException
+from typing import Optional
+
+import jwt
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.database import get_db
+from app.core.resource_documents import resource_document_store
 from app.core.dependencies import require_admin, verify_system_token
+from app.core.logger import logger
+from app.core.security import jwt_handler
 from app.schemas.rbac import PermissionResponse, RoleResponse
 from app.schemas.system import (
+    AuthorizeRequest,
+    AuthorizeResponse,
+    ResourceDocumentsRequest,
+    ResourceDocumentsResponse,
+    SystemConfigChangesResponse,
     SystemConfigResponse,
     SystemCreate,
     SystemResponse,
@@ -14,6 +25,7 @@ from app.schemas.system import (
     SystemUpdate,
     SystemWithToken,
 )
+from app.systems.authorizer import system_authorizer
 from app.systems.service import ConfigSyncService, SystemService
 
 router = APIRouter(prefix="/systems", tags=["系统管理"])
@@ -76,6 +88,7 @@ async def get_system(
 async def get_system_config(
     system_id: int,
     x_system_token: str = Header(..., alias="X-System-Token"),
+    if_none_match: Optional[str] = Header(None, alias="If-None-Match"),
     db: AsyncSession = Depends(get_db),
 ):
     """
@@ -83,6 +96,7 @@ async def get_system_config(
 
     供业务系统拉取配置使用
     需要提供系统Token
+    支持 If-None-Match: 配置版本未变化时返回 304
     """
     print(f"\n{'=' * 60}")
     print(f"📥 [获取系统配置] system_id={system_id}")
@@ -118,12 +132,147 @@ async def get_system_config(
     # 获取配置
     print(f"🔍 [获取系统配置] 开始获取配置...")
     config_service = ConfigSyncService(db)
-    config = await config_service.get_system_config(system)
+    snapshot = await config_service.get_config_snapshot(system)
+
+    etag = f'"{snapshot.version}"'
+    if _etag_matches(if_none_match, etag):
+        print(f"✅ [获取系统配置] 配置未变化: {snapshot.version}")
+        print(f"{'=' * 60}\n")
+        return Response(status_code=304, headers={"ETag": etag})
 
     print(f"✅ [获取系统配置] 配置获取成功")
     print(f"{'=' * 60}\n")
 
-    return config
+    # 直接返回预序列化的快照
+    return Response(content=snapshot.body, media_type="application/json", headers={"ETag": etag})
+
+
+@router.get("/{system_id}/config/changes", response_model=SystemConfigChangesResponse)
+async def get_system_config_changes(
+    system_id: int,
+    since: int = Query(..., ge=0, description="已同步到的配置修订号"),
+    x_system_token: str = Header(..., alias="X-System-Token"),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    获取系统配置在某修订号之后的增量变更
+
+    供业务系统增量同步配置使用, 需要提供系统Token
+    truncated=true 时变更日志已不完整, 需要改用全量配置接口
+    """
+    system_info = verify_system_token(x_system_token, db)
+
+    system_service = SystemService(db)
+    system = await system_service.get_system_by_id(system_id)
+    if not system:
+        raise HTTPException(status_code=404, detail="系统不存在")
+
+    if system_info.get("sub") != system.code:
+        raise HTTPException(status_code=403, detail="无权访问该系统配置")
+
+    config_service = ConfigSyncService(db)
+    changes = await config_service.get_config_changes(system, since)
+    logger.debug(
+        f"[配置增量同步] {system.code}: since={since}, revision={changes['revision']}, "
+        f"changes={len(changes['changes'])}, truncated={changes['truncated']}"
+    )
+    return changes
+
+
+@router.post("/{system_id}/resources/bulk", response_model=ResourceDocumentsResponse)
+async def get_resource_documents(
+    system_id: int,
+    request: ResourceDocumentsRequest,
+    x_system_token: str = Header(..., alias="X-System-Token"),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    批量获取紧凑Token引用的资源文档
+
+    供业务系统SDK解析紧凑Token使用, 需要提供系统Token
+    系统资源只返回调用方系统命名空间的部分
+    """
+    system_info = verify_system_token(x_system_token, db)
+
+    system_service = SystemService(db)
+    system = await system_service.get_system_by_id(system_id)
+    if not system:
+        raise HTTPException(status_code=404, detail="系统不存在")
+
+    if system_info.get("sub") != system.code:
+        raise HTTPException(status_code=403, detail="无权访问该系统资源")
+
+    documents, missing = await resource_document_store.get_many(
+        list(dict.fromkeys(request.digests)), system.code
+    )
+    return {"documents": documents, "missing": missing}
+
+
+@router.post("/{system_id}/authorize", response_model=AuthorizeResponse)
+async def authorize(
+    system_id: int,
+    request: AuthorizeRequest,
+    x_system_token: str = Header(..., alias="X-System-Token"),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    批量授权: 一次回答用户Token的一组权限、路由和资源问题
+
+    供未接入SDK的业务系统使用(如页面一次判断全部菜单和按钮), 需要提供系统Token
+    判断语义与SDK本地检查一致, 基于该系统当前的配置快照
+    """
+    system_info = verify_system_token(x_system_token, db)
+
+    system_service = SystemService(db)
+    system = await system_service.get_system_by_id(system_id)
+    if not system:
+        raise HTTPException(status_code=404, detail="系统不存在")
+
+    if system_info.get("sub") != system.code:
+        raise HTTPException(status_code=403, detail="无权访问该系统配置")
+
+    try:
+        payload = jwt_handler.verify_token(request.token)
+    except jwt.ExpiredSignatureError:
+        raise HTTPException(status_code=401, detail="Token已过期")
+    except jwt.InvalidTokenError:
+        raise HTTPException(status_code=401, detail="无效的Token")
+
+    if payload.get("user_type") != "user":
+        raise HTTPException(status_code=401, detail="无效的Token类型")
+    if await jwt_handler.is_blacklisted(payload.get("jti", "")):
+        raise HTTPException(status_code=401, detail="Token已被撤销")
+
+    # 紧凑Token的资源集合按摘要读取
+    resource_document = None
+    digest = payload.get("res_digest")
+    if digest and request.resources:
+        documents, _ = await resource_document_store.get_many([digest], system.code)
+        resource_document = documents.get(digest, {})
+
+    config_service = ConfigSyncService(db)
+    snapshot = await config_service.get_config_snapshot(system)
+    compiled = system_authorizer.get_compiled(system.code, snapshot)
+
+    result = system_authorizer.authorize(
+        compiled,
+        system.code,
+        payload,
+        permissions=request.permissions,
+        routes=[(route.method, route.path) for route in request.routes],
+        resources=[(res.resource_type, res.resource_id) for res in request.resources],
+        resource_document=resource_document,
+        include_effective=request.include_effective,
+    )
+    return {"config_version": snapshot.version, **result}
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """判断 If-None-Match 是否命中当前 ETag"""
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or any(tag.removeprefix("W/") == etag for tag in candidates)
 
 
 @router.put("/{system_id}", response_model=SystemResponse)
@@ -1,14 +1,18 @@
 """系统管理服务"""
+import hashlib
+import json
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
-from typing import Optional, Dict, List
+from sqlalchemy.orm import joinedload, selectinload
+from typing import Optional, Dict, List, Tuple
 from datetime import datetime
 
 from app.models.system import System
 from app.models.role import Role
-from app.models.permission import Permission
+from app.models.permission import Permission, RolePermission
 from app.models.route_pattern import RoutePattern
 from app.core.security import jwt_handler
+from app.systems.config_cache import ConfigSnapshot, config_snapshot_cache
 
 
 class SystemService:
@@ -177,9 +181,38 @@ class ConfigSyncService:
     def __init__(self, db: AsyncSession):
         self.db = db
     
+    async def get_config_snapshot(self, system: System) -> ConfigSnapshot:
+        """
+        获取系统配置快照(按命名空间修订号缓存的序列化配置)
+        
+        Args:
+            system: 系统对象
+            
+        Returns:
+            配置快照
+        """
+        return await config_snapshot_cache.get_or_build(
+            system.code, lambda: self.get_system_config(system)
+        )
+    
+    async def get_config_changes(self, system: System, since: int) -> Dict:
+        """
+        获取系统配置在某修订号之后的增量变更
+        
+        Args:
+            system: 系统对象
+            since: 调用方已同步到的修订号
+            
+        Returns:
+            变更字典(truncated=True 时需要全量同步)
+        """
+        return await config_snapshot_cache.get_changes(system.code, since)
+    
     async def get_system_config(self, system: System) -> Dict:
         """
-        获取系统的完整权限配置
+        从数据库构建系统的完整权限配置
+        
+        关联数据全部预加载(固定4条查询, 无N+1和异步懒加载)
         
         Args:
             system: 系统对象
@@ -189,74 +222,86 @@ class ConfigSyncService:
         """
         namespace = system.code
         
-        # 查询系统的角色
+        # 查询系统的角色(预加载角色权限)
         roles_result = await self.db.execute(
-            select(Role).filter(Role.namespace == namespace)
+            select(Role)
+            .filter(Role.namespace == namespace)
+            .options(selectinload(Role.permissions).joinedload(RolePermission.permission))
+            .order_by(Role.id)
         )
         roles = list(roles_result.scalars().all())
         
         # 查询系统的权限
         permissions_result = await self.db.execute(
-            select(Permission).filter(Permission.namespace == namespace)
+            select(Permission).filter(Permission.namespace == namespace).order_by(Permission.id)
         )
         permissions = list(permissions_result.scalars().all())
         
-        # 查询系统的路由规则
+        # 查询系统的路由规则(JOIN加载所属角色)
         route_patterns_result = await self.db.execute(
-            select(RoutePattern).filter(RoutePattern.system_id == system.id)
+            select(RoutePattern)
+            .filter(RoutePattern.system_id == system.id)
+            .options(joinedload(RoutePattern.role))
+            .order_by(RoutePattern.id)
         )
         route_patterns = list(route_patterns_result.scalars().all())
         
         # 构建配置
         config = {
-            "version": self._get_config_version(system),
-            "updated_at": int(datetime.utcnow().timestamp()),
             "namespace": namespace,
-            
-            "roles": {
-                self._strip_namespace(role.code, namespace): {
-                    "id": role.id,
-                    "name": role.name,
-                    "description": role.description,
-                    "permissions": [
-                        self._strip_namespace(rp.permission.code, namespace)
-                        for rp in role.permissions
-                    ]
-                }
-                for role in roles
-            },
-            
-            "permissions": {
-                self._strip_namespace(perm.code, namespace): {
-                    "id": perm.id,
-                    "name": perm.name,
-                    "resource_type": perm.resource_type,
-                    "action": perm.action
-                }
-                for perm in permissions
-            },
-            
-            "route_patterns": [
-                {
-                    "role": self._strip_namespace(route.role.code, namespace),
-                    "pattern": route.pattern,
-                    "method": route.method,
-                    "priority": route.priority
-                }
-                for route in route_patterns
-            ]
+            "roles": dict(self.role_entry(role, namespace) for role in roles),
+            "permissions": dict(self.permission_entry(perm, namespace) for perm in permissions),
+            "route_patterns": [self.route_pattern_entry(route, namespace) for route in route_patterns]
         }
+        config["version"] = self._get_config_version(config)
+        config["updated_at"] = int(datetime.utcnow().timestamp())
         
         return config
     
-    def _strip_namespace(self, code: str, namespace: str) -> str:
+    @classmethod
+    def role_entry(cls, role: Role, namespace: str) -> Tuple[str, Dict]:
+        """角色在配置中的(键, 内容), 需预加载 role.permissions 及其 permission"""
+        return cls.strip_namespace(role.code, namespace), {
+            "id": role.id,
+            "name": role.name,
+            "description": role.description,
+            "permissions": sorted(
+                cls.strip_namespace(rp.permission.code, namespace)
+                for rp in role.permissions
+            )
+        }
+    
+    @classmethod
+    def permission_entry(cls, perm: Permission, namespace: str) -> Tuple[str, Dict]:
+        """权限在配置中的(键, 内容)"""
+        return cls.strip_namespace(perm.code, namespace), {
+            "id": perm.id,
+            "name": perm.name,
+            "resource_type": perm.resource_type,
+            "action": perm.action
+        }
+    
+    @classmethod
+    def route_pattern_entry(cls, route: RoutePattern, namespace: str) -> Dict:
+        """路由规则在配置中的内容, 需预加载 route.role"""
+        return {
+            "id": route.id,
+            "role": cls.strip_namespace(route.role.code, namespace),
+            "pattern": route.pattern,
+            "method": route.method,
+            "priority": route.priority
+        }
+    
+    @staticmethod
+    def strip_namespace(code: str, namespace: str) -> str:
         """去除命名空间前缀"""
         prefix = f"{namespace}:"
         if code.startswith(prefix):
             return code[len(prefix):]
         return code
     
-    def _get_config_version(self, system: System) -> str:
-        """获取配置版本号"""
-        return f"v{system.code}_{int(datetime.utcnow().timestamp())}"
+    def _get_config_version(self, config: Dict) -> str:
+        """获取配置版本号(配置内容的哈希, 内容不变则版本不变)"""
+        content = json.dumps(config, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+        return "v" + hashlib.sha256(content.encode("utf-8")).hexdigest()[:32]
 
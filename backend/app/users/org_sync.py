@@ -0,0 +1,316 @@
+"""飞书组织架构同步 - 分页拉取通讯录部门/用户, 批量写入用户表"""
+
+import asyncio
+import time
+import uuid
+from typing import Dict, List, Optional, Set
+
+from app.auth.feishu import feishu_client
+from app.core.cache import redis_client
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.core.logger import logger
+from app.models.user import User
+from app.users.service import UserService
+
+# 同步锁(多worker/多实例只有一个在同步)及断点
+ORG_SYNC_LOCK_KEY = "feishu_org_sync:lock"
+ORG_SYNC_CHECKPOINT_KEY = "feishu_org_sync:checkpoint"
+# 最近一次完成同步的时间戳(多实例共享, 重启后据此判断是否到期)
+ORG_SYNC_LAST_COMPLETED_KEY = "feishu_org_sync:last_completed"
+ORG_SYNC_LOCK_TTL_SECONDS = 600  # 每处理一页续期
+ORG_SYNC_CHECKPOINT_TTL_SECONDS = 24 * 3600
+# 飞书根部门ID
+ROOT_DEPARTMENT_ID = "0"
+# 写入前校验长度的字符串字段 -> 列长度
+_USER_FIELD_LENGTHS = {
+    field: User.__table__.c[field].type.length
+    for field in ("feishu_user_id", "name", "username", "email", "mobile")
+}
+
+# 仅在锁仍归自己时续期(ARGV[2]>0)或释放(ARGV[2]=0)
+# KEYS[1]=锁键, ARGV[1]=持有者标识, ARGV[2]=续期时间(秒)
+_ORG_SYNC_LOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) ~= ARGV[1] then
+    return 0
+end
+if tonumber(ARGV[2]) > 0 then
+    return redis.call('EXPIRE', KEYS[1], ARGV[2])
+end
+return redis.call('DEL', KEYS[1])
+"""
+
+
+class FeishuOrgSync:
+    """
+    飞书组织架构同步
+
+    先分页拉取全部部门(部门ID -> 名称), 再逐个部门分页拉取直属用户, 每页一条
+    INSERT ... ON CONFLICT 写入用户及其 dept_ids/dept_names; 内容未变化的用户不改写。
+    每页写入后把 (部门, page_token) 记为断点, 同步中断(重启、超时、飞书限流)后下一次
+    从断点继续, 而不是从头再拉一遍
+    """
+
+    def __init__(self):
+        self._loop_task: Optional[asyncio.Task] = None
+        self._sync_task: Optional[asyncio.Task] = None
+        self._lock_script = None
+        # 最近一次完成的同步统计
+        self.last_result: Optional[Dict] = None
+
+    @property
+    def running(self) -> bool:
+        """本进程是否正在同步"""
+        return self._sync_task is not None and not self._sync_task.done()
+
+    async def start(self):
+        """
+        启动定时同步(在应用启动时调用, FEISHU_ORG_SYNC_INTERVAL_SECONDS 为0时不启动)
+
+        距上次完成同步不足一个间隔时不会立即同步, 重启不会触发全量同步; 有未完成的断点时立即继续
+        """
+        if settings.FEISHU_ORG_SYNC_INTERVAL_SECONDS <= 0 or self._loop_task is not None:
+            return
+        self._loop_task = asyncio.create_task(self._loop())
+        logger.info(
+            f"[组织同步] 定时同步已启动 - 间隔: {settings.FEISHU_ORG_SYNC_INTERVAL_SECONDS}s"
+        )
+
+    async def stop(self):
+        """停止定时同步及进行中的同步(断点保留, 下次继续)"""
+        for task in (self._loop_task, self._sync_task):
+            if task is not None:
+                task.cancel()
+                try:
+                    await task
+                except BaseException:
+                    pass
+        self._loop_task = None
+        self._sync_task = None
+
+    def trigger(self) -> bool:
+        """
+        在后台立即发起一次同步
+
+        Returns:
+            是否发起(本进程已在同步时返回 False)
+        """
+        if self.running:
+            return False
+        self._sync_task = asyncio.create_task(self.run_once())
+        self._sync_task.add_done_callback(self._log_sync_error)
+        return True
+
+    async def _loop(self):
+        interval = settings.FEISHU_ORG_SYNC_INTERVAL_SECONDS
+        while True:
+            try:
+                delay = await self._seconds_until_due()
+            except Exception as e:
+                logger.warning(f"[组织同步] 读取上次同步时间失败, 按间隔等待: {e}")
+                delay = interval
+            if delay <= 0:
+                if not self.running:
+                    self.trigger()
+                delay = interval
+            await asyncio.sleep(delay)
+
+    async def _seconds_until_due(self) -> float:
+        """距下一次同步的秒数(有断点或从未同步过时为0)"""
+        if await redis_client.exists(ORG_SYNC_CHECKPOINT_KEY):
+            return 0
+        last_completed = await redis_client.get(ORG_SYNC_LAST_COMPLETED_KEY)
+        if not last_completed:
+            return 0
+        return float(last_completed) + settings.FEISHU_ORG_SYNC_INTERVAL_SECONDS - time.time()
+
+    @staticmethod
+    def _log_sync_error(task: asyncio.Task):
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"[组织同步] 同步失败, 下次从断点继续: {task.exception()}")
+
+    async def run_once(self) -> Optional[Dict]:
+        """
+        执行一次同步
+
+        Returns:
+            同步统计, 其他worker/实例正在同步时返回 None
+        """
+        owner = uuid.uuid4().hex
+        acquired = await redis_client.set(
+            ORG_SYNC_LOCK_KEY, owner, ex=ORG_SYNC_LOCK_TTL_SECONDS, nx=True
+        )
+        if not acquired:
+            logger.info("[组织同步] 其他实例正在同步, 跳过")
+            return None
+
+        try:
+            result = await self._sync(owner)
+        finally:
+            await self._lock(owner, 0)
+
+        self.last_result = result
+        await redis_client.set(ORG_SYNC_LAST_COMPLETED_KEY, str(time.time()))
+        logger.info(f"[组织同步] 同步完成 - {result}")
+        return result
+
+    async def _lock(self, owner: str, ttl: int) -> int:
+        """续期(ttl>0)或释放(ttl=0)同步锁"""
+        if self._lock_script is None:
+            self._lock_script = redis_client.register_script(_ORG_SYNC_LOCK_SCRIPT)
+        return await self._lock_script(keys=[ORG_SYNC_LOCK_KEY], args=[owner, ttl])
+
+    async def _sync(self, owner: str) -> Dict:
+        started = time.monotonic()
+        departments = await self.load_departments()
+        department_ids = [ROOT_DEPARTMENT_ID] + list(departments)
+
+        # 从断点继续: 跳过已完成的部门, 从记录的分页标记开始
+        start_index, page_token = 0, None
+        checkpoint = await redis_client.get_json(ORG_SYNC_CHECKPOINT_KEY)
+        if checkpoint and checkpoint.get("department_id") in department_ids:
+            start_index = department_ids.index(checkpoint["department_id"])
+            page_token = checkpoint.get("page_token")
+            logger.info(
+                f"[组织同步] 从断点继续 - 部门: {checkpoint['department_id']} "
+                f"({start_index + 1}/{len(department_ids)})"
+            )
+
+        stats = {
+            "departments": len(departments),
+            "users": 0,
+            "written": 0,
+            "skipped": 0,
+            "pages": 0,
+        }
+        seen: Set[str] = set()
+        for index in range(start_index, len(department_ids)):
+            await self._sync_department_users(
+                owner, department_ids[index], page_token, departments, seen, stats
+            )
+            page_token = None
+            if index + 1 < len(department_ids):
+                await self._save_checkpoint(owner, department_ids[index + 1], None)
+
+        await redis_client.delete(ORG_SYNC_CHECKPOINT_KEY)
+        stats["duration_seconds"] = round(time.monotonic() - started, 3)
+        return stats
+
+    async def load_departments(self) -> Dict[str, str]:
+        """分页拉取全部部门, 返回 open_department_id -> 部门名称"""
+        departments: Dict[str, str] = {}
+        page_token = None
+        while True:
+            page = await feishu_client.list_departments(
+                ROOT_DEPARTMENT_ID, page_token, settings.FEISHU_ORG_SYNC_PAGE_SIZE
+            )
+            for item in page.get("items") or []:
+                departments[item["open_department_id"]] = item.get("name", "")
+            page_token = page.get("page_token")
+            if not page.get("has_more") or not page_token:
+                return departments
+
+    async def _sync_department_users(
+        self,
+        owner: str,
+        department_id: str,
+        page_token: Optional[str],
+        departments: Dict[str, str],
+        seen: Set[str],
+        stats: Dict,
+    ):
+        """分页同步一个部门的直属用户, 每页写入后记录断点"""
+        resumed = page_token is not None
+        while True:
+            try:
+                page = await feishu_client.list_department_users(
+                    department_id, page_token, settings.FEISHU_ORG_SYNC_PAGE_SIZE
+                )
+            except Exception:
+                if not resumed:
+                    raise
+                resumed = False
+                # 断点中的分页标记可能已失效, 从该部门第一页重新开始
+                logger.warning(f"[组织同步] 断点分页标记失效, 重新同步部门: {department_id}")
+                page_token = None
+                continue
+
+            resumed = False
+            rows = []
+            for item in page.get("items") or []:
+                row = self._to_user_row(item, departments)
+                # 同一用户可能属于多个部门, 每次同步只写一次
+                if not row["feishu_user_id"] or row["feishu_user_id"] in seen:
+                    continue
+                seen.add(row["feishu_user_id"])
+                # 超长字段会使整页写入失败(并从断点反复重试), 跳过该用户
+                oversized = self._oversized_fields(row)
+                if oversized:
+                    stats["skipped"] += 1
+                    logger.warning(
+                        f"[组织同步] 字段超长, 跳过用户 - feishu_user_id: "
+                        f"{row['feishu_user_id'][:100]}, 字段: {oversized}"
+                    )
+                    continue
+                rows.append(row)
+
+            if rows:
+                async with AsyncSessionLocal() as db:
+                    stats["written"] += await UserService(db).bulk_upsert_feishu_users(rows)
+            stats["users"] += len(rows)
+            stats["pages"] += 1
+
+            page_token = page.get("page_token")
+            if not page.get("has_more") or not page_token:
+                return
+
+            await self._save_checkpoint(owner, department_id, page_token)
+
+    async def _save_checkpoint(self, owner: str, department_id: str, page_token: Optional[str]):
+        """记录断点(下一个要拉取的部门及分页标记)并续期同步锁"""
+        await redis_client.set_json(
+            ORG_SYNC_CHECKPOINT_KEY,
+            {"department_id": department_id, "page_token": page_token},
+            ex=ORG_SYNC_CHECKPOINT_TTL_SECONDS,
+        )
+        if not await self._lock(owner, ORG_SYNC_LOCK_TTL_SECONDS):
+            raise Exception("同步锁已失效, 停止同步")
+
+    @staticmethod
+    def _oversized_fields(row: Dict) -> List[str]:
+        """超过列长度的字段"""
+        return [
+            field
+            for field, length in _USER_FIELD_LENGTHS.items()
+            if row[field] and len(row[field]) > length
+        ]
+
+    @staticmethod
+    def _to_user_row(item: Dict, departments: Dict[str, str]) -> Dict:
+        """
+        飞书通讯录用户 -> 用户表字段
+
+        name/username/email/mobile 与登录时 sync_user_from_feishu 的取值一致; 通讯录接口
+        没有登录时使用的 avatar_url, 头像只由登录更新, 同步不写入
+        """
+        email = item.get("email") or ""
+        dept_ids: List[str] = [
+            dept_id
+            for dept_id in item.get("department_ids") or []
+            if dept_id != ROOT_DEPARTMENT_ID
+        ]
+        resigned = (item.get("status") or {}).get("is_resigned", False)
+        return {
+            "feishu_user_id": item.get("user_id") or item.get("open_id"),
+            "name": email.split("@")[0],
+            "username": item.get("name", ""),
+            "email": email,
+            "mobile": item.get("mobile", ""),
+            "dept_ids": dept_ids,
+            "dept_names": [departments.get(dept_id, dept_id) for dept_id in dept_ids],
+            "status": "inactive" if resigned else "active",
+        }
+
+
+# 全局组织同步实例
+feishu_org_sync = FeishuOrgSync()
@@ -0,0 +1,85 @@
+"""用户权限文档缓存"""
+
+import json
+from typing import Dict, Optional, Tuple
+
+from app.core.cache import redis_client
+
+# 权限文档在Redis中的保留时间(秒)
+DOCUMENT_TTL_SECONDS = 24 * 3600
+
+
+class PermissionDocumentCache:
+    """
+    用户权限文档缓存(按 feishu_user_id)
+
+    每个用户维护一个修订号, 角色分配/移除、资源绑定变更和角色删除时递增;
+    文档写入时带上读取时的修订号, 只有与当前修订号一致才视为有效,
+    因此与失效并发的冷加载不会把旧权限写回缓存
+    """
+
+    async def get(self, user_id: str) -> Tuple[int, Optional[Dict]]:
+        """
+        一次往返读取当前修订号和权限文档
+
+        Args:
+            user_id: 用户ID (Feishu User ID)
+
+        Returns:
+            (当前修订号, 权限字典), 文档不存在或已失效时权限字典为None
+        """
+        pipe = redis_client.pipeline(transaction=False)
+        pipe.get(self._revision_key(user_id))
+        pipe.get(self._document_key(user_id))
+        raw_revision, raw_document = await pipe.execute()
+
+        revision = int(raw_revision or 0)
+        if raw_document is None:
+            return revision, None
+
+        document = json.loads(raw_document)
+        if document.get("revision") != revision:
+            return revision, None
+        return revision, document["permissions"]
+
+    async def set(self, user_id: str, revision: int, permissions: Dict):
+        """
+        写入权限文档
+
+        Args:
+            user_id: 用户ID
+            revision: 加载权限前读取到的修订号
+            permissions: 权限字典
+        """
+        document = json.dumps({"revision": revision, "permissions": permissions}, ensure_ascii=False)
+        pipe = redis_client.pipeline(transaction=False)
+        pipe.setex(self._document_key(user_id), DOCUMENT_TTL_SECONDS, document)
+        # 修订号的保留时间长于文档, 避免修订号过期归零后旧文档重新生效
+        pipe.expire(self._revision_key(user_id), DOCUMENT_TTL_SECONDS * 2)
+        await pipe.execute()
+
+    async def invalidate(self, *user_ids: str):
+        """
+        使用户权限文档失效(权限变更提交后调用)
+
+        Args:
+            user_ids: 用户ID
+        """
+        if not user_ids:
+            return
+        pipe = redis_client.pipeline(transaction=False)
+        for user_id in user_ids:
+            pipe.incr(self._revision_key(user_id))
+            pipe.expire(self._revision_key(user_id), DOCUMENT_TTL_SECONDS * 2)
+            pipe.delete(self._document_key(user_id))
+        await pipe.execute()
+
+    def _revision_key(self, user_id: str) -> str:
+        return f"user:permissions:revision:{user_id}"
+
+    def _document_key(self, user_id: str) -> str:
+        return f"user:permissions:{user_id}"
+
+
+# 全局权限文档缓存实例
+permission_document_cache = PermissionDocumentCache()
@@ -1,13 +1,15 @@
 """权限收集器 - 收集用户的完整权限"""
 
-from typing import Dict
+from typing import Dict, Iterable, Optional, Tuple
 
-from sqlalchemy import select
+from sqlalchemy import JSON, func, literal_column, select
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import selectinload
 
+from app.models.resource_binding import ResourceBinding
+from app.models.role import Role
 from app.models.user import User
 from app.models.user_role import UserRole
+from app.users.permission_cache import permission_document_cache
 
 
 class PermissionCollector:
@@ -18,7 +20,7 @@ class PermissionCollector:
 
     async def collect(self, user_id: str) -> Dict:
         """
-        收集用户在所有系统中的权限
+        收集用户在所有系统中的权限(优先读取权限文档缓存)
 
         Args:
             user_id: 用户ID (Feishu User ID)
@@ -32,72 +34,116 @@ class PermissionCollector:
                 "system_resources": {"system_a": {"document": [100, 101]}}
             }
         """
-        # 使用selectinload预加载关联数据
-        result = await self.db.execute(
-            select(User)
-            .filter(User.feishu_user_id == user_id)
-            .options(
-                selectinload(User.roles).selectinload(UserRole.role),
-                selectinload(User.resource_bindings),
-            )
-        )
+        revision, permissions = await permission_document_cache.get(user_id)
+        if permissions is not None:
+            return permissions
+
+        _, permissions = await self._load(user_id, revision)
+        return permissions
+
+    async def collect_with_user(self, user_id: str) -> Tuple[Optional[User], Dict]:
+        """
+        加载用户并收集权限
+
+        权限文档命中缓存时只按主键查询User; 未命中时用户、角色和资源绑定在同一条查询中
+        加载(角色和资源绑定在数据库端聚合为JSON), 调用方无需再单独查询User
+
+        Args:
+            user_id: 用户ID (Feishu User ID)
+
+        Returns:
+            (User对象, 权限字典)，用户不存在时返回 (None, 空权限)
+        """
+        revision, permissions = await permission_document_cache.get(user_id)
+        if permissions is None:
+            return await self._load(user_id, revision)
+
+        result = await self.db.execute(select(User).filter(User.feishu_user_id == user_id))
         user = result.scalar_one_or_none()
         if not user:
-            return self._empty_permissions()
+            return None, self._empty_permissions()
+        return user, permissions
+
+    async def _load(self, user_id: str, revision: int) -> Tuple[Optional[User], Dict]:
+        """一条查询加载用户及聚合后的角色、资源绑定, 构建权限并写入缓存"""
+        roles = (
+            select(
+                func.coalesce(
+                    func.json_agg(func.json_build_array(Role.namespace, Role.code), type_=JSON),
+                    literal_column("'[]'::json"),
+                    type_=JSON,
+                )
+            )
+            .select_from(UserRole)
+            .join(Role, Role.id == UserRole.role_id)
+            .where(UserRole.user_id == User.feishu_user_id)
+            .scalar_subquery()
+        )
+        bindings = (
+            select(
+                func.coalesce(
+                    func.json_agg(
+                        func.json_build_array(
+                            ResourceBinding.namespace,
+                            ResourceBinding.resource_type,
+                            ResourceBinding.resource_id,
+                        ),
+                        type_=JSON,
+                    ),
+                    literal_column("'[]'::json"),
+                    type_=JSON,
+                )
+            )
+            .where(ResourceBinding.user_id == User.feishu_user_id)
+            .scalar_subquery()
+        )
 
-        result = {
-            "global_roles": [],
-            "system_roles": {},
-            "global_resources": {},
-            "system_resources": {},
-        }
+        result = await self.db.execute(
+            select(User, roles.label("roles"), bindings.label("bindings")).filter(
+                User.feishu_user_id == user_id
+            )
+        )
+        row = result.first()
+        if row is None:
+            return None, self._empty_permissions()
+
+        user, role_rows, binding_rows = row
+        permissions = self._build_permissions(role_rows, binding_rows)
+        await permission_document_cache.set(user_id, revision, permissions)
+        return user, permissions
+
+    def _build_permissions(
+        self, roles: Iterable[Tuple[str, str]], bindings: Iterable[Tuple[str, str, str]]
+    ) -> Dict:
+        """
+        根据聚合的角色和资源绑定构建权限字典
 
-        # 1. 收集角色
-        for user_role in user.roles:
-            role = user_role.role
+        Args:
+            roles: [(namespace, code)]
+            bindings: [(namespace, resource_type, resource_id)]
+        """
+        result = self._empty_permissions()
 
-            if role.namespace == "global":
-                # 全局角色(去掉命名空间前缀)
-                role_name = role.code.replace("global:", "")
+        # 1. 收集角色(去掉命名空间前缀)
+        for namespace, code in roles:
+            role_name = code.removeprefix(f"{namespace}:")
+            if namespace == "global":
                 result["global_roles"].append(role_name)
             else:
-                # 系统角色
-                system_code = role.namespace
-                if system_code not in result["system_roles"]:
-                    result["system_roles"][system_code] = []
-
-                # 去掉命名空间前缀
-                role_name = role.code.replace(f"{system_code}:", "")
-                result["system_roles"][system_code].append(role_name)
+                result["system_roles"].setdefault(namespace, []).append(role_name)
 
         # 2. 收集资源绑定
-        for binding in user.resource_bindings:
-            if binding.namespace == "global":
-                # 全局资源
-                if binding.resource_type not in result["global_resources"]:
-                    result["global_resources"][binding.resource_type] = []
-
-                try:
-                    resource_id = int(binding.resource_id)
-                except ValueError:
-                    resource_id = binding.resource_id
-
-                result["global_resources"][binding.resource_type].append(resource_id)
+        for namespace, resource_type, resource_id in bindings:
+            try:
+                resource_id = int(resource_id)
+            except ValueError:
+                pass
+
+            if namespace == "global":
+                resources = result["global_resources"]
             else:
-                # 系统资源
-                system_code = binding.namespace
-                if system_code not in result["system_resources"]:
-                    result["system_resources"][system_code] = {}
-
-                if binding.resource_type not in result["system_resources"][system_code]:
-                    result["system_resources"][system_code][binding.resource_type] = []
-
-                try:
-                    resource_id = int(binding.resource_id)
-                except ValueError:
-                    resource_id = binding.resource_id
-
-                result["system_resources"][system_code][binding.resource_type].append(resource_id)
+                resources = result["system_resources"].setdefault(namespace, {})
+            resources.setdefault(resource_type, []).append(resource_id)
 
         return result
 
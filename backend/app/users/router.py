@@ -8,6 +8,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from app.core.database import get_db
 from app.core.dependencies import get_current_user, require_admin, require_admin_or_system
 from app.schemas.user import (
+    OrgSyncResponse,
     UserDetailResponse,
     UserListResponse,
     UserPermissionDetail,
@@ -17,6 +18,7 @@ from app.schemas.user import (
     UserSimpleResponse,
     UserStatusUpdate,
 )
+from app.users.org_sync import feishu_org_sync
 from app.users.permission_collector import PermissionCollector
 from app.users.service import UserService
 
@@ -71,6 +73,21 @@ async def list_users(
     return UserListResponse(total=total, items=users)
 
 
+@router.post("/sync", response_model=OrgSyncResponse)
+async def sync_users(current_user: dict = Depends(require_admin)):
+    """
+    立即从飞书同步组织架构(用户及部门), 在后台执行
+
+    需要管理员权限
+    """
+    started = feishu_org_sync.trigger()
+    return OrgSyncResponse(
+        started=started,
+        running=feishu_org_sync.running,
+        last_result=feishu_org_sync.last_result,
+    )
+
+
 @router.get("/{user_id}", response_model=UserDetailResponse)
 async def get_user(
     user_id: str,
@@ -3,7 +3,8 @@
 from datetime import datetime
 from typing import Dict, List, Optional, Tuple
 
-from sqlalchemy import func, or_, select
+from sqlalchemy import case, cast, func, or_, select
+from sqlalchemy.dialects.postgresql import JSONB, insert
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 
@@ -87,6 +88,58 @@ class UserService:
             user.dept_names = dept_names
             await self.db.commit()
 
+    async def bulk_upsert_feishu_users(self, rows: List[Dict]) -> int:
+        """
+        批量写入飞书通讯录用户(INSERT ... ON CONFLICT, 一条语句一次往返)
+
+        与已有记录内容相同的行不会被更新(不改写 updated_at); 状态只在飞书标记离职时
+        置为 inactive, 不覆盖管理员手动设置的状态; 头像和 last_login 仍只由登录更新
+
+        Args:
+            rows: 用户字段列表(feishu_user_id, name, username, email, mobile,
+                dept_ids, dept_names, status), feishu_user_id 不可重复
+
+        Returns:
+            新增或实际更新的用户数
+        """
+        if not rows:
+            return 0
+
+        now = datetime.utcnow()
+        stmt = insert(User).values(
+            [{**row, "created_at": now, "updated_at": now} for row in rows]
+        )
+        excluded = stmt.excluded
+        changed = or_(
+            User.name.is_distinct_from(excluded.name),
+            User.username.is_distinct_from(excluded.username),
+            User.email.is_distinct_from(excluded.email),
+            User.mobile.is_distinct_from(excluded.mobile),
+            # json 类型没有相等运算符, 转为 jsonb 比较
+            cast(User.dept_ids, JSONB).is_distinct_from(cast(excluded.dept_ids, JSONB)),
+            cast(User.dept_names, JSONB).is_distinct_from(cast(excluded.dept_names, JSONB)),
+            (excluded.status == "inactive") & (User.status != "inactive"),
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[User.feishu_user_id],
+            set_={
+                "name": excluded.name,
+                "username": excluded.username,
+                "email": excluded.email,
+                "mobile": excluded.mobile,
+                "dept_ids": excluded.dept_ids,
+                "dept_names": excluded.dept_names,
+                "status": case((excluded.status == "inactive", "inactive"), else_=User.status),
+                "updated_at": excluded.updated_at,
+            },
+            where=changed,
+        ).returning(User.id)
+
+        result = await self.db.execute(stmt)
+        written = len(result.all())
+        await self.db.commit()
+        return written
+
     async def get_user_by_id(self, user_id: str) -> Optional[User]:
         """根据ID获取用户"""
         result = await self.db.execute(select(User).filter(User.feishu_user_id == user_id))
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+飞书开放平台桩服务 - 本地联调组织架构同步
+
+实现 app/auth/feishu.py 用到的接口子集(应用/租户访问令牌、子部门列表、部门直属用户列表),
+分页行为与飞书一致(page_size 上限50, has_more + page_token)。组织数据按参数确定性生成
+
+用法:
+    python scripts/feishu_stub_server.py --departments 20 --users 500 --port 9000
+    FEISHU_API_BASE_URL=http://127.0.0.1:9000/open-apis uvicorn app.main:app
+"""
+
+import argparse
+from typing import Dict, List, Optional
+
+import uvicorn
+from fastapi import FastAPI, Query
+
+MAX_PAGE_SIZE = 50
+
+
+def build_org(department_count: int, user_count: int) -> Dict:
+    """生成组织数据: 部门两级结构, 用户轮流分配到部门, 每7个用户有一个兼任第二个部门"""
+    departments = []
+    for i in range(department_count):
+        parent = "0" if i < 4 else f"od-{i % 4}"
+        departments.append(
+            {"open_department_id": f"od-{i}", "name": f"部门{i}", "parent_department_id": parent}
+        )
+
+    users = []
+    for i in range(user_count):
+        dept_ids = [f"od-{i % department_count}"] if department_count else ["0"]
+        if department_count > 1 and i % 7 == 0:
+            dept_ids.append(f"od-{(i + 1) % department_count}")
+        users.append(
+            {
+                "user_id": f"u{i:05d}",
+                "open_id": f"ou_{i:05d}",
+                "name": f"用户{i}",
+                "email": f"user{i}@example.com",
+                "mobile": f"+86138{i:08d}",
+                "avatar": {"avatar_240": f"https://example.com/avatar/{i}_240.png"},
+                "department_ids": dept_ids,
+                "status": {"is_resigned": i % 50 == 49, "is_activated": True},
+            }
+        )
+    return {"departments": departments, "users": users}
+
+
+def paginate(items: List[Dict], page_size: int, page_token: Optional[str]) -> Dict:
+    """按偏移量分页, page_token 为下一页起始偏移"""
+    start = int(page_token or 0)
+    end = start + min(page_size, MAX_PAGE_SIZE)
+    has_more = end < len(items)
+    page = {"items": items[start:end], "has_more": has_more}
+    if has_more:
+        page["page_token"] = str(end)
+    return page
+
+
+def create_app(org: Dict) -> FastAPI:
+    """创建桩服务应用"""
+    app = FastAPI(title="Feishu Stub")
+
+    @app.post("/open-apis/auth/v3/app_access_token/internal")
+    async def app_access_token():
+        return {"code": 0, "msg": "ok", "app_access_token": "stub-app-token", "expire": 7200}
+
+    @app.post("/open-apis/auth/v3/tenant_access_token/internal")
+    async def tenant_access_token():
+        return {"code": 0, "msg": "ok", "tenant_access_token": "stub-tenant-token", "expire": 7200}
+
+    @app.get("/open-apis/contact/v3/departments/{department_id}/children")
+    async def department_children(
+        department_id: str,
+        page_size: int = Query(10),
+        page_token: Optional[str] = Query(None),
+    ):
+        # fetch_child=true: 返回全部下级部门
+        items = [
+            d
+            for d in org["departments"]
+            if department_id == "0" or d["parent_department_id"] == department_id
+        ]
+        return {"code": 0, "msg": "ok", "data": paginate(items, page_size, page_token)}
+
+    @app.get("/open-apis/contact/v3/users/find_by_department")
+    async def find_by_department(
+        department_id: str = Query(...),
+        page_size: int = Query(10),
+        page_token: Optional[str] = Query(None),
+    ):
+        items = [u for u in org["users"] if department_id in u["department_ids"]]
+        return {"code": 0, "msg": "ok", "data": paginate(items, page_size, page_token)}
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="飞书开放平台桩服务")
+    parser.add_argument("--departments", type=int, default=20, help="部门数量")
+    parser.add_argument("--users", type=int, default=500, help="用户数量")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    args = parser.parse_args()
+
+    org = build_org(args.departments, args.users)
+    print(f"飞书桩服务: {args.departments} 个部门, {args.users} 个用户")
+    print(f"FEISHU_API_BASE_URL=http://{args.host}:{args.port}/open-apis")
+    uvicorn.run(create_app(org), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -11,8 +11,19 @@ from authhub_sdk.exceptions import (
 
 __version__ = "0.1.0"
 
+
+def __getattr__(name):
+    # 异步客户端依赖可选的 httpx(pip install authhub-sdk[async]), 用到时才导入
+    if name == "AsyncAuthHubClient":
+        from authhub_sdk.async_client import AsyncAuthHubClient
+
+        return AsyncAuthHubClient
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
 __all__ = [
     "AuthHubClient",
+    "AsyncAuthHubClient",
     "SSOClient",
     "TokenException",
     "TokenExpiredException",
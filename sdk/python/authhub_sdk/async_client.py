@@ -0,0 +1,407 @@
+"""AuthHub SDK异步客户端"""
+
+import asyncio
+import time
+from typing import Dict, List, Tuple
+
+import httpx
+import redis.asyncio as aioredis
+
+from authhub_sdk.client import BaseAuthHubClient
+from authhub_sdk.resources import AsyncResourceResolver
+from authhub_sdk.revocation import AsyncRevocationSet
+from authhub_sdk.verifier import AsyncTokenVerifier
+
+
+class AsyncAuthHubClient(BaseAuthHubClient):
+    """
+    AuthHub SDK异步客户端
+
+    基于 redis.asyncio 和 httpx.AsyncClient(连接池复用), 配置同步和权限事件消费
+    以事件循环中的后台任务运行; Token验证、令牌交换、刷新等网络I/O都不阻塞事件循环。
+    权限校验(check_permission/check_route 等)与 AuthHubClient 相同, 为本地同步调用
+
+    用法:
+        client = AsyncAuthHubClient(...)
+        await client.start()   # 在应用启动时调用(首次 verify_token 时也会自动启动)
+        ...
+        await client.close()   # 在应用关闭时调用
+    """
+
+    def __init__(
+        self,
+        authhub_url: str,
+        system_id: str,
+        system_token: str,
+        namespace: str,
+        redis_url: str,
+        enable_cache: bool = True,
+        sync_interval: int = 3600,  # 兜底同步间隔, 变更由事件流实时推送
+        token_cache_size: int = 10000,
+        sync_debounce: float = 0.2,
+        sync_max_staleness: float = 2.0,
+        scoped_tokens: bool = False,
+        http_timeout: float = 10.0,
+        max_connections: int = 100,
+    ):
+        """
+        初始化客户端(不发起网络请求, 由 start() 完成初始同步)
+
+        Args:
+            authhub_url: AuthHub服务地址
+            system_id: 系统ID
+            system_token: 系统Token
+            namespace: 命名空间(系统代码)
+            redis_url: Redis连接URL
+            enable_cache: 是否启用缓存
+            sync_interval: 配置同步间隔(秒)
+            token_cache_size: 已验证Token缓存条数(0表示不缓存)
+            sync_debounce: 变更通知的防抖窗口(秒), 窗口内的多次通知合并为一次同步
+            sync_max_staleness: 持续收到通知时, 从首次通知到执行同步的最长等待(秒)
+            scoped_tokens: 是否把用户Token换成只含本系统权限的作用域Token后再验证
+            http_timeout: 调用AuthHub接口的超时时间(秒)
+            max_connections: 到AuthHub的HTTP连接池大小
+        """
+        super().__init__(
+            authhub_url,
+            system_id,
+            system_token,
+            namespace,
+            enable_cache=enable_cache,
+            sync_interval=sync_interval,
+            token_cache_size=token_cache_size,
+            sync_debounce=sync_debounce,
+            sync_max_staleness=sync_max_staleness,
+            scoped_tokens=scoped_tokens,
+        )
+
+        # Redis客户端
+        self.redis = aioredis.from_url(redis_url, decode_responses=True)
+
+        # HTTP客户端(连接池)
+        self.http = httpx.AsyncClient(
+            base_url=self.authhub_url,
+            timeout=http_timeout,
+            limits=httpx.Limits(
+                max_connections=max_connections, max_keepalive_connections=max_connections
+            ),
+        )
+
+        # Token撤销集合(由权限事件流维护)
+        self.revocations = AsyncRevocationSet(self.redis)
+
+        # Token验证器(遇到未知kid时按需拉取JWKS)
+        self.verifier = AsyncTokenVerifier(
+            self.redis,
+            key_fetcher=self._fetch_jwks,
+            cache_size=token_cache_size,
+            revocations=self.revocations,
+            audience=namespace,
+        )
+
+        # 紧凑Token的资源文档解析器
+        self.resources = AsyncResourceResolver(
+            self._fetch_resource_documents, cache_size=token_cache_size
+        )
+
+        # 同一时刻只有一个同步在执行
+        self._sync_lock = asyncio.Lock()
+        # 同步请求通知
+        self._sync_requested = asyncio.Event()
+
+        self._tasks: List[asyncio.Task] = []
+        self._start_lock = asyncio.Lock()
+        self.started = False
+
+    async def start(self):
+        """完成初始同步并启动后台任务(可重复调用, 只执行一次)"""
+        async with self._start_lock:
+            if self.started:
+                return
+
+            # 先记录权限事件流位置再做初始同步, 期间的事件不会丢失
+            if self.enable_cache:
+                self._event_stream_ids = await self._get_event_stream_ids()
+
+            await self._sync_public_key()
+            await self._sync_config()
+
+            if self.enable_cache:
+                self._tasks = [
+                    # 消费权限事件流
+                    asyncio.create_task(self._consume_events()),
+                    # 同步任务(合并通知触发的同步, 并定期同步配置)
+                    asyncio.create_task(self._sync_scheduler()),
+                ]
+            self.started = True
+
+    async def close(self):
+        """停止后台任务并关闭连接"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self.started = False
+        await self.http.aclose()
+        await self.redis.aclose()
+
+    async def __aenter__(self) -> "AsyncAuthHubClient":
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def verify_token(self, token: str) -> Dict:
+        """
+        验证Token(本地)
+
+        开启 scoped_tokens 时, 用户Token先换成作用域Token(按Token缓存到作用域Token过期);
+        紧凑Token的资源集合按摘要从本地缓存补全(未命中时向AuthHub拉取)
+
+        Args:
+            token: JWT Token
+
+        Returns:
+            Token payload
+        """
+        if not self.started:
+            await self.start()
+        if self.scoped_tokens:
+            token = await self._get_scoped_token(token)
+        return await self.resources.expand(await self.verifier.verify(token))
+
+    async def exchange_token(self, token: str) -> Dict:
+        """
+        用户Token换取作用域Token
+
+        Args:
+            token: 用户 access token
+
+        Returns:
+            {access_token, token_type, expires_in, audience}
+
+        Raises:
+            TokenExpiredException: 用户Token过期
+            TokenRevokedException: 用户Token已撤销
+            InvalidTokenException: 用户Token无效
+        """
+        response = await self.http.post(
+            "/api/v1/auth/token/exchange",
+            json={"subject_token": token},
+            headers={"X-System-Token": self.system_token},
+        )
+        if response.status_code == 401:
+            self._raise_exchange_error(response.json().get("detail", ""))
+        response.raise_for_status()
+        return response.json()
+
+    async def _get_scoped_token(self, token: str) -> str:
+        """获取用户Token对应的作用域Token, 交换服务不可用时回退到原Token"""
+        if self._is_scoped_token(token):
+            return token
+
+        digest, scoped = self._get_cached_scoped_token(token)
+        if scoped is not None:
+            return scoped
+
+        try:
+            data = await self.exchange_token(token)
+        except httpx.HTTPError as e:
+            print(f"⚠️ 作用域Token交换失败, 使用原Token验证: {e}")
+            return token
+
+        return self._put_scoped_token(digest, data)
+
+    async def refresh_token(self, refresh_token: str) -> Dict[str, str]:
+        """
+        刷新访问令牌
+
+        Args:
+            refresh_token: Refresh Token
+
+        Returns:
+            新的token数据（包含access_token和refresh_token）
+
+        Raises:
+            Exception: 刷新失败时抛出异常
+        """
+        try:
+            response = await self.http.post(
+                "/api/v1/auth/refresh", json={"refresh_token": refresh_token}
+            )
+            response.raise_for_status()
+            return response.json()
+        except httpx.HTTPError as e:
+            raise Exception(f"Token刷新失败: {str(e)}")
+
+    # ========== 内部方法 ==========
+
+    async def _sync_public_key(self):
+        """同步JWT公钥(JWKS多密钥, 旧版服务端回退到单公钥接口)"""
+        try:
+            response = await self.http.get("/api/v1/auth/public-key")
+            response.raise_for_status()
+            data = response.json()
+            self.verifier.set_public_key(data["public_key"], kid=data.get("kid"))
+            print(f"✅ 公钥同步成功")
+        except Exception as e:
+            print(f"❌ 公钥同步失败: {e}")
+
+        try:
+            self.verifier.set_keys(await self._fetch_jwks())
+            print(f"✅ JWKS同步成功: {list(self.verifier.keys)}")
+        except Exception as e:
+            print(f"❌ JWKS同步失败: {e}")
+
+    async def _fetch_jwks(self) -> Dict[str, object]:
+        """拉取JWKS, 返回 {kid: 公钥对象}"""
+        response = await self.http.get("/.well-known/jwks.json")
+        response.raise_for_status()
+        return self._parse_jwks(response.json())
+
+    async def _fetch_resource_documents(
+        self, digests: List[str]
+    ) -> Tuple[Dict[str, Dict], List[str]]:
+        """批量拉取紧凑Token引用的资源文档"""
+        response = await self.http.post(
+            f"/api/v1/systems/{self.system_id}/resources/bulk",
+            json={"digests": digests},
+            headers={"X-System-Token": self.system_token},
+        )
+        response.raise_for_status()
+        return self._parse_resource_documents(response.json())
+
+    def request_sync(self):
+        """请求同步配置(由同步任务防抖合并后执行, 不阻塞调用方; 需在事件循环中调用)"""
+        self._mark_sync_requested()
+        self._sync_requested.set()
+
+    def _begin_config_event(self) -> bool:
+        # 事件处理中没有 await, 未在同步即可直接应用
+        return not self._sync_lock.locked()
+
+    async def _sync_config(self):
+        """同步权限配置(单飞: 已有同步在执行时等待其完成后再同步)"""
+        async with self._sync_lock:
+            await self._sync_config_locked()
+
+    async def _sync_config_locked(self):
+        """同步权限配置(优先增量同步, 变更日志截断或接口不可用时全量同步)"""
+        if self.config_cache and self.config_revision is not None:
+            try:
+                if await self._sync_config_changes():
+                    return
+            except Exception as e:
+                print(f"⚠️ 增量同步失败, 改为全量同步: {e}")
+
+        try:
+            response = await self.http.get(
+                f"/api/v1/systems/{self.system_id}/config",
+                headers=self._config_request_headers(),
+            )
+            self._apply_config_response(response)
+        except Exception as e:
+            print(f"❌ 配置同步失败: {e}")
+
+    async def _sync_config_changes(self) -> bool:
+        """
+        增量同步权限配置
+
+        Returns:
+            是否已同步到最新(False 表示需要全量同步)
+        """
+        response = await self.http.get(
+            f"/api/v1/systems/{self.system_id}/config/changes",
+            params={"since": self.config_revision},
+            headers={"X-System-Token": self.system_token},
+        )
+        response.raise_for_status()
+        return self._install_config_delta(response.json())
+
+    async def _consume_events(self):
+        """
+        消费权限事件流(系统命名空间和全局命名空间)
+
+        从初始同步前记录的位置开始读取, 断线重连后从最后处理的事件ID续读, 不会漏掉事件;
+        续读位置已被裁剪时请求一次配置同步
+        """
+        last_ids = dict(self._event_stream_ids)
+        reconnect = False
+        while True:
+            try:
+                if reconnect and await self._event_streams_trimmed(last_ids):
+                    print(f"⚠️ 权限事件流已裁剪到续读位置之后, 重新同步配置")
+                    self.request_sync()
+                print(f"📡 开始消费权限事件流: {list(last_ids)}")
+
+                # 续读位置已确定, 此后加载的撤销快照不会漏掉事件
+                await self.revocations.load_snapshot()
+
+                while True:
+                    response = await self.redis.xread(last_ids, count=100, block=30000)
+                    for stream, entries in response or []:
+                        for entry_id, fields in entries:
+                            last_ids[stream] = entry_id
+                            self._handle_event_entry(fields)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"❌ 权限事件流读取中断, 稍后重连: {e}")
+            finally:
+                # 中断期间回退到逐次查询Redis黑名单
+                self.revocations.ready = False
+
+            reconnect = True
+            await asyncio.sleep(5)
+
+    async def _get_event_stream_ids(self) -> Dict[str, str]:
+        """获取各事件流当前的最后一条事件ID(作为消费起点)"""
+        stream_ids = {}
+        for stream in self._event_streams():
+            try:
+                entries = await self.redis.xrevrange(stream, count=1)
+                stream_ids[stream] = self._stream_start_id(entries)
+            except Exception as e:
+                print(f"⚠️ 获取权限事件流位置失败, 将从头读取: {e}")
+                stream_ids[stream] = "0-0"
+        return stream_ids
+
+    async def _event_streams_trimmed(self, last_ids: Dict[str, str]) -> bool:
+        """续读位置之后的事件是否可能已被裁剪"""
+        for stream, last_id in last_ids.items():
+            if last_id == "0-0":
+                continue
+            if self._stream_trimmed(await self.redis.xrange(stream, count=1), last_id):
+                return True
+        return False
+
+    async def _sync_scheduler(self):
+        """
+        同步任务
+
+        有同步请求时等待防抖窗口内不再有新请求(最长不超过 sync_max_staleness)后同步一次,
+        无请求时每 sync_interval 秒定期同步
+        """
+        next_periodic = time.monotonic() + self.sync_interval
+        while True:
+            while True:
+                now = time.monotonic()
+                due = self._next_sync_due(next_periodic)
+                if now >= due:
+                    break
+                self._sync_requested.clear()
+                try:
+                    await asyncio.wait_for(self._sync_requested.wait(), due - now)
+                except asyncio.TimeoutError:
+                    pass
+
+            periodic = self._take_sync_request()
+
+            try:
+                if periodic:
+                    print(f"🔄 定期同步配置...")
+                await self._sync_config()
+            except Exception as e:
+                print(f"❌ 配置同步失败: {e}")
+            next_periodic = time.monotonic() + self.sync_interval
@@ -1,13 +1,282 @@
 """权限检查器"""
+import operator
 import re
-from typing import Dict
+import threading
+from array import array
+from bisect import bisect_left
+from itertools import chain
+from numbers import Number
+from typing import Callable, Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+from loguru import logger
+
+
+class RouteIndex:
+    """
+    路由规则索引
+
+    同步配置时编译一次: 规则按 角色 -> HTTP方法 分桶并按优先级排序,
+    同一个桶内可合并的正则合并为一个交替正则, 通常一次匹配即可判断是否命中。
+    规则和请求的HTTP方法都按大写比较, 本地校验与 AuthHub /authorize 结果一致
+    """
+
+    def __init__(self, route_patterns: List[Dict]):
+        buckets: Dict[str, Dict[str, List[str]]] = {}
+        sorted_patterns = sorted(
+            route_patterns,
+            key=lambda x: x.get('priority', 0),
+            reverse=True
+        )
+        for pattern_rule in sorted_patterns:
+            pattern = pattern_rule.get('pattern', '')
+            try:
+                re.compile(pattern)
+            except re.error as e:
+                logger.warning(f"[路由索引] 忽略无效的路由正则 {pattern!r}: {e}")
+                continue
+
+            role_buckets = buckets.setdefault(pattern_rule['role'], {})
+            method = (pattern_rule.get('method') or '*').upper()
+            role_buckets.setdefault(method, []).append(pattern)
+
+        self.matchers: Dict[str, Dict[str, Callable[[str], bool]]] = {
+            role: {method: self._build_matcher(patterns) for method, patterns in methods.items()}
+            for role, methods in buckets.items()
+        }
+
+    def match(self, roles: List[str], path: str, method: str) -> bool:
+        """判断任一角色是否有匹配该路径和方法的规则(方法不区分大小写)"""
+        method = method.upper()
+        for role in roles:
+            methods = self.matchers.get(role)
+            if not methods:
+                continue
+            for key in (method, '*'):
+                matcher = methods.get(key)
+                if matcher is not None and matcher(path):
+                    return True
+        return False
+
+    @staticmethod
+    def _build_matcher(patterns: List[str]) -> Callable[[str], bool]:
+        """
+        可合并的正则合并为单个交替正则, 其余逐条匹配
+
+        合并后分组编号会整体偏移, 含编号反向引用/条件分组的正则会引用到错误的分组;
+        命名分组可能重名, 内联全局标志(如 (?i))只能出现在开头, 这几类都不参与合并
+        """
+        mergeable = [p for p in patterns if _is_mergeable(p)]
+        separate = [re.compile(p) for p in patterns if not _is_mergeable(p)]
+        if len(mergeable) > 1:
+            try:
+                separate.insert(0, re.compile('|'.join(f'(?:{p})' for p in mergeable)))
+            except re.error:
+                separate[:0] = [re.compile(p) for p in mergeable]
+        else:
+            separate[:0] = [re.compile(p) for p in mergeable]
+
+        if len(separate) == 1:
+            single = separate[0]
+            return lambda path: single.match(path) is not None
+        return lambda path: any(c.match(path) for c in separate)
+
+
+# 编号反向引用(\1..\99, 前面的反斜杠未被转义)、条件分组 (?(...)、命名分组 (?P<
+_UNMERGEABLE_SYNTAX = re.compile(r'(?:^|[^\\])(?:\\\\)*\\[1-9]|\(\?\(|\(\?P<')
+
+
+def _is_mergeable(pattern: str) -> bool:
+    """正则是否可以安全地合并进交替正则(语义不变)"""
+    if _UNMERGEABLE_SYNTAX.search(pattern):
+        return False
+    # 带内联全局标志的正则合并后标志位置不在开头, 无法编译或影响其他规则
+    return re.compile(pattern).flags & ~re.UNICODE == 0
+
+
+class PermissionTable:
+    """
+    权限表
+
+    同步配置时编译一次: 每个角色的权限转为 frozenset, 并把 "resource:*" 通配符
+    预先展开为配置中该资源的全部权限、"*:*" 展开为配置中的全部权限(通配符本身保留,
+    用于展示); 角色组合 -> 有效权限集合 的结果会被缓存, 一次权限检查只需一次集合查找。
+    通配符只授予配置中已定义的权限代码
+    """
+
+    # 角色组合缓存上限(超过后整体清空)
+    MAX_CACHED_ROLE_SETS = 4096
+
+    def __init__(self, roles: Dict[str, Dict], permissions: Dict[str, Dict]):
+        # resource -> 配置中该资源的全部权限代码
+        codes_by_resource: Dict[str, List[str]] = {}
+        for code in permissions:
+            resource = code.split(':', 1)[0]
+            codes_by_resource.setdefault(resource, []).append(code)
+
+        self.role_permissions: Dict[str, FrozenSet[str]] = {}
+        for role_name, role_config in roles.items():
+            codes = set(role_config.get('permissions', []))
+            for code in list(codes):
+                resource, _, action = code.partition(':')
+                if resource == '*' and action == '*':
+                    codes.update(permissions)
+                elif action == '*':
+                    codes.update(codes_by_resource.get(resource, ()))
+            self.role_permissions[role_name] = frozenset(codes)
+
+        self._effective_cache: Dict[FrozenSet[str], FrozenSet[str]] = {}
+        self._lock = threading.Lock()
+
+    def effective(self, roles: Iterable[str]) -> FrozenSet[str]:
+        """获取角色组合的有效权限集合(含通配符标记)"""
+        role_set = frozenset(roles)
+        permissions = self._effective_cache.get(role_set)
+        if permissions is not None:
+            return permissions
+
+        permissions = frozenset().union(
+            *(self.role_permissions.get(role, frozenset()) for role in role_set)
+        )
+        with self._lock:
+            if len(self._effective_cache) >= self.MAX_CACHED_ROLE_SETS:
+                self._effective_cache.clear()
+            self._effective_cache[role_set] = permissions
+        return permissions
+
+    def allows(self, roles: Iterable[str], resource: str, action: str) -> bool:
+        """判断角色组合是否拥有 resource:action 权限(通配符已在编译时展开)"""
+        return f"{resource}:{action}" in self.effective(roles)
+
+
+# 未携带资源时共用的空字典(避免为每次检查创建新的缓存键)
+_EMPTY_RESOURCES: Dict = {}
+
+
+class ResourceSet:
+    """
+    资源ID集合
+
+    整数ID去重后存为有序 array('q')(紧凑, 二分查找), 其他ID(字符串等)存为 frozenset。
+    成员判断与 list 的 in 一致: 值为整数的 IntEnum、bool、5.0 等与对应整数视为同一ID
+    """
+
+    __slots__ = ("_ints", "_others")
+
+    _INT64_MIN = -(2 ** 63)
+    _INT64_MAX = 2 ** 63 - 1
+
+    def __init__(self, resource_ids: Iterable):
+        ints, others = set(), set()
+        for resource_id in resource_ids:
+            value = self._as_int64(resource_id)
+            if value is not None:
+                ints.add(value)
+            else:
+                others.add(resource_id)
+        self._ints = array('q', sorted(ints))
+        self._others = frozenset(others)
+
+    def __len__(self) -> int:
+        return len(self._ints) + len(self._others)
+
+    def __contains__(self, resource_id) -> bool:
+        value = self._as_int64(resource_id)
+        if value is not None:
+            ints = self._ints
+            index = bisect_left(ints, value)
+            return index < len(ints) and ints[index] == value
+        return resource_id in self._others
+
+    def filter(self, resource_ids: Iterable) -> List:
+        """按原顺序返回其中属于本集合的ID"""
+        if not self:
+            return []
+        ints, others, size = self._ints, self._others, len(self._ints)
+        as_int64 = self._as_int64
+        accessible = []
+        for resource_id in resource_ids:
+            value = as_int64(resource_id)
+            if value is not None:
+                index = bisect_left(ints, value)
+                if index < size and ints[index] == value:
+                    accessible.append(resource_id)
+            elif resource_id in others:
+                accessible.append(resource_id)
+        return accessible
+
+    @classmethod
+    def _as_int64(cls, value) -> Optional[int]:
+        """值为 int64 范围内整数的ID(含 int 子类、5.0 等)转为 int, 否则返回 None"""
+        if type(value) is int:
+            number = value
+        else:
+            try:
+                number = operator.index(value)
+            except TypeError:
+                if not isinstance(value, Number):
+                    return None
+                try:
+                    number = int(value)
+                except (TypeError, ValueError, OverflowError):
+                    return None
+                if number != value:
+                    return None
+        return number if cls._INT64_MIN <= number <= cls._INT64_MAX else None
+
+
+class CompiledConfig:
+    """编译后的权限配置(整体替换, 保证读取一致)"""
+
+    def __init__(self, config: Dict):
+        self.config = config
+        self.route_index = RouteIndex(config.get('route_patterns', []))
+        self.permission_table = PermissionTable(
+            config.get('roles', {}), config.get('permissions', {})
+        )
+        # 全局管理员的有效权限: 配置中的全部权限代码加 "*:*"
+        self.all_permissions = frozenset(config.get('permissions', {})) | {'*:*'}
 
 
 class PermissionChecker:
     """权限检查器 - 本地校验权限"""
     
+    # 资源集合缓存上限(超过后整体清空)
+    MAX_CACHED_RESOURCE_SETS = 10000
+    
     def __init__(self, namespace: str):
         self.namespace = namespace
+        self._compiled: Optional[CompiledConfig] = None
+        self._previous: Optional[CompiledConfig] = None
+        
+        # (全局资源对象id, 命名空间资源对象id, 资源类型) -> (全局资源, 命名空间资源, 资源集合)
+        # 缓存条目持有资源对象本身, 对象存活期间id不会被复用
+        self._resource_sets: Dict[Tuple[int, int, str], Tuple[Dict, Dict, ResourceSet]] = {}
+        self._resource_lock = threading.Lock()
+    
+    def compile(self, config: Dict) -> CompiledConfig:
+        """
+        编译配置(在同步配置后调用, 避免在请求路径上编译)
+        
+        Args:
+            config: 权限配置
+            
+        Returns:
+            编译后的配置
+        """
+        compiled = CompiledConfig(config)
+        self._previous, self._compiled = self._compiled, compiled
+        return compiled
+    
+    def _get_compiled(self, config: Dict) -> CompiledConfig:
+        """
+        获取配置对应的编译结果, 配置对象变化时重新编译
+        
+        同时保留上一版编译结果, 切换配置瞬间仍持有旧配置的请求不会触发重新编译
+        """
+        for compiled in (self._compiled, self._previous):
+            if compiled is not None and compiled.config is config:
+                return compiled
+        return self.compile(config)
     
     def check_permission(
         self,
@@ -37,28 +306,11 @@ class PermissionChecker:
         if 'admin' in token_payload.get('global_roles', []):
             return True
         
-        # 2. 构建权限代码
-        perm_code = f"{resource}:{action}"
-        
-        # 3. 检查系统角色
+        # 2. 检查系统角色对应的有效权限集合
         system_roles = token_payload.get('system_roles', {})
         user_roles = system_roles.get(self.namespace, [])
         
-        for role_name in user_roles:
-            role_config = config.get('roles', {}).get(role_name, {})
-            role_permissions = role_config.get('permissions', [])
-            
-            # 检查精确匹配
-            if perm_code in role_permissions:
-                return True
-            
-            # 检查通配符
-            if f"{resource}:*" in role_permissions:
-                return True
-            if "*:*" in role_permissions:
-                return True
-        
-        return False
+        return self._get_compiled(config).permission_table.allows(user_roles, resource, action)
     
     def check_route(
         self,
@@ -87,30 +339,7 @@ class PermissionChecker:
         system_roles = token_payload.get('system_roles', {})
         user_roles = system_roles.get(self.namespace, [])
         
-        # 遍历路由规则(按优先级排序)
-        route_patterns = config.get('route_patterns', [])
-        sorted_patterns = sorted(
-            route_patterns,
-            key=lambda x: x.get('priority', 0),
-            reverse=True
-        )
-        
-        for pattern_rule in sorted_patterns:
-            # 检查角色
-            if pattern_rule['role'] not in user_roles:
-                continue
-            
-            # 检查方法
-            rule_method = pattern_rule.get('method', '*')
-            if rule_method != '*' and rule_method != method:
-                continue
-            
-            # 正则匹配路径
-            pattern = pattern_rule.get('pattern', '')
-            if re.match(pattern, path):
-                return True
-        
-        return False
+        return self._get_compiled(config).route_index.match(user_roles, path, method)
     
     def check_resource_access(
         self,
@@ -119,7 +348,7 @@ class PermissionChecker:
         resource_id: int
     ) -> bool:
         """
-        检查资源访问权限
+        检查资源访问权限(全局资源或本系统资源)
         
         Args:
             token_payload: Token payload
@@ -129,16 +358,129 @@ class PermissionChecker:
         Returns:
             是否有权限
         """
-        # 检查全局资源
-        global_resources = token_payload.get('global_resources', {})
-        if resource_id in global_resources.get(resource_type, []):
-            return True
+        return resource_id in self.resource_set(token_payload, resource_type)
+    
+    def filter_accessible(
+        self,
+        token_payload: Dict,
+        resource_type: str,
+        resource_ids: Iterable
+    ) -> List:
+        """
+        批量过滤有权限访问的资源ID
         
-        # 检查系统资源
-        system_resources = token_payload.get('system_resources', {})
-        namespace_resources = system_resources.get(self.namespace, {})
-        if resource_id in namespace_resources.get(resource_type, []):
-            return True
+        Args:
+            token_payload: Token payload
+            resource_type: 资源类型
+            resource_ids: 待过滤的资源ID
+            
+        Returns:
+            有权限的资源ID(保持原顺序)
+        """
+        return self.resource_set(token_payload, resource_type).filter(resource_ids)
+
+    def effective_permissions(self, token_payload: Dict, config: Dict) -> FrozenSet[str]:
+        """
+        获取Token在本系统的全部有效权限代码
+
+        "resource:*"、"*:*" 通配符已展开为配置中对应的全部权限(通配符本身也保留);
+        全局管理员返回配置中的全部权限代码加 "*:*"
+
+        Args:
+            token_payload: Token payload
+            config: 权限配置
+
+        Returns:
+            有效权限代码集合
+        """
+        compiled = self._get_compiled(config)
+        if 'admin' in token_payload.get('global_roles', []):
+            return compiled.all_permissions
+
+        system_roles = token_payload.get('system_roles', {})
+        return compiled.permission_table.effective(system_roles.get(self.namespace, []))
+
+    def check_many(
+        self,
+        token_payload: Dict,
+        config: Dict,
+        permissions: Iterable[str] = (),
+        routes: Iterable[Tuple[str, str]] = (),
+        resources: Iterable[Tuple[str, object]] = ()
+    ) -> Dict[str, Dict]:
+        """
+        批量检查权限、路由和资源
+
+        编译配置、有效权限集合和每类资源集合都只获取一次, 之后每个问题只需一次哈希
+        查找(路由为一次合并正则匹配), 适合页面渲染时一次判断全部菜单和按钮
+
+        Args:
+            token_payload: Token payload
+            config: 权限配置
+            permissions: 权限代码列表(resource:action)
+            routes: (HTTP方法, 路径) 列表
+            resources: (资源类型, 资源ID) 列表
+
+        Returns:
+            {"permissions": {代码: bool}, "routes": {(方法, 路径): bool},
+             "resources": {(类型, ID): bool}}
+        """
+        compiled = self._get_compiled(config)
+        is_admin = 'admin' in token_payload.get('global_roles', [])
+        user_roles = token_payload.get('system_roles', {}).get(self.namespace, [])
+
+        permission_results: Dict[str, bool] = {}
+        if permissions:
+            granted = compiled.permission_table.effective(user_roles)
+            for code in permissions:
+                permission_results[code] = is_admin or code in granted
+
+        route_results: Dict[Tuple[str, str], bool] = {}
+        for method, path in routes:
+            route_results[(method, path)] = (
+                is_admin or compiled.route_index.match(user_roles, path, method)
+            )
+
+        resource_results: Dict[Tuple[str, object], bool] = {}
+        resource_sets: Dict[str, ResourceSet] = {}
+        for resource_type, resource_id in resources:
+            resource_set = resource_sets.get(resource_type)
+            if resource_set is None:
+                resource_set = resource_sets[resource_type] = self.resource_set(
+                    token_payload, resource_type
+                )
+            resource_results[(resource_type, resource_id)] = resource_id in resource_set
+
+        return {
+            "permissions": permission_results,
+            "routes": route_results,
+            "resources": resource_results,
+        }
+
+    def resource_set(self, token_payload: Dict, resource_type: str) -> ResourceSet:
+        """
+        获取Token在本系统可访问的某类资源集合
         
-        return False
+        同一Token(验证器缓存的payload共享同一资源对象)的资源列表只转换一次
+        """
+        global_resources = token_payload.get('global_resources') or _EMPTY_RESOURCES
+        namespace_resources = (
+            (token_payload.get('system_resources') or _EMPTY_RESOURCES).get(self.namespace)
+            or _EMPTY_RESOURCES
+        )
+        key = (id(global_resources), id(namespace_resources), resource_type)
+        
+        entry = self._resource_sets.get(key)
+        if entry is not None and entry[0] is global_resources and entry[1] is namespace_resources:
+            return entry[2]
+        
+        resource_set = ResourceSet(chain(
+            global_resources.get(resource_type, ()),
+            namespace_resources.get(resource_type, ()),
+        ))
+        with self._resource_lock:
+            if len(self._resource_sets) >= self.MAX_CACHED_RESOURCE_SETS:
+                self._resource_sets.clear()
+            self._resource_sets[key] = (global_resources, namespace_resources, resource_set)
+        return resource_set
 
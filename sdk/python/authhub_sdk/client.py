@@ -1,23 +1,49 @@
 """AuthHub SDK核心客户端"""
 
+import abc
+import hashlib
 import json
 import threading
 import time
-from typing import Dict, Optional
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
 
+import jwt
 import redis
 import requests
+from jwt.algorithms import RSAAlgorithm
 from uvicorn.main import logger
 
 from authhub_sdk.checker import PermissionChecker
+from authhub_sdk.exceptions import (
+    InvalidTokenException,
+    TokenExpiredException,
+    TokenRevokedException,
+)
+from authhub_sdk.resources import ResourceResolver
+from authhub_sdk.revocation import RevocationSet
 from authhub_sdk.verifier import TokenVerifier
 
+# 作用域Token的头部typ(由AuthHub令牌交换接口签发)
+SCOPED_TOKEN_TYPE = "at+jwt"
 
-class AuthHubClient:
+# 权限事件流: 每个命名空间一个 Redis Stream, 事件内容在 data 字段(由AuthHub写入)
+EVENT_STREAM_PREFIX = "permission:events:"
+
+
+def _stream_id(entry_id: str) -> tuple:
+    """事件ID转为可比较的(毫秒, 序号)"""
+    ms, _, seq = entry_id.partition("-")
+    return int(ms), int(seq or 0)
+
+
+class BaseAuthHubClient(abc.ABC):
     """
-    AuthHub SDK核心客户端
+    AuthHub客户端公共部分
 
-    提供本地Token验证和权限校验功能
+    本地权限校验、配置安装/增量应用、权限事件解析和同步调度决策, 不涉及网络I/O;
+    同步客户端 AuthHubClient 与异步客户端 AsyncAuthHubClient 共用, 子类只实现
+    网络I/O和线程/任务调度(抽象方法)
     """
 
     def __init__(
@@ -26,34 +52,27 @@ class AuthHubClient:
         system_id: str,
         system_token: str,
         namespace: str,
-        redis_url: str,
-        enable_cache: bool = True,
-        sync_interval: int = 300,  # 5分钟同步一次
+        enable_cache: bool,
+        sync_interval: int,
+        token_cache_size: int,
+        sync_debounce: float,
+        sync_max_staleness: float,
+        scoped_tokens: bool,
     ):
-        """
-        初始化客户端
-
-        Args:
-            authhub_url: AuthHub服务地址
-            system_id: 系统ID
-            system_token: 系统Token
-            namespace: 命名空间(系统代码)
-            redis_url: Redis连接URL
-            enable_cache: 是否启用缓存
-            sync_interval: 配置同步间隔(秒)
-        """
         self.authhub_url = authhub_url.rstrip("/")
         self.system_id = system_id
         self.system_token = system_token
         self.namespace = namespace
         self.enable_cache = enable_cache
         self.sync_interval = sync_interval
+        self.sync_debounce = sync_debounce
+        self.sync_max_staleness = sync_max_staleness
+        self.scoped_tokens = scoped_tokens
 
-        # Redis客户端
-        self.redis = redis.from_url(redis_url, decode_responses=True)
-
-        # Token验证器
-        self.verifier = TokenVerifier(self.redis)
+        # 用户Token摘要 -> (作用域Token, 过期时间戳), 按LRU淘汰
+        self._scoped_cache: "OrderedDict[bytes, Tuple[str, float]]" = OrderedDict()
+        self._scoped_cache_size = token_cache_size
+        self._scoped_lock = threading.Lock()
 
         # 权限检查器
         self.checker = PermissionChecker(namespace)
@@ -61,29 +80,42 @@ class AuthHubClient:
         # 配置缓存
         self.config_cache: Dict = {}
         self.config_version: Optional[str] = None
+        # 已同步到的配置修订号(用于增量同步)
+        self.config_revision: Optional[int] = None
 
-        # 初始化
-        self._sync_public_key()
-        self._sync_config()
+        # 待同步标记: 首次请求时间和最近一次请求时间
+        self._dirty_since: Optional[float] = None
+        self._last_sync_request = 0.0
 
-        if enable_cache:
-            # 订阅权限变更
-            self._subscribe_updates()
+        # 权限事件流消费起点(初始同步前记录)
+        self._event_stream_ids: Dict[str, str] = {}
 
-            # 定期同步配置
-            self._start_sync_scheduler()
+    # ========== 子类实现的网络I/O ==========
 
+    @abc.abstractmethod
     def verify_token(self, token: str) -> Dict:
-        """
-        验证Token(本地)
+        """验证Token(本地), 异步客户端为协程"""
 
-        Args:
-            token: JWT Token
+    @abc.abstractmethod
+    def exchange_token(self, token: str) -> Dict:
+        """用户Token换取作用域Token, 异步客户端为协程"""
 
-        Returns:
-            Token payload
-        """
-        return self.verifier.verify(token)
+    @abc.abstractmethod
+    def refresh_token(self, refresh_token: str) -> Dict[str, str]:
+        """刷新访问令牌, 异步客户端为协程"""
+
+    @abc.abstractmethod
+    def request_sync(self):
+        """请求同步配置(由同步线程/任务防抖合并后执行, 不阻塞调用方)"""
+
+    @abc.abstractmethod
+    def _begin_config_event(self) -> bool:
+        """开始直接应用配置变更事件, 有同步在执行时返回 False"""
+
+    def _end_config_event(self):
+        """直接应用配置变更事件结束"""
+
+    # ========== 本地权限校验 ==========
 
     def check_permission(self, token_payload: Dict, resource: str, action: str) -> bool:
         """
@@ -113,6 +145,34 @@ class AuthHubClient:
         """
         return self.checker.check_route(token_payload, path, method, self.config_cache)
 
+    def check_many(
+        self,
+        token_payload: Dict,
+        permissions: Iterable[str] = (),
+        routes: Iterable[Tuple[str, str]] = (),
+        resources: Iterable[Tuple[str, object]] = (),
+    ) -> Dict[str, Dict]:
+        """
+        批量检查权限、路由和资源(本地, 一次遍历)
+
+        Args:
+            token_payload: Token payload
+            permissions: 权限代码列表, 如 ["document:read", "document:delete"]
+            routes: (HTTP方法, 路径) 列表, 如 [("GET", "/api/docs")]
+            resources: (资源类型, 资源ID) 列表, 如 [("project", 1)]
+
+        Returns:
+            {"permissions": {代码: bool}, "routes": {(方法, 路径): bool},
+             "resources": {(类型, ID): bool}}
+        """
+        return self.checker.check_many(
+            token_payload, self.config_cache, permissions, routes, resources
+        )
+
+    def effective_permissions(self, token_payload: Dict) -> frozenset:
+        """获取Token在本系统的全部有效权限代码(本地)"""
+        return self.checker.effective_permissions(token_payload, self.config_cache)
+
     # ========== 便捷方法 ==========
 
     def has_global_role(self, token_payload: Dict, role: str) -> bool:
@@ -130,6 +190,404 @@ class AuthHubClient:
         """检查资源访问权限"""
         return self.checker.check_resource_access(token_payload, resource_type, resource_id)
 
+    def filter_accessible(
+        self, token_payload: Dict, resource_type: str, resource_ids: Iterable
+    ) -> List:
+        """批量过滤有权限访问的资源ID(保持原顺序)"""
+        return self.checker.filter_accessible(token_payload, resource_type, resource_ids)
+
+    # ========== 内部方法 ==========
+
+    @staticmethod
+    def _is_scoped_token(token: str) -> bool:
+        """是否已是作用域Token"""
+        try:
+            return jwt.get_unverified_header(token).get("typ") == SCOPED_TOKEN_TYPE
+        except jwt.InvalidTokenError as e:
+            raise InvalidTokenException(f"Token无效: {str(e)}")
+
+    def _get_cached_scoped_token(self, token: str) -> Tuple[bytes, Optional[str]]:
+        """返回 (用户Token摘要, 未过期的作用域Token或None)"""
+        digest = hashlib.sha256(token.encode("utf-8")).digest()
+        with self._scoped_lock:
+            entry = self._scoped_cache.get(digest)
+            if entry is not None and entry[1] > time.time():
+                self._scoped_cache.move_to_end(digest)
+                return digest, entry[0]
+        return digest, None
+
+    def _put_scoped_token(self, digest: bytes, data: Dict) -> str:
+        """缓存令牌交换结果并返回作用域Token"""
+        # 提前10秒过期, 避免边界时刻拿到即将过期的作用域Token
+        scoped = data["access_token"]
+        with self._scoped_lock:
+            self._scoped_cache[digest] = (scoped, time.time() + data.get("expires_in", 0) - 10)
+            self._scoped_cache.move_to_end(digest)
+            while len(self._scoped_cache) > self._scoped_cache_size:
+                self._scoped_cache.popitem(last=False)
+        return scoped
+
+    @staticmethod
+    def _raise_exchange_error(detail: str):
+        """令牌交换返回401时按原因抛出对应异常"""
+        if "过期" in detail:
+            raise TokenExpiredException(detail)
+        if "撤销" in detail:
+            raise TokenRevokedException(detail)
+        raise InvalidTokenException(detail or "Token无效")
+
+    @staticmethod
+    def _parse_jwks(jwks: Dict) -> Dict[str, object]:
+        """JWKS转为 {kid: 公钥对象}"""
+        return {
+            jwk["kid"]: RSAAlgorithm.from_jwk(jwk)
+            for jwk in jwks.get("keys", [])
+            if jwk.get("kid") and jwk.get("kty") == "RSA"
+        }
+
+    @staticmethod
+    def _parse_resource_documents(data: Dict) -> Tuple[Dict[str, Dict], List[str]]:
+        """资源文档批量接口的返回转为 (文档, 缺失的摘要)"""
+        return data.get("documents", {}), data.get("missing", [])
+
+    # ---------- 同步调度 ----------
+
+    def _mark_sync_requested(self):
+        """记录一次同步请求(防抖窗口从最近一次请求算起)"""
+        now = time.monotonic()
+        if self._dirty_since is None:
+            self._dirty_since = now
+        self._last_sync_request = now
+
+    def _next_sync_due(self, next_periodic: float) -> float:
+        """
+        下一次同步的时间
+
+        有同步请求时为防抖窗口结束和最长等待(sync_max_staleness)中较早的一个,
+        无请求时为定期同步时间
+        """
+        if self._dirty_since is None:
+            return next_periodic
+        return min(
+            self._last_sync_request + self.sync_debounce,
+            self._dirty_since + self.sync_max_staleness,
+        )
+
+    def _take_sync_request(self) -> bool:
+        """清除待同步标记, 返回本次是否为定期同步"""
+        periodic = self._dirty_since is None
+        self._dirty_since = None
+        return periodic
+
+    # ---------- 配置同步 ----------
+
+    def _config_request_headers(self) -> Dict[str, str]:
+        """全量配置请求头(已有配置时带上版本号, 未变化时服务端返回304)"""
+        headers = {"X-System-Token": self.system_token}
+        if self.config_cache and self.config_version:
+            headers["If-None-Match"] = f'"{self.config_version}"'
+        return headers
+
+    def _apply_config_response(self, response):
+        """处理全量配置接口的响应(requests 和 httpx 的响应对象均可)"""
+        if response.status_code == 304:
+            print(f"✅ 配置未变化: {self.config_version}")
+            return
+        response.raise_for_status()
+        config = response.json()
+        self._install_config(config, config.get("version"), config.get("revision"))
+        print(f"✅ 配置同步成功: {self.config_version}")
+
+    # ---------- 权限事件流 ----------
+
+    def _event_streams(self) -> List[str]:
+        """要消费的权限事件流(系统命名空间和全局命名空间)"""
+        return [f"{EVENT_STREAM_PREFIX}{namespace}" for namespace in (self.namespace, "global")]
+
+    @staticmethod
+    def _stream_start_id(last_entries: List) -> str:
+        """XREVRANGE COUNT 1 的结果转为消费起点(空流从头读取)"""
+        return last_entries[0][0] if last_entries else "0-0"
+
+    @staticmethod
+    def _stream_trimmed(first_entries: List, last_id: str) -> bool:
+        """
+        续读位置之后的事件是否可能已被裁剪
+
+        Args:
+            first_entries: XRANGE COUNT 1 的结果(流中最早的一条事件)
+            last_id: 最后处理的事件ID
+        """
+        if last_id == "0-0" or not first_entries:
+            return False
+        return _stream_id(first_entries[0][0]) > _stream_id(last_id)
+
+    def _handle_event_entry(self, fields: Dict):
+        """处理事件流中的一条事件(撤销事件只更新本地撤销集合, 其余按配置变更处理)"""
+        try:
+            data = json.loads(fields["data"])
+            print(f"📨 收到权限变更通知: {data.get('type')}")
+
+            if self.revocations.handle_event(data):
+                return
+
+            self._handle_config_event(data)
+        except Exception as e:
+            print(f"❌ 处理权限变更失败: {e}")
+
+    def _install_config_delta(self, delta: Dict) -> bool:
+        """
+        应用增量同步接口返回的变更
+
+        Returns:
+            是否已同步到最新(False 表示变更日志已截断, 需要全量同步)
+        """
+        if delta["truncated"]:
+            print(f"⚠️ 配置变更日志已截断(since={self.config_revision}), 需要全量同步")
+            return False
+
+        if delta["changes"]:
+            config = self._apply_config_changes(self.config_cache, delta["changes"])
+            # 增量应用后的内容不再对应原版本哈希
+            self._install_config(config, None, delta["revision"])
+        else:
+            self.config_revision = delta["revision"]
+        print(f"✅ 增量同步成功: revision={self.config_revision}, 变更{len(delta['changes'])}项")
+        return True
+
+    def _install_config(self, config: Dict, version: Optional[str], revision: Optional[int]):
+        """先编译再整体替换配置, 请求路径始终读到完整且已编译的一版"""
+        self.checker.compile(config)
+        self.config_cache = config
+        self.config_version = version
+        self.config_revision = revision
+
+    @staticmethod
+    def _apply_config_changes(config: Dict, changes: List[Dict]) -> Dict:
+        """
+        把增量变更应用到配置, 返回新的配置字典(不修改原配置, 读者始终看到完整的一版)
+
+        Args:
+            config: 当前配置
+            changes: 变更列表 {type, op, key, data}
+
+        Returns:
+            新配置
+        """
+        roles = dict(config.get("roles", {}))
+        permissions = dict(config.get("permissions", {}))
+        route_patterns = {route.get("id"): route for route in config.get("route_patterns", [])}
+        targets = {"role": roles, "permission": permissions, "route_pattern": route_patterns}
+
+        for change in changes:
+            target = targets.get(change["type"])
+            if target is None:
+                continue
+            if change["op"] == "delete":
+                target.pop(change["key"], None)
+            else:
+                target[change["key"]] = change["data"]
+
+        return {
+            **config,
+            "roles": roles,
+            "permissions": permissions,
+            "route_patterns": sorted(route_patterns.values(), key=lambda route: route.get("id") or 0),
+        }
+
+    def _handle_config_event(self, data: Dict):
+        """
+        处理权限变更事件(在订阅线程/任务中执行, 不发起网络请求)
+
+        - config_changed: 本命名空间且修订号紧接当前修订号时直接应用变更, 已应用过的跳过,
+          其他命名空间的跳过, 出现修订号缺口、未携带变更或正在同步时请求同步
+        - user_permissions_changed: 用户权限随Token下发, 不影响本地配置, 跳过
+        - 旧格式事件: 请求同步
+        """
+        event_type = data.get("type")
+
+        if event_type == "user_permissions_changed":
+            return
+
+        if event_type != "config_changed":
+            self.request_sync()
+            return
+
+        if data.get("namespace") != self.namespace:
+            return
+
+        revision = data.get("revision")
+        changes = data.get("changes")
+        if not isinstance(revision, int) or changes is None:
+            self.request_sync()
+            return
+
+        # 正在同步时交给同步任务, 同步完成后会按修订号补齐
+        if not self._begin_config_event():
+            self.request_sync()
+            return
+        try:
+            if self.config_revision is not None and revision <= self.config_revision:
+                return
+            if self.config_revision is None or revision != self.config_revision + 1:
+                self.request_sync()
+                return
+
+            config = self._apply_config_changes(self.config_cache, changes)
+            self._install_config(config, None, revision)
+            print(f"✅ 已应用配置变更: revision={revision}, 变更{len(changes)}项")
+        finally:
+            self._end_config_event()
+
+
+class AuthHubClient(BaseAuthHubClient):
+    """
+    AuthHub SDK核心客户端
+
+    提供本地Token验证和权限校验功能
+    """
+
+    def __init__(
+        self,
+        authhub_url: str,
+        system_id: str,
+        system_token: str,
+        namespace: str,
+        redis_url: str,
+        enable_cache: bool = True,
+        sync_interval: int = 3600,  # 兜底同步间隔, 变更由事件流实时推送
+        token_cache_size: int = 10000,
+        sync_debounce: float = 0.2,
+        sync_max_staleness: float = 2.0,
+        scoped_tokens: bool = False,
+    ):
+        """
+        初始化客户端
+
+        Args:
+            authhub_url: AuthHub服务地址
+            system_id: 系统ID
+            system_token: 系统Token
+            namespace: 命名空间(系统代码)
+            redis_url: Redis连接URL
+            enable_cache: 是否启用缓存
+            sync_interval: 配置同步间隔(秒)
+            token_cache_size: 已验证Token缓存条数(0表示不缓存)
+            sync_debounce: 变更通知的防抖窗口(秒), 窗口内的多次通知合并为一次同步
+            sync_max_staleness: 持续收到通知时, 从首次通知到执行同步的最长等待(秒)
+            scoped_tokens: 是否把用户Token换成只含本系统权限的作用域Token后再验证
+        """
+        super().__init__(
+            authhub_url,
+            system_id,
+            system_token,
+            namespace,
+            enable_cache=enable_cache,
+            sync_interval=sync_interval,
+            token_cache_size=token_cache_size,
+            sync_debounce=sync_debounce,
+            sync_max_staleness=sync_max_staleness,
+            scoped_tokens=scoped_tokens,
+        )
+
+        # Redis客户端
+        self.redis = redis.from_url(redis_url, decode_responses=True)
+
+        # Token撤销集合(由权限变更订阅维护)
+        self.revocations = RevocationSet(self.redis)
+
+        # Token验证器(遇到未知kid时按需拉取JWKS)
+        self.verifier = TokenVerifier(
+            self.redis,
+            key_fetcher=self._fetch_jwks,
+            cache_size=token_cache_size,
+            revocations=self.revocations,
+            audience=namespace,
+        )
+
+        # 紧凑Token的资源文档解析器
+        self.resources = ResourceResolver(self._fetch_resource_documents, cache_size=token_cache_size)
+
+        # 同一时刻只有一个同步/应用变更在执行
+        self._sync_lock = threading.Lock()
+        # 同步请求通知
+        self._sync_cond = threading.Condition()
+
+        # 先记录权限事件流位置再做初始同步, 期间的事件不会丢失
+        if enable_cache:
+            self._event_stream_ids = self._get_event_stream_ids()
+
+        # 初始化
+        self._sync_public_key()
+        self._sync_config()
+
+        if enable_cache:
+            # 订阅权限变更
+            self._subscribe_updates()
+
+            # 同步线程(合并通知触发的同步, 并定期同步配置)
+            self._start_sync_scheduler()
+
+    def verify_token(self, token: str) -> Dict:
+        """
+        验证Token(本地)
+
+        开启 scoped_tokens 时, 用户Token先换成作用域Token(按Token缓存到作用域Token过期);
+        紧凑Token的资源集合按摘要从本地缓存补全(未命中时向AuthHub拉取)
+
+        Args:
+            token: JWT Token
+
+        Returns:
+            Token payload
+        """
+        if self.scoped_tokens:
+            token = self._get_scoped_token(token)
+        return self.resources.expand(self.verifier.verify(token))
+
+    def exchange_token(self, token: str) -> Dict:
+        """
+        用户Token换取作用域Token
+
+        Args:
+            token: 用户 access token
+
+        Returns:
+            {access_token, token_type, expires_in, audience}
+
+        Raises:
+            TokenExpiredException: 用户Token过期
+            TokenRevokedException: 用户Token已撤销
+            InvalidTokenException: 用户Token无效
+        """
+        response = requests.post(
+            f"{self.authhub_url}/api/v1/auth/token/exchange",
+            json={"subject_token": token},
+            headers={"X-System-Token": self.system_token},
+            timeout=10,
+        )
+        if response.status_code == 401:
+            self._raise_exchange_error(response.json().get("detail", ""))
+        response.raise_for_status()
+        return response.json()
+
+    def _get_scoped_token(self, token: str) -> str:
+        """获取用户Token对应的作用域Token, 交换服务不可用时回退到原Token"""
+        if self._is_scoped_token(token):
+            return token
+
+        digest, scoped = self._get_cached_scoped_token(token)
+        if scoped is not None:
+            return scoped
+
+        try:
+            data = self.exchange_token(token)
+        except requests.RequestException as e:
+            print(f"⚠️ 作用域Token交换失败, 使用原Token验证: {e}")
+            return token
+
+        return self._put_scoped_token(digest, data)
+
     def refresh_token(self, refresh_token: str) -> Dict[str, str]:
         """
         刷新访问令牌
@@ -157,71 +615,179 @@ class AuthHubClient:
     # ========== 内部方法 ==========
 
     def _sync_public_key(self):
-        """同步JWT公钥"""
+        """同步JWT公钥(JWKS多密钥, 旧版服务端回退到单公钥接口)"""
         try:
             response = requests.get(f"{self.authhub_url}/api/v1/auth/public-key", timeout=10)
             response.raise_for_status()
             data = response.json()
-            self.verifier.set_public_key(data["public_key"])
+            self.verifier.set_public_key(data["public_key"], kid=data.get("kid"))
             print(f"✅ 公钥同步成功")
         except Exception as e:
             print(f"❌ 公钥同步失败: {e}")
 
+        try:
+            self.verifier.set_keys(self._fetch_jwks())
+            print(f"✅ JWKS同步成功: {list(self.verifier.keys)}")
+        except Exception as e:
+            print(f"❌ JWKS同步失败: {e}")
+
+    def _fetch_jwks(self) -> Dict[str, object]:
+        """拉取JWKS, 返回 {kid: 公钥对象}"""
+        response = requests.get(f"{self.authhub_url}/.well-known/jwks.json", timeout=10)
+        response.raise_for_status()
+        return self._parse_jwks(response.json())
+
+    def request_sync(self):
+        """请求同步配置(由同步线程防抖合并后执行, 不阻塞调用方)"""
+        with self._sync_cond:
+            self._mark_sync_requested()
+            self._sync_cond.notify()
+
+    def _fetch_resource_documents(self, digests: List[str]) -> Tuple[Dict[str, Dict], List[str]]:
+        """批量拉取紧凑Token引用的资源文档"""
+        response = requests.post(
+            f"{self.authhub_url}/api/v1/systems/{self.system_id}/resources/bulk",
+            json={"digests": digests},
+            headers={"X-System-Token": self.system_token},
+            timeout=10,
+        )
+        response.raise_for_status()
+        return self._parse_resource_documents(response.json())
+
+    def _begin_config_event(self) -> bool:
+        return self._sync_lock.acquire(blocking=False)
+
+    def _end_config_event(self):
+        self._sync_lock.release()
+
     def _sync_config(self):
-        """同步权限配置"""
+        """同步权限配置(单飞: 已有同步在执行时等待其完成后再同步)"""
+        with self._sync_lock:
+            self._sync_config_locked()
+
+    def _sync_config_locked(self):
+        """同步权限配置(优先增量同步, 变更日志截断或接口不可用时全量同步)"""
+        if self.config_cache and self.config_revision is not None:
+            try:
+                if self._sync_config_changes():
+                    return
+            except Exception as e:
+                print(f"⚠️ 增量同步失败, 改为全量同步: {e}")
+
         try:
             logger.info(f"{self.system_id} - {self.system_token}")
             response = requests.get(
                 f"{self.authhub_url}/api/v1/systems/{self.system_id}/config",
-                headers={"X-System-Token": self.system_token},
+                headers=self._config_request_headers(),
                 timeout=10,
             )
-            response.raise_for_status()
-            config = response.json()
-            self.config_cache = config
-            self.config_version = config.get("version")
-            print(f"✅ 配置同步成功: {self.config_version}")
+            self._apply_config_response(response)
         except Exception as e:
             print(f"❌ 配置同步失败: {e}")
 
-    def _subscribe_updates(self):
-        """订阅权限变更通知"""
+    def _sync_config_changes(self) -> bool:
+        """
+        增量同步权限配置
 
-        def listener():
-            pubsub = self.redis.pubsub()
+        Returns:
+            是否已同步到最新(False 表示需要全量同步)
+        """
+        response = requests.get(
+            f"{self.authhub_url}/api/v1/systems/{self.system_id}/config/changes",
+            params={"since": self.config_revision},
+            headers={"X-System-Token": self.system_token},
+            timeout=10,
+        )
+        response.raise_for_status()
+        return self._install_config_delta(response.json())
 
-            # 订阅系统channel和全局channel
-            channels = [f"permission:changed:{self.namespace}", "permission:changed:global"]
-            pubsub.subscribe(*channels)
+    def _subscribe_updates(self):
+        """
+        消费权限事件流(系统命名空间和全局命名空间)
 
-            print(f"📡 已订阅权限变更通知: {channels}")
+        从初始同步前记录的位置开始读取, 断线重连后从最后处理的事件ID续读, 不会漏掉事件;
+        续读位置已被裁剪时请求一次配置同步
+        """
+        last_ids = dict(self._event_stream_ids)
 
-            for message in pubsub.listen():
-                if message["type"] == "message":
-                    try:
-                        data = json.loads(message["data"])
-                        print(f"📨 收到权限变更通知: {data.get('type')}")
+        def listener():
+            reconnect = False
+            while True:
+                try:
+                    if reconnect and self._event_streams_trimmed(last_ids):
+                        print(f"⚠️ 权限事件流已裁剪到续读位置之后, 重新同步配置")
+                        self.request_sync()
+                    print(f"📡 开始消费权限事件流: {list(last_ids)}")
+
+                    # 续读位置已确定, 此后加载的撤销快照不会漏掉事件
+                    self.revocations.load_snapshot()
+
+                    while True:
+                        response = self.redis.xread(last_ids, count=100, block=30000)
+                        for stream, entries in response or []:
+                            for entry_id, fields in entries:
+                                last_ids[stream] = entry_id
+                                self._handle_event_entry(fields)
+                except Exception as e:
+                    print(f"❌ 权限事件流读取中断, 稍后重连: {e}")
+                finally:
+                    # 中断期间回退到逐次查询Redis黑名单
+                    self.revocations.ready = False
 
-                        # 重新同步配置
-                        self._sync_config()
-                    except Exception as e:
-                        print(f"❌ 处理权限变更失败: {e}")
+                reconnect = True
+                time.sleep(5)
 
         # 在后台线程运行
         thread = threading.Thread(target=listener, daemon=True)
         thread.start()
 
+    def _get_event_stream_ids(self) -> Dict[str, str]:
+        """获取各事件流当前的最后一条事件ID(作为消费起点)"""
+        stream_ids = {}
+        for stream in self._event_streams():
+            try:
+                stream_ids[stream] = self._stream_start_id(self.redis.xrevrange(stream, count=1))
+            except Exception as e:
+                print(f"⚠️ 获取权限事件流位置失败, 将从头读取: {e}")
+                stream_ids[stream] = "0-0"
+        return stream_ids
+
+    def _event_streams_trimmed(self, last_ids: Dict[str, str]) -> bool:
+        """续读位置之后的事件是否可能已被裁剪"""
+        return any(
+            self._stream_trimmed(self.redis.xrange(stream, count=1), last_id)
+            for stream, last_id in last_ids.items()
+            if last_id != "0-0"
+        )
+
     def _start_sync_scheduler(self):
-        """启动定期同步"""
+        """
+        启动同步线程
+
+        有同步请求时等待防抖窗口内不再有新请求(最长不超过 sync_max_staleness)后同步一次,
+        无请求时每 sync_interval 秒定期同步
+        """
 
         def sync_job():
+            next_periodic = time.monotonic() + self.sync_interval
             while True:
-                time.sleep(self.sync_interval)
+                with self._sync_cond:
+                    while True:
+                        now = time.monotonic()
+                        due = self._next_sync_due(next_periodic)
+                        if now >= due:
+                            break
+                        self._sync_cond.wait(due - now)
+
+                    periodic = self._take_sync_request()
+
                 try:
-                    print(f"🔄 定期同步配置...")
+                    if periodic:
+                        print(f"🔄 定期同步配置...")
                     self._sync_config()
                 except Exception as e:
-                    print(f"❌ 定期同步失败: {e}")
+                    print(f"❌ 配置同步失败: {e}")
+                next_periodic = time.monotonic() + self.sync_interval
 
         thread = threading.Thread(target=sync_job, daemon=True)
         thread.start()
@@ -1,4 +1,5 @@
 """装饰器"""
+import inspect
 from functools import wraps
 from typing import Optional
 from authhub_sdk.exceptions import PermissionDeniedException
@@ -8,7 +9,14 @@ _client: Optional[object] = None
 
 
 def init_client(client):
-    """初始化全局客户端"""
+    """
+    初始化全局客户端
+
+    装饰器为同步调用, 只支持 AuthHubClient; AsyncAuthHubClient 请使用
+    authhub_sdk.middleware.fastapi 中间件
+    """
+    if inspect.iscoroutinefunction(client.verify_token):
+        raise TypeError("装饰器不支持异步客户端(AsyncAuthHubClient), 请使用ASGI中间件")
     global _client
     _client = client
 
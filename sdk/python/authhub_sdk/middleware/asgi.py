@@ -0,0 +1,41 @@
+"""ASGI中间件公共工具 - 直接读取 scope, 不构造 Request 对象"""
+import inspect
+from typing import Dict, List, Optional, Tuple
+
+from starlette.requests import cookie_parser
+from starlette.types import Message, Scope, Send
+
+
+def is_async_client(client) -> bool:
+    """是否为异步客户端(AsyncAuthHubClient 的 verify_token 等方法为协程函数)"""
+    return inspect.iscoroutinefunction(client.verify_token)
+
+
+def get_header(scope: Scope, name: bytes) -> Optional[str]:
+    """读取请求头(name 为小写字节串), 不存在时返回 None"""
+    for key, value in scope["headers"]:
+        if key == name:
+            return value.decode("latin-1")
+    return None
+
+
+def get_cookies(scope: Scope) -> Dict[str, str]:
+    """解析请求Cookie"""
+    cookie_header = get_header(scope, b"cookie")
+    return cookie_parser(cookie_header) if cookie_header else {}
+
+
+def set_state(scope: Scope, key: str, value):
+    """写入 request.state(Starlette 的 request.state 读取 scope["state"])"""
+    scope.setdefault("state", {})[key] = value
+
+
+def send_with_headers(send: Send, headers: List[Tuple[bytes, bytes]]) -> Send:
+    """包装 send: 在响应头中追加指定的头部, 响应体原样透传(不缓冲流式响应)"""
+
+    async def wrapped(message: Message):
+        if message["type"] == "http.response.start":
+            message["headers"] = list(message.get("headers", [])) + headers
+        await send(message)
+
+    return wrapped
@@ -1,72 +1,85 @@
 """FastAPI中间件"""
-from fastapi import Request, Response
 from fastapi.responses import JSONResponse
-from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.types import ASGIApp, Receive, Scope, Send
+
 from authhub_sdk.exceptions import TokenException
+from authhub_sdk.middleware.asgi import get_header, is_async_client, set_state
 
 
-class AuthHubMiddleware(BaseHTTPMiddleware):
+class AuthHubMiddleware:
     """
     AuthHub FastAPI中间件
-    
+
     自动验证Token和检查路由权限
+
+    纯ASGI实现: 直接从 scope 读取路径、方法和请求头, 不构造 Request 对象,
+    也不像 BaseHTTPMiddleware 那样额外创建任务和包装响应流
     """
-    
-    def __init__(self, app, client, public_routes: list = None):
+
+    def __init__(self, app: ASGIApp, client, public_routes: list = None):
         """
         Args:
             app: FastAPI应用
-            client: AuthHubClient实例
+            client: AuthHubClient 或 AsyncAuthHubClient 实例
             public_routes: 公开路由列表(不需要认证)
         """
-        super().__init__(app)
+        self.app = app
         self.client = client
-        self.public_routes = public_routes or ['/health', '/docs', '/openapi.json', '/redoc']
-    
-    async def dispatch(self, request: Request, call_next):
+        self._async_client = is_async_client(client)
+        self.public_routes = set(public_routes or ['/health', '/docs', '/openapi.json', '/redoc'])
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
         """处理请求"""
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
         # 跳过公开路由
-        if self._is_public_route(request.url.path):
-            return await call_next(request)
-        
+        path = scope["path"]
+        if self._is_public_route(path):
+            await self.app(scope, receive, send)
+            return
+
         # 提取Token
-        auth_header = request.headers.get('Authorization', '')
+        auth_header = get_header(scope, b"authorization") or ''
         if not auth_header.startswith('Bearer '):
-            return JSONResponse(
+            response = JSONResponse(
                 status_code=401,
                 content={"error": "缺少认证Token"}
             )
-        
-        token = auth_header.replace('Bearer ', '')
-        
+            await response(scope, receive, send)
+            return
+
+        token = auth_header[len('Bearer '):]
+
         try:
             # 验证Token
-            user_info = self.client.verify_token(token)
-            
+            if self._async_client:
+                user_info = await self.client.verify_token(token)
+            else:
+                user_info = self.client.verify_token(token)
+
             # 检查路由权限
-            if not self.client.check_route(
-                user_info,
-                request.url.path,
-                request.method
-            ):
-                return JSONResponse(
+            if not self.client.check_route(user_info, path, scope["method"]):
+                response = JSONResponse(
                     status_code=403,
                     content={"error": "权限不足"}
                 )
-            
-            # 注入用户信息到request.state
-            request.state.user = user_info
-            
+                await response(scope, receive, send)
+                return
+
         except TokenException as e:
-            return JSONResponse(
+            response = JSONResponse(
                 status_code=401,
                 content={"error": str(e)}
             )
-        
-        response = await call_next(request)
-        return response
-    
+            await response(scope, receive, send)
+            return
+
+        # 注入用户信息到request.state
+        set_state(scope, "user", user_info)
+        await self.app(scope, receive, send)
+
     def _is_public_route(self, path: str) -> bool:
         """判断是否是公开路由"""
         return path in self.public_routes
-
@@ -1,19 +1,23 @@
 """FastAPI SSO中间件"""
 
-from typing import Callable, List, Optional
+import time
+from typing import Dict, List, Optional, Tuple
 
 from fastapi import FastAPI, Request, Response
 from fastapi.responses import JSONResponse, RedirectResponse
 from loguru import logger
-from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.concurrency import run_in_threadpool
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
-from authhub_sdk.client import AuthHubClient
+from authhub_sdk.client import BaseAuthHubClient
+from authhub_sdk.middleware.asgi import get_cookies, is_async_client, send_with_headers, set_state
+from authhub_sdk.middleware.refresh import RefreshCoalescer
 from authhub_sdk.sso import SSOClient
 
 
 def register_sso_routes(
     app: FastAPI,
-    client: AuthHubClient,
+    client: BaseAuthHubClient,
     callback_path: str = "/auth/callback",
     login_path: str = "/auth/login",
     logout_path: str = "/auth/logout",
@@ -48,7 +52,7 @@ def register_sso_routes(
 
         # 获取登录URL
         try:
-            result = sso_client.get_login_url(callback_uri)
+            result = await run_in_threadpool(sso_client.get_login_url, callback_uri)
             return RedirectResponse(url=result["login_url"])
         except Exception as e:
             return JSONResponse(status_code=500, content={"error": f"获取登录URL失败: {str(e)}"})
@@ -67,7 +71,7 @@ def register_sso_routes(
         """
         try:
             # 交换Token（现在返回包含access_token和refresh_token的字典）
-            token_data = sso_client.handle_callback(code, state)
+            token_data = await run_in_threadpool(sso_client.handle_callback, code, state)
             access_token = token_data["access_token"]
             refresh_token = token_data["refresh_token"]
 
@@ -111,19 +115,22 @@ def register_sso_routes(
         return response
 
 
-class AuthHubSSOMiddleware(BaseHTTPMiddleware):
+class AuthHubSSOMiddleware:
     """
     FastAPI SSO中间件
 
     处理登录状态检查和Cookie验证
 
+    纯ASGI实现: 直接从 scope 读取路径和Cookie, 不构造 Request 对象;
+    刷新Token后通过包装 send 追加 Set-Cookie 头, 流式响应不会被缓冲
+
     注意: 必须先调用 register_sso_routes() 注册路由，再添加此中间件
     """
 
     def __init__(
         self,
-        app: FastAPI,
-        client: AuthHubClient,
+        app: ASGIApp,
+        client: BaseAuthHubClient,
         callback_path: str = "/auth/callback",
         login_path: str = "/auth/login",
         logout_path: str = "/auth/logout",
@@ -133,13 +140,16 @@ class AuthHubSSOMiddleware(BaseHTTPMiddleware):
         public_routes: Optional[List[str]] = None,
         login_required: bool = True,
         redirect_to_login: bool = True,
+        refresh_result_ttl: float = 30.0,
+        refresh_ahead_seconds: float = 300.0,
+        refresh_ahead_timeout: float = 2.0,
     ):
         """
         初始化SSO中间件
 
         Args:
             app: FastAPI应用实例
-            client: AuthHub客户端
+            client: AuthHub客户端(AuthHubClient 或 AsyncAuthHubClient)
             callback_path: SSO回调路径
             login_path: 登录路径
             logout_path: 登出路径
@@ -149,9 +159,16 @@ class AuthHubSSOMiddleware(BaseHTTPMiddleware):
             public_routes: 公开路由列表(不需要登录)
             login_required: 是否要求登录
             redirect_to_login: 未登录时是否重定向到登录页
+            refresh_result_ttl: 刷新结果的保留时间(秒), 期间携带同一 refresh token 的请求直接复用
+            refresh_ahead_seconds: access token 距过期不足该时间(秒)时提前刷新, 0表示不提前刷新
+            refresh_ahead_timeout: 提前刷新时本次请求最多等待的时间(秒), 刷新完成即在本次响应中下发新Cookie
         """
-        super().__init__(app)
+        self.app = app
         self.client = client
+        self._async_client = is_async_client(client)
+
+        # 同一 refresh token 的并发刷新合并为一次(AuthHub 会轮换 refresh token)
+        self._refresher = RefreshCoalescer(self._refresh_token, result_ttl=refresh_result_ttl)
 
         # 路径配置
         self.callback_path = callback_path
@@ -167,73 +184,146 @@ class AuthHubSSOMiddleware(BaseHTTPMiddleware):
         self.public_routes = public_routes or []
         self.login_required = login_required
         self.redirect_to_login = redirect_to_login
+        self.refresh_ahead_seconds = refresh_ahead_seconds
+        self.refresh_ahead_timeout = refresh_ahead_timeout
+
+        # 公开路由与SSO路由(直接放行)
+        self._skip_paths = set(self.public_routes) | {callback_path, login_path, logout_path}
+
+    async def _verify_token(self, token: str) -> Dict:
+        """验证Token(异步客户端直接 await)"""
+        if self._async_client:
+            return await self.client.verify_token(token)
+        return self.client.verify_token(token)
+
+    async def _refresh_token(self, refresh_token: str) -> Dict[str, str]:
+        """刷新Token(同步客户端在线程池中执行, 不阻塞事件循环)"""
+        if self._async_client:
+            return await self.client.refresh_token(refresh_token)
+        return await run_in_threadpool(self.client.refresh_token, refresh_token)
 
-    async def _try_refresh_token(self, request: Request, call_next: Callable) -> Optional[Response]:
+    async def _try_refresh_token(self, scope: Scope, cookies: Dict[str, str]) -> Optional[List[Tuple[bytes, bytes]]]:
         """
         尝试使用 refresh token 刷新 access token
 
         Args:
-            request: FastAPI 请求对象
-            call_next: 下一个中间件/路由处理器
+            scope: ASGI scope
+            cookies: 请求Cookie
 
         Returns:
-            Response: 如果刷新成功，返回带有新 Cookie 的响应
+            刷新成功时返回需要追加到响应的 Set-Cookie 头(用户信息已注入 request.state)
             None: 如果刷新失败或 refresh token 不存在
         """
-        refresh_token = request.cookies.get(f"{self.cookie_name}_refresh")
+        path = scope["path"]
+        refresh_token = cookies.get(f"{self.cookie_name}_refresh")
         if not refresh_token:
-            logger.debug(f"[Token刷新] refresh_token 不存在 - Path: {request.url.path}")
+            logger.debug(f"[Token刷新] refresh_token 不存在 - Path: {path}")
             return None
 
         logger.info(
-            f"[Token刷新] 开始尝试刷新 - Path: {request.url.path}, refresh_token: {refresh_token[:20]}***"
+            f"[Token刷新] 开始尝试刷新 - Path: {path}, refresh_token: {refresh_token[:20]}***"
         )
 
         try:
             # 尝试刷新token
-            new_tokens = self.client.refresh_token(refresh_token)
-            new_access_token = new_tokens["access_token"]
-            new_refresh_token = new_tokens["refresh_token"]
-
+            new_tokens = await self._refresher.refresh(refresh_token)
             logger.info("[Token刷新] ✅ 刷新成功 - 获取到新的 tokens")
 
             # 验证新token并注入用户信息
-            user_info = self.client.verify_token(new_access_token)
-            request.state.user = user_info
+            user_info = await self._verify_token(new_tokens["access_token"])
+            set_state(scope, "user", user_info)
 
             logger.info(
                 f"[Token刷新] ✅ 用户信息已注入 - username: {user_info.get('username')}, user_id: {user_info.get('sub')}"
             )
-
-            # 继续处理请求
-            response = await call_next(request)
-
-            # 在响应中更新cookies（access_token 和 refresh_token 都是 7 天）
-            response.set_cookie(
-                key=self.cookie_name,
-                value=new_access_token,
-                max_age=7 * 24 * 3600,  # 7天
-                httponly=True,
-                secure=self.cookie_secure,
-                samesite=self.cookie_samesite,
-            )
-            response.set_cookie(
-                key=f"{self.cookie_name}_refresh",
-                value=new_refresh_token,
-                max_age=7 * 24 * 3600,  # 7天
-                httponly=True,
-                secure=self.cookie_secure,
-                samesite=self.cookie_samesite,
-            )
-
-            logger.info("[Token刷新] ✅ Cookie 已更新并返回响应")
-            return response
         except Exception as e:
             # 刷新失败（refresh token 无效或过期）
             logger.error(f"[Token刷新] ❌ 刷新失败 - Error: {str(e)}")
             return None
 
-    async def dispatch(self, request: Request, call_next: Callable):
+        return self._token_cookie_headers(new_tokens)
+
+    def _token_cookie_headers(self, new_tokens: Dict[str, str]) -> List[Tuple[bytes, bytes]]:
+        """新Token对应的 Set-Cookie 头"""
+        # 在响应中更新cookies（access_token 和 refresh_token 都是 7 天）
+        cookie_response = Response()
+        cookie_response.set_cookie(
+            key=self.cookie_name,
+            value=new_tokens["access_token"],
+            max_age=7 * 24 * 3600,  # 7天
+            httponly=True,
+            secure=self.cookie_secure,
+            samesite=self.cookie_samesite,
+        )
+        cookie_response.set_cookie(
+            key=f"{self.cookie_name}_refresh",
+            value=new_tokens["refresh_token"],
+            max_age=7 * 24 * 3600,  # 7天
+            httponly=True,
+            secure=self.cookie_secure,
+            samesite=self.cookie_samesite,
+        )
+        return [header for header in cookie_response.raw_headers if header[0] == b"set-cookie"]
+
+    async def _refresh_ahead(
+        self, scope: Scope, cookies: Dict[str, str], user_info: Dict, send: Send
+    ) -> Send:
+        """
+        access token 临近过期时提前刷新
+
+        最多等待 refresh_ahead_timeout 秒, 刷新完成即在本次响应中下发新Cookie; 超时后刷新
+        在后台继续, 结果就绪后本次及之后携带旧Cookie的响应会附加新Cookie。新Cookie未送达
+        (浏览器空闲、下一个请求落到其他worker)时, AuthHub 在轮换宽限期内对旧 refresh token
+        的重放返回同一个新token, 由之后的请求重新下发
+
+        Returns:
+            包装后的 send(不需要提前刷新时原样返回)
+        """
+        exp = user_info.get("exp")
+        refresh_token = cookies.get(f"{self.cookie_name}_refresh")
+        if (
+            self.refresh_ahead_seconds <= 0
+            or not refresh_token
+            or not isinstance(exp, (int, float))
+            or exp - time.time() > self.refresh_ahead_seconds
+        ):
+            return send
+
+        # 结果保留到旧 access token 过期, 期间仍携带旧Cookie的响应都能拿到新Cookie
+        task = self._refresher.refresh_in_background(
+            refresh_token, result_ttl=max(self._refresher.result_ttl, exp - time.time())
+        )
+        if task is not None:
+            path = scope["path"]
+            logger.info(f"[Token刷新] access_token 即将过期, 后台提前刷新 - Path: {path}")
+            task.add_done_callback(self._log_background_refresh)
+
+        new_tokens = await self._refresher.wait(refresh_token, self.refresh_ahead_timeout)
+        if new_tokens:
+            return send_with_headers(send, self._token_cookie_headers(new_tokens))
+
+        async def wrapped(message: Message):
+            if message["type"] == "http.response.start":
+                new_tokens = self._refresher.peek(refresh_token)
+                if new_tokens:
+                    message["headers"] = list(message.get("headers", [])) + self._token_cookie_headers(
+                        new_tokens
+                    )
+            await send(message)
+
+        return wrapped
+
+    @staticmethod
+    def _log_background_refresh(task):
+        """记录后台提前刷新的结果(失败时等到过期后再按原流程刷新)"""
+        if task.cancelled():
+            return
+        if task.exception() is not None:
+            logger.warning(f"[Token刷新] 提前刷新失败, 过期后再刷新 - Error: {task.exception()}")
+        else:
+            logger.info("[Token刷新] ✅ 后台提前刷新成功")
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
         """
         中间件处理逻辑
 
@@ -244,19 +334,20 @@ class AuthHubSSOMiddleware(BaseHTTPMiddleware):
         5. 如果 access_token 无效，尝试使用 refresh_token 刷新
         6. 注入用户信息到request.state
         """
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
         # 检查是否为公开路由或SSO路由
-        path = request.url.path
-        if (
-            path in self.public_routes
-            or path == self.callback_path
-            or path == self.login_path
-            or path == self.logout_path
-        ):
+        path = scope["path"]
+        if path in self._skip_paths:
             logger.debug(f"[SSO中间件] 公开路由或SSO路由，直接放行 - Path: {path}")
-            return await call_next(request)
+            await self.app(scope, receive, send)
+            return
 
         # 从Cookie获取Token
-        token = request.cookies.get(self.cookie_name)
+        cookies = get_cookies(scope)
+        token = cookies.get(self.cookie_name)
 
         logger.debug(f"[SSO中间件] 处理受保护路由 - Path: {path}, access_token存在: {bool(token)}")
 
@@ -265,10 +356,11 @@ class AuthHubSSOMiddleware(BaseHTTPMiddleware):
             logger.warning(f"[SSO中间件] access_token 不存在 - Path: {path}")
 
             # 尝试使用 refresh_token 刷新
-            response = await self._try_refresh_token(request, call_next)
-            if response:
+            cookie_headers = await self._try_refresh_token(scope, cookies)
+            if cookie_headers:
                 logger.info(f"[SSO中间件] ✅ 通过 refresh_token 恢复会话成功 - Path: {path}")
-                return response
+                await self.app(scope, receive, send_with_headers(send, cookie_headers))
+                return
 
             # refresh_token 也不存在或无效，重定向到登录
             logger.warning(f"[SSO中间件] refresh_token 也无效，需要重新登录 - Path: {path}")
@@ -277,30 +369,35 @@ class AuthHubSSOMiddleware(BaseHTTPMiddleware):
                 if self.redirect_to_login:
                     # 重定向到登录页，并保存原始URL
                     logger.info(f"[SSO中间件] 重定向到登录页 - Path: {path}")
-                    return RedirectResponse(url=f"{self.login_path}?redirect={path}")
+                    response = RedirectResponse(url=f"{self.login_path}?redirect={path}")
                 else:
-                    return JSONResponse(status_code=401, content={"error": "未登录"})
-            else:
-                # 不要求登录，继续处理请求
-                logger.debug(f"[SSO中间件] 不要求登录，继续处理 - Path: {path}")
-                return await call_next(request)
+                    response = JSONResponse(status_code=401, content={"error": "未登录"})
+                await response(scope, receive, send)
+                return
+
+            # 不要求登录，继续处理请求
+            logger.debug(f"[SSO中间件] 不要求登录，继续处理 - Path: {path}")
+            await self.app(scope, receive, send)
+            return
 
         # 情况2: access_token 存在，验证其有效性
         try:
             logger.debug(f"[SSO中间件] 验证 access_token - Path: {path}, token: {token[:20]}***")
-            user_info = self.client.verify_token(token)
-            request.state.user = user_info
+            user_info = await self._verify_token(token)
+            set_state(scope, "user", user_info)
             logger.info(
                 f"[SSO中间件] ✅ Token 验证成功 - Path: {path}, username: {user_info.get('username')}"
             )
+            send = await self._refresh_ahead(scope, cookies, user_info, send)
         except Exception as e:
             # Token无效（JWT 过期、签名错误等），尝试使用 refresh_token 刷新
             logger.warning(f"[SSO中间件] access_token 验证失败 - Path: {path}, Error: {str(e)}")
 
-            response = await self._try_refresh_token(request, call_next)
-            if response:
+            cookie_headers = await self._try_refresh_token(scope, cookies)
+            if cookie_headers:
                 logger.info(f"[SSO中间件] ✅ Token 刷新成功，会话恢复 - Path: {path}")
-                return response
+                await self.app(scope, receive, send_with_headers(send, cookie_headers))
+                return
 
             # refresh_token 也无效，清除 Cookie 并重定向到登录
             logger.error(f"[SSO中间件] ❌ Token 刷新失败，需要重新登录 - Path: {path}")
@@ -310,16 +407,17 @@ class AuthHubSSOMiddleware(BaseHTTPMiddleware):
                 response.delete_cookie(key=self.cookie_name)
                 response.delete_cookie(key=f"{self.cookie_name}_refresh")
                 logger.info(f"[SSO中间件] 已清除 Cookie 并重定向到登录页 - Path: {path}")
-                return response
-            else:
-                request.state.user = None
+                await response(scope, receive, send)
+                return
+
+            set_state(scope, "user", None)
 
-        return await call_next(request)
+        await self.app(scope, receive, send)
 
 
 def setup_sso(
     app: FastAPI,
-    client: AuthHubClient,
+    client: BaseAuthHubClient,
     callback_path: str = "/auth/callback",
     login_path: str = "/auth/login",
     logout_path: str = "/auth/logout",
@@ -332,6 +430,9 @@ def setup_sso(
     login_required: bool = True,
     redirect_to_login: bool = True,
     after_login_redirect: str = "/",
+    refresh_result_ttl: float = 30.0,
+    refresh_ahead_seconds: float = 300.0,
+    refresh_ahead_timeout: float = 2.0,
 ):
     """
     便捷方法: 一次性设置SSO路由和中间件
@@ -351,6 +452,9 @@ def setup_sso(
         login_required: 是否要求登录
         redirect_to_login: 未登录时是否重定向到登录页
         after_login_redirect: 登录成功后重定向路径
+        refresh_result_ttl: 刷新结果的保留时间(秒)
+        refresh_ahead_seconds: access token 距过期不足该时间(秒)时提前刷新
+        refresh_ahead_timeout: 提前刷新时本次请求最多等待的时间(秒)
     """
     # 先注册路由
     register_sso_routes(
@@ -380,4 +484,7 @@ def setup_sso(
         public_routes=public_routes,
         login_required=login_required,
         redirect_to_login=redirect_to_login,
+        refresh_result_ttl=refresh_result_ttl,
+        refresh_ahead_seconds=refresh_ahead_seconds,
+        refresh_ahead_timeout=refresh_ahead_timeout,
     )
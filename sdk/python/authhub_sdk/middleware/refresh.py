@@ -0,0 +1,137 @@
+"""Refresh Token 刷新合并 - 同一 refresh token 的并发刷新只调用一次AuthHub"""
+
+import asyncio
+import hashlib
+import time
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+# 刷新函数: refresh token -> {access_token, refresh_token, ...}
+RefreshFunc = Callable[[str], Awaitable[Dict[str, str]]]
+
+
+class RefreshCoalescer:
+    """
+    Refresh Token 刷新合并器
+
+    AuthHub 刷新时会轮换 refresh token, 同一浏览器的并发请求若各自刷新, 除第一个外都会
+    因旧 refresh token 失效而失败。合并器按 refresh token 合并进行中的刷新, 并发请求共享
+    同一次刷新结果; 刷新成功后结果再保留一小段时间, 供稍晚到达、仍携带旧Cookie的请求复用。
+    刷新失败不缓存, 只由进行中的等待方共享
+    """
+
+    # 刷新结果缓存上限(超过后整体清空)
+    MAX_CACHED_RESULTS = 10000
+
+    def __init__(self, refresh: RefreshFunc, result_ttl: float = 30.0):
+        """
+        Args:
+            refresh: 实际执行刷新的函数
+            result_ttl: 刷新结果的保留时间(秒), 0表示不保留
+        """
+        self._refresh = refresh
+        self.result_ttl = result_ttl
+        # refresh token摘要 -> 进行中的刷新任务
+        self._inflight: Dict[bytes, asyncio.Task] = {}
+        # refresh token摘要 -> (刷新结果, 过期时间)
+        self._results: Dict[bytes, Tuple[Dict[str, str], float]] = {}
+
+    async def refresh(self, refresh_token: str) -> Dict[str, str]:
+        """
+        刷新Token(并发调用合并为一次)
+
+        Args:
+            refresh_token: Refresh Token
+
+        Returns:
+            新的token数据（包含access_token和refresh_token）
+
+        Raises:
+            Exception: 刷新失败时抛出异常
+        """
+        digest = self._digest(refresh_token)
+        cached = self._get_result(digest)
+        if cached is not None:
+            return cached
+
+        # 某个等待方被取消(如客户端断开)时不取消共享的刷新
+        return await asyncio.shield(self._start(digest, refresh_token))
+
+    def refresh_in_background(
+        self, refresh_token: str, result_ttl: Optional[float] = None
+    ) -> Optional[asyncio.Task]:
+        """
+        在后台开始刷新(不等待结果), 已有结果或刷新进行中时不重复发起
+
+        Args:
+            refresh_token: Refresh Token
+            result_ttl: 本次刷新结果的保留时间(秒), 默认使用构造时的 result_ttl
+
+        Returns:
+            本次新发起的刷新任务, 未发起时返回 None
+        """
+        digest = self._digest(refresh_token)
+        if digest in self._inflight or self._get_result(digest) is not None:
+            return None
+        return self._start(digest, refresh_token, result_ttl)
+
+    async def wait(self, refresh_token: str, timeout: float) -> Optional[Dict[str, str]]:
+        """
+        等待进行中的刷新完成(最多 timeout 秒, 超时不取消刷新)
+
+        Returns:
+            刷新结果; 没有进行中的刷新、刷新失败或超时时返回 None
+        """
+        digest = self._digest(refresh_token)
+        cached = self._get_result(digest)
+        if cached is not None:
+            return cached
+        task = self._inflight.get(digest)
+        if task is None or timeout <= 0:
+            return None
+        try:
+            return await asyncio.wait_for(asyncio.shield(task), timeout)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            return None
+
+    def peek(self, refresh_token: str) -> Optional[Dict[str, str]]:
+        """获取已完成且未过期的刷新结果(不发起刷新)"""
+        return self._get_result(self._digest(refresh_token))
+
+    @staticmethod
+    def _digest(refresh_token: str) -> bytes:
+        return hashlib.sha256(refresh_token.encode("utf-8")).digest()
+
+    def _get_result(self, digest: bytes) -> Optional[Dict[str, str]]:
+        cached = self._results.get(digest)
+        if cached is None:
+            return None
+        if cached[1] > time.monotonic():
+            return cached[0]
+        del self._results[digest]
+        return None
+
+    def _start(
+        self, digest: bytes, refresh_token: str, result_ttl: Optional[float] = None
+    ) -> asyncio.Task:
+        """获取进行中的刷新任务, 没有时发起"""
+        task = self._inflight.get(digest)
+        if task is None:
+            ttl = self.result_ttl if result_ttl is None else result_ttl
+            task = asyncio.create_task(self._run(digest, refresh_token, ttl))
+            # 等待方全部取消时也取走异常, 避免 "exception was never retrieved" 警告
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+            self._inflight[digest] = task
+        return task
+
+    async def _run(self, digest: bytes, refresh_token: str, result_ttl: float) -> Dict[str, str]:
+        try:
+            result = await self._refresh(refresh_token)
+            if result_ttl > 0:
+                if len(self._results) >= self.MAX_CACHED_RESULTS:
+                    self._results.clear()
+                self._results[digest] = (result, time.monotonic() + result_ttl)
+            return result
+        finally:
+            self._inflight.pop(digest, None)
@@ -0,0 +1,150 @@
+"""资源文档解析 - 紧凑Token"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Iterable, List, Tuple
+
+# 资源文档拉取函数: 摘要列表 -> ({摘要: 资源文档}, 不存在的摘要)
+DocumentFetcher = Callable[[List[str]], Tuple[Dict[str, Dict], List[str]]]
+AsyncDocumentFetcher = Callable[[List[str]], Awaitable[Tuple[Dict[str, Dict], List[str]]]]
+
+_EMPTY_DOCUMENT = {"global_resources": {}, "system_resources": {}}
+
+
+class ResourceResolver:
+    """
+    资源文档解析器
+
+    紧凑Token不内嵌资源集合, 只携带资源摘要 res_digest; 解析器按摘要从本地LRU缓存取出
+    资源文档并补全到payload中, 未命中时通过 fetcher 向AuthHub批量拉取。
+    资源文档按内容寻址, 写入后不再变化, 缓存无需失效; AuthHub 报告不存在的摘要短时缓存,
+    期间携带该摘要的Token按无资源处理, 不再重复拉取
+    """
+
+    def __init__(
+        self, fetcher: DocumentFetcher, cache_size: int = 10000, negative_cache_ttl: float = 30.0
+    ):
+        """
+        Args:
+            fetcher: 资源文档拉取函数
+            cache_size: 资源文档缓存的最大条数
+            negative_cache_ttl: 不存在的摘要的缓存时间(秒), 0表示不缓存
+        """
+        self.fetcher = fetcher
+        self.cache_size = cache_size
+        self.negative_cache_ttl = negative_cache_ttl
+        self._cache: "OrderedDict[str, Dict]" = OrderedDict()
+        # 不存在的摘要 -> 过期时间(monotonic)
+        self._not_found: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def expand(self, payload: Dict) -> Dict:
+        """
+        补全紧凑Token的资源集合(非紧凑Token原样返回)
+
+        Args:
+            payload: Token payload
+
+        Returns:
+            带 global_resources/system_resources 的payload
+        """
+        if "global_resources" in payload or "system_resources" in payload:
+            return payload
+
+        digest = payload.get("res_digest")
+        document = self._get_cached(digest) if digest else _EMPTY_DOCUMENT
+        if document is None:
+            try:
+                self.prefetch([digest])
+            except Exception as e:
+                # 拉取失败时按无资源处理(只影响资源级校验, 不缓存)
+                print(f"❌ 资源文档拉取失败: {e}")
+            document = self._get_cached(digest) or _EMPTY_DOCUMENT
+
+        return {**payload, **document}
+
+    def prefetch(self, digests: Iterable[str]):
+        """
+        批量拉取未缓存的资源文档
+
+        Args:
+            digests: 资源摘要
+        """
+        missing = self._uncached(digests)
+        if missing:
+            self._store(*self.fetcher(missing))
+
+    def _uncached(self, digests: Iterable[str]) -> List[str]:
+        """去重后返回未缓存(且未记为不存在)的摘要"""
+        now = time.monotonic()
+        with self._lock:
+            return [
+                digest
+                for digest in dict.fromkeys(digests)
+                if digest
+                and digest not in self._cache
+                and self._not_found.get(digest, 0) <= now
+            ]
+
+    def _store(self, documents: Dict[str, Dict], not_found: List[str]):
+        """写入拉取到的资源文档"""
+        if not_found:
+            print(f"⚠️ 资源文档已不存在, 按无资源处理: {not_found}")
+
+        with self._lock:
+            for digest, document in documents.items():
+                self._cache[digest] = document
+                self._cache.move_to_end(digest)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+            if not_found and self.negative_cache_ttl > 0:
+                # 超过上限时整体清空(过期项不单独清理)
+                if len(self._not_found) + len(not_found) > self.cache_size:
+                    self._not_found.clear()
+                expires_at = time.monotonic() + self.negative_cache_ttl
+                for digest in not_found:
+                    self._not_found[digest] = expires_at
+
+    def _get_cached(self, digest: str):
+        with self._lock:
+            document = self._cache.get(digest)
+            if document is not None:
+                self._cache.move_to_end(digest)
+            return document
+
+
+class AsyncResourceResolver(ResourceResolver):
+    """资源文档解析器(异步拉取, 缓存与 ResourceResolver 相同)"""
+
+    def __init__(
+        self,
+        fetcher: AsyncDocumentFetcher,
+        cache_size: int = 10000,
+        negative_cache_ttl: float = 30.0,
+    ):
+        super().__init__(fetcher, cache_size=cache_size, negative_cache_ttl=negative_cache_ttl)
+
+    async def expand(self, payload: Dict) -> Dict:
+        """补全紧凑Token的资源集合(非紧凑Token原样返回)"""
+        if "global_resources" in payload or "system_resources" in payload:
+            return payload
+
+        digest = payload.get("res_digest")
+        document = self._get_cached(digest) if digest else _EMPTY_DOCUMENT
+        if document is None:
+            try:
+                await self.prefetch([digest])
+            except Exception as e:
+                # 拉取失败时按无资源处理(只影响资源级校验, 不缓存)
+                print(f"❌ 资源文档拉取失败: {e}")
+            document = self._get_cached(digest) or _EMPTY_DOCUMENT
+
+        return {**payload, **document}
+
+    async def prefetch(self, digests: Iterable[str]):
+        """批量拉取未缓存的资源文档"""
+        missing = self._uncached(digests)
+        if missing:
+            self._store(*await self.fetcher(missing))
@@ -0,0 +1,79 @@
+"""Token撤销集合 - 进程内副本"""
+
+import threading
+import time
+from typing import Dict
+
+# 撤销索引: 有序集合 member=jti, score=过期时间戳(由AuthHub维护)
+REVOCATION_INDEX_KEY = "blacklist:index"
+
+
+class RevocationSet:
+    """
+    Token撤销集合
+
+    从AuthHub维护的撤销索引加载快照, 再由权限变更频道上的 token_revoked 事件增量更新,
+    使撤销检查不再需要每个请求访问一次Redis; 未就绪时调用方应回退到 Redis EXISTS
+    """
+
+    def __init__(self, redis_client):
+        self.redis = redis_client
+        # jti -> 过期时间戳
+        self._revoked: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._next_purge = 0.0
+        self.ready = False
+
+    def load_snapshot(self):
+        """加载未过期的撤销记录(应在订阅频道之后调用, 避免漏掉期间的事件)"""
+        entries = self.redis.zrangebyscore(REVOCATION_INDEX_KEY, time.time(), "+inf", withscores=True)
+        self._install_snapshot(entries)
+
+    def _install_snapshot(self, entries):
+        """写入快照中的撤销记录并标记就绪"""
+        with self._lock:
+            self._revoked.update({jti: exp for jti, exp in entries})
+        self.ready = True
+
+    def add(self, jti: str, exp: float):
+        """加入撤销记录"""
+        with self._lock:
+            self._revoked[jti] = exp
+            self._purge_expired()
+
+    def contains(self, jti: str) -> bool:
+        """是否已撤销"""
+        exp = self._revoked.get(jti)
+        return exp is not None and exp > time.time()
+
+    def handle_event(self, event: Dict) -> bool:
+        """
+        处理权限变更事件
+
+        Returns:
+            是否为撤销事件
+        """
+        if event.get("type") != "token_revoked":
+            return False
+        if event.get("jti"):
+            self.add(event["jti"], float(event.get("exp") or time.time() + 3600))
+        return True
+
+    def _purge_expired(self):
+        """定期清理已过期的记录(最多每分钟一次)"""
+        now = time.time()
+        if now < self._next_purge:
+            return
+        self._next_purge = now + 60
+        self._revoked = {jti: exp for jti, exp in self._revoked.items() if exp > now}
+
+
+class AsyncRevocationSet(RevocationSet):
+    """Token撤销集合(异步Redis客户端加载快照)"""
+
+    async def load_snapshot(self):
+        """加载未过期的撤销记录(应在开始消费事件流之后调用, 避免漏掉期间的事件)"""
+        entries = await self.redis.zrangebyscore(
+            REVOCATION_INDEX_KEY, time.time(), "+inf", withscores=True
+        )
+        self._install_snapshot(entries)
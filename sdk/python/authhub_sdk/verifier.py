@@ -1,34 +1,96 @@
 """Token验证器"""
 
-from typing import Dict
+import asyncio
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Optional, Tuple
 
 import jwt
+from cryptography.hazmat.primitives import serialization
 
 from authhub_sdk.exceptions import (
     InvalidTokenException,
     TokenExpiredException,
     TokenRevokedException,
 )
+from authhub_sdk.revocation import RevocationSet
+
+# 公钥拉取函数: 返回 {kid: 公钥对象}
+KeyFetcher = Callable[[], Dict[str, object]]
+AsyncKeyFetcher = Callable[[], Awaitable[Dict[str, object]]]
 
 
 class TokenVerifier:
     """Token验证器 - 本地验证JWT"""
 
-    def __init__(self, redis_client):
+    def __init__(
+        self,
+        redis_client,
+        key_fetcher: Optional[KeyFetcher] = None,
+        negative_cache_ttl: float = 60.0,
+        cache_size: int = 10000,
+        revocations: Optional[RevocationSet] = None,
+        audience: Optional[str] = None,
+    ):
+        """
+        Args:
+            redis_client: Redis客户端(用于黑名单检查)
+            key_fetcher: 遇到未知kid时调用的公钥拉取函数(通常是拉取JWKS)
+            negative_cache_ttl: 两次公钥拉取的最小间隔(秒), 无论由哪个kid触发;
+                间隔内遇到的未知kid直接拒绝, 伪造随机kid无法放大为对AuthHub的JWKS请求
+            cache_size: 已验证Token缓存的最大条数, 0表示不缓存
+            revocations: 进程内撤销集合, 就绪时代替逐次查询Redis黑名单
+            audience: 本系统命名空间, 带aud的作用域Token必须与之匹配
+        """
         self.redis = redis_client
-        self.public_key: str = ""
+        self.revocations = revocations
+        self.key_fetcher = key_fetcher
+        self.negative_cache_ttl = negative_cache_ttl
+        self.cache_size = cache_size
+        self.audience = audience
+
+        # Token摘要 -> (payload, exp), 按LRU淘汰
+        self._cache: "OrderedDict[bytes, Tuple[Dict, float]]" = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+        # 未携带kid的Token使用的默认公钥
+        self.public_key = None
+        # kid -> 公钥对象
+        self.keys: Dict[str, object] = {}
+        # 下一次允许拉取公钥的时间(monotonic)
+        self._next_fetch_at = 0.0
+        self._fetch_lock = threading.Lock()
+
+    def set_public_key(self, public_key_pem: str, kid: Optional[str] = None):
+        """设置公钥(PEM), 提供kid时同时加入kid索引"""
+        public_key = serialization.load_pem_public_key(public_key_pem.encode("utf-8"))
+        self.public_key = public_key
+        if kid:
+            self.keys[kid] = public_key
+
+    def set_keys(self, keys: Dict[str, object], default_kid: Optional[str] = None):
+        """
+        批量设置公钥(通常来自JWKS)
 
-    def set_public_key(self, public_key_pem: str):
-        """设置公钥"""
-        self.public_key = public_key_pem
+        Args:
+            keys: {kid: 公钥对象}
+            default_kid: 作为未携带kid的Token默认公钥的kid
+        """
+        self.keys = {**self.keys, **keys}
+        if default_kid and default_kid in self.keys:
+            self.public_key = self.keys[default_kid]
 
     def verify(self, token: str) -> Dict:
         """
         验证Token
 
-        1. 验证JWT签名(使用公钥)
+        1. 按kid选择公钥并验证JWT签名(命中已验证缓存时跳过)
         2. 检查过期时间
-        3. 检查黑名单
+        3. 检查黑名单(每次都检查)
 
         Args:
             token: JWT Token
@@ -41,12 +103,14 @@ class TokenVerifier:
             TokenRevokedException: Token已撤销
             InvalidTokenException: Token无效
         """
-        if not self.public_key:
-            raise InvalidTokenException("公钥未设置")
-
         try:
-            # 验证JWT签名和过期时间
-            payload = jwt.decode(token, self.public_key, algorithms=["RS256"])
+            digest = hashlib.sha256(token.encode("utf-8")).digest()
+            payload = self._get_cached(digest)
+
+            if payload is None:
+                public_key = self._get_key(jwt.get_unverified_header(token).get("kid"))
+                payload = self._decode(token, public_key)
+                self._put_cached(digest, payload)
 
             # 检查黑名单
             jti = payload.get("jti", "")
@@ -60,8 +124,209 @@ class TokenVerifier:
         except jwt.InvalidTokenError as e:
             raise InvalidTokenException(f"Token无效: {str(e)}")
 
+    def cache_stats(self) -> Dict[str, int]:
+        """已验证Token缓存的统计信息"""
+        return {"size": len(self._cache), "hits": self.cache_hits, "misses": self.cache_misses}
+
+    def clear_cache(self):
+        """清空已验证Token缓存"""
+        with self._cache_lock:
+            self._cache.clear()
+
+    def _get_cached(self, digest: bytes) -> Optional[Dict]:
+        """读取未过期的缓存payload(返回副本, 调用方修改不影响缓存)"""
+        if not self.cache_size:
+            return None
+
+        with self._cache_lock:
+            entry = self._cache.get(digest)
+            if entry is None:
+                self.cache_misses += 1
+                return None
+
+            payload, exp = entry
+            if exp <= time.time():
+                del self._cache[digest]
+                self.cache_misses += 1
+                return None
+
+            self._cache.move_to_end(digest)
+            self.cache_hits += 1
+            return dict(payload)
+
+    def _put_cached(self, digest: bytes, payload: Dict):
+        """缓存已验证的payload直到其exp"""
+        exp = payload.get("exp")
+        if not self.cache_size or not isinstance(exp, (int, float)):
+            return
+
+        with self._cache_lock:
+            self._cache[digest] = (dict(payload), float(exp))
+            self._cache.move_to_end(digest)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def _get_key(self, kid: Optional[str]):
+        """按kid获取公钥, 未知kid时懒加载(全局限频, 并发请求只拉取一次)"""
+        public_key = self._known_key(kid)
+        if public_key is not None:
+            return public_key
+
+        with self._fetch_lock:
+            # 等锁期间可能已被其他线程拉取
+            public_key = self._known_key(kid)
+            if public_key is not None:
+                return public_key
+
+            self._next_fetch_at = time.monotonic() + self.negative_cache_ttl
+            try:
+                keys = self.key_fetcher()
+            except Exception as e:
+                raise InvalidTokenException(f"公钥拉取失败: {str(e)}")
+            return self._install_fetched_keys(kid, keys)
+
+    def _known_key(self, kid: Optional[str]):
+        """
+        按kid查找已知公钥
+
+        Returns:
+            公钥对象, 需要拉取JWKS时返回 None
+
+        Raises:
+            InvalidTokenException: 未设置默认公钥, 或kid未知且距上次拉取不足最小间隔/无法拉取
+        """
+        if not kid:
+            if self.public_key is None:
+                raise InvalidTokenException("公钥未设置")
+            return self.public_key
+
+        public_key = self.keys.get(kid)
+        if public_key is not None:
+            return public_key
+
+        if self.key_fetcher is None or self._next_fetch_at > time.monotonic():
+            raise InvalidTokenException(f"未知的密钥ID: {kid}")
+        return None
+
+    def _install_fetched_keys(self, kid: str, keys: Dict[str, object]):
+        """写入拉取到的公钥并返回kid对应的公钥"""
+        self.set_keys(keys)
+        public_key = self.keys.get(kid)
+        if public_key is None:
+            raise InvalidTokenException(f"未知的密钥ID: {kid}")
+        return public_key
+
+    def _decode(self, token: str, public_key) -> Dict:
+        """验证JWT签名和过期时间(aud单独校验, 普通Token不带aud)"""
+        payload = jwt.decode(
+            token, public_key, algorithms=["RS256"], options={"verify_aud": False}
+        )
+        self._check_audience(payload)
+        return payload
+
+    def _check_audience(self, payload: Dict):
+        """作用域Token的aud必须包含本系统命名空间"""
+        if "aud" not in payload:
+            return
+        audience = payload["aud"]
+        audiences = [audience] if isinstance(audience, str) else list(audience or [])
+        if self.audience is None or self.audience not in audiences:
+            raise InvalidTokenException(f"Token不属于本系统: aud={audience}")
+
     def _is_revoked(self, jti: str) -> bool:
         """检查Token是否在黑名单"""
         if not jti:
             return False
+        if self.revocations is not None and self.revocations.ready:
+            return self.revocations.contains(jti)
         return self.redis.exists(f"blacklist:{jti}") > 0
+
+
+class AsyncTokenVerifier(TokenVerifier):
+    """
+    异步Token验证器
+
+    与 TokenVerifier 共用已验证缓存和公钥索引; 未知kid时的JWKS拉取和
+    撤销集合未就绪时的黑名单查询通过 await 完成, 不阻塞事件循环
+    """
+
+    def __init__(
+        self,
+        redis_client,
+        key_fetcher: Optional[AsyncKeyFetcher] = None,
+        negative_cache_ttl: float = 60.0,
+        cache_size: int = 10000,
+        revocations: Optional[RevocationSet] = None,
+        audience: Optional[str] = None,
+    ):
+        """
+        Args:
+            redis_client: 异步Redis客户端(redis.asyncio, 用于黑名单检查)
+            key_fetcher: 遇到未知kid时调用的异步公钥拉取函数
+            其余参数同 TokenVerifier
+        """
+        super().__init__(
+            redis_client,
+            key_fetcher=key_fetcher,
+            negative_cache_ttl=negative_cache_ttl,
+            cache_size=cache_size,
+            revocations=revocations,
+            audience=audience,
+        )
+        self._fetch_lock = asyncio.Lock()
+
+    async def verify(self, token: str) -> Dict:
+        """
+        验证Token(异步, 流程同 TokenVerifier.verify)
+
+        Raises:
+            TokenExpiredException: Token过期
+            TokenRevokedException: Token已撤销
+            InvalidTokenException: Token无效
+        """
+        try:
+            digest = hashlib.sha256(token.encode("utf-8")).digest()
+            payload = self._get_cached(digest)
+
+            if payload is None:
+                public_key = await self._get_key(jwt.get_unverified_header(token).get("kid"))
+                payload = self._decode(token, public_key)
+                self._put_cached(digest, payload)
+
+            # 检查黑名单
+            if await self._is_revoked(payload.get("jti", "")):
+                raise TokenRevokedException("Token已被撤销")
+
+            return payload
+
+        except jwt.ExpiredSignatureError:
+            raise TokenExpiredException("Token已过期")
+        except jwt.InvalidTokenError as e:
+            raise InvalidTokenException(f"Token无效: {str(e)}")
+
+    async def _get_key(self, kid: Optional[str]):
+        """按kid获取公钥, 未知kid时懒加载(全局限频, 并发请求只拉取一次)"""
+        public_key = self._known_key(kid)
+        if public_key is not None:
+            return public_key
+
+        async with self._fetch_lock:
+            # 等锁期间可能已被其他请求拉取
+            public_key = self._known_key(kid)
+            if public_key is not None:
+                return public_key
+
+            self._next_fetch_at = time.monotonic() + self.negative_cache_ttl
+            try:
+                keys = await self.key_fetcher()
+            except Exception as e:
+                raise InvalidTokenException(f"公钥拉取失败: {str(e)}")
+            return self._install_fetched_keys(kid, keys)
+
+    async def _is_revoked(self, jti: str) -> bool:
+        """检查Token是否在黑名单"""
+        if not jti:
+            return False
+        if self.revocations is not None and self.revocations.ready:
+            return self.revocations.contains(jti)
+        return await self.redis.exists(f"blacklist:{jti}") > 0
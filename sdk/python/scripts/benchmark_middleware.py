@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+中间件开销基准测试: BaseHTTPMiddleware 实现 vs 纯ASGI实现
+
+直接以ASGI方式调用应用(不经过网络和HTTP客户端), Token验证和路由检查使用
+固定结果的桩客户端, 只比较中间件本身的开销
+
+用法: python scripts/benchmark_middleware.py [请求数]
+"""
+
+import asyncio
+import os
+import sys
+import time
+
+# 添加父目录到path以便导入authhub_sdk
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.middleware.base import BaseHTTPMiddleware
+
+from authhub_sdk.exceptions import TokenException
+from authhub_sdk.middleware.fastapi import AuthHubMiddleware
+
+
+class StubClient:
+    """固定通过验证的桩客户端"""
+
+    def verify_token(self, token: str) -> dict:
+        return {"sub": "1", "username": "bench", "system_roles": {"bench": ["user"]}}
+
+    def check_route(self, token_payload: dict, path: str, method: str) -> bool:
+        return True
+
+
+class BaseHTTPAuthHubMiddleware(BaseHTTPMiddleware):
+    """旧版基于 BaseHTTPMiddleware 的实现(仅用于对比)"""
+
+    def __init__(self, app, client, public_routes: list = None):
+        super().__init__(app)
+        self.client = client
+        self.public_routes = public_routes or ['/health', '/docs', '/openapi.json', '/redoc']
+
+    async def dispatch(self, request: Request, call_next):
+        if request.url.path in self.public_routes:
+            return await call_next(request)
+
+        auth_header = request.headers.get('Authorization', '')
+        if not auth_header.startswith('Bearer '):
+            return JSONResponse(status_code=401, content={"error": "缺少认证Token"})
+
+        try:
+            user_info = self.client.verify_token(auth_header.replace('Bearer ', ''))
+            if not self.client.check_route(user_info, request.url.path, request.method):
+                return JSONResponse(status_code=403, content={"error": "权限不足"})
+            request.state.user = user_info
+        except TokenException as e:
+            return JSONResponse(status_code=401, content={"error": str(e)})
+
+        return await call_next(request)
+
+
+def build_app(middleware_class) -> FastAPI:
+    """构建带指定中间件的测试应用"""
+    app = FastAPI()
+
+    @app.get("/api/items")
+    async def items(request: Request):
+        return {"user": request.state.user["username"]}
+
+    @app.get("/api/stream")
+    async def stream():
+        async def chunks():
+            for _ in range(10):
+                yield b"x" * 1024
+                await asyncio.sleep(0.001)
+
+        return StreamingResponse(chunks())
+
+    app.add_middleware(middleware_class, client=StubClient())
+    return app
+
+
+async def call(app, path: str) -> tuple:
+    """以ASGI方式发起一次请求, 返回 (首字节耗时, 总耗时)"""
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "root_path": "",
+        "query_string": b"",
+        "headers": [(b"host", b"bench"), (b"authorization", b"Bearer bench-token")],
+        "client": ("127.0.0.1", 12345),
+        "server": ("bench", 80),
+    }
+    first_byte = None
+    request_sent = False
+    finished = asyncio.Event()
+    start = time.perf_counter()
+
+    async def receive():
+        # 先返回请求体, 之后等到响应结束再报告断开(与真实服务器一致)
+        nonlocal request_sent
+        if not request_sent:
+            request_sent = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await finished.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        nonlocal first_byte
+        if message["type"] == "http.response.body":
+            if first_byte is None and message.get("body"):
+                first_byte = time.perf_counter() - start
+            if not message.get("more_body"):
+                finished.set()
+
+    await app(scope, receive, send)
+    return first_byte, time.perf_counter() - start
+
+
+def percentile(samples: list, p: float) -> float:
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * p))]
+
+
+async def run(name: str, app, path: str, requests: int, metric: int):
+    """预热后逐个请求计时, 输出 平均/p50/p99(毫秒)"""
+    for _ in range(min(200, requests)):
+        await call(app, path)
+
+    samples = [(await call(app, path))[metric] * 1000 for _ in range(requests)]
+    print(
+        f"  {name:<20} mean={sum(samples) / len(samples):.3f}ms "
+        f"p50={percentile(samples, 0.5):.3f}ms p99={percentile(samples, 0.99):.3f}ms"
+    )
+
+
+async def main():
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    apps = {
+        "BaseHTTPMiddleware": build_app(BaseHTTPAuthHubMiddleware),
+        "纯ASGI": build_app(AuthHubMiddleware),
+    }
+
+    print(f"JSON接口总耗时 ({requests} 次请求):")
+    for name, app in apps.items():
+        await run(name, app, "/api/items", requests, metric=1)
+
+    stream_requests = max(1, requests // 50)
+    print(f"流式接口首字节耗时 ({stream_requests} 次请求):")
+    for name, app in apps.items():
+        await run(name, app, "/api/stream", stream_requests, metric=0)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())